@@ -1,8 +1,16 @@
 from fastapi import FastAPI
 from app.api.routes.chat_message import router as chat_message
 from app.api.routes.chat_session import router as chat_session
+from app.api.routes.export import router as export
+from app.api.routes.admin import router as admin
+from app.api.routes.search import router as search
+from app.api.routes.user import router as user
 
 
 def register_routes(app: FastAPI):
     app.include_router(chat_session)
     app.include_router(chat_message)
+    app.include_router(export)
+    app.include_router(search)
+    app.include_router(user)
+    app.include_router(admin)
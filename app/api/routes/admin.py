@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from typing import Literal, Optional
+
+from app.services.import_service import (
+    import_records,
+    ndjson_records,
+    csv_records,
+    aiter_body_lines,
+)
+from app.core.security import api_key_auth
+from app.core.logging import logger
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.post("/import", dependencies=[Depends(api_key_auth)])
+async def import_data(
+    request: Request,
+    job_id: str = Query(..., description="Checkpoint key; repeat it to resume"),
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    kind: Optional[Literal["session", "message"]] = Query(
+        None, description="Record type of a CSV body"
+    ),
+):
+    if format == "csv" and kind is None:
+        raise HTTPException(status_code=422, detail="CSV imports require 'kind'.")
+    try:
+        logger.info(f"Starting import {job_id} ({format})")
+        lines = aiter_body_lines(request.stream())
+        records = ndjson_records(lines) if format == "ndjson" else csv_records(kind, lines)
+        return await import_records(records, job_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error running import {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Import failed")
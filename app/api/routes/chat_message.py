@@ -1,11 +1,42 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Header, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from starlette.background import BackgroundTask
 from uuid import UUID
-from typing import List
+from typing import List, Optional
 
-from app.schemas.message import ChatMessageCreate, ChatMessageOut
-from app.services.message_service import add_messages, get_message_by_session
-from app.db.session import get_db
+from app.schemas.message import (
+    ChatMessageCreate,
+    ChatMessageOut,
+    ChatMessageBatchCreate,
+    ChatMessageBatchOut,
+    ChatMessageContextOut,
+    ChatMessageWindowOut,
+    ChatMessageStreamCreate,
+    ChatMessageDelta,
+    ChatMessageDeltaOut,
+    ChatMessageFinalize,
+)
+from app.services.message_service import (
+    add_messages,
+    add_messages_bulk,
+    add_messages_across_shards,
+    get_message_by_session,
+    get_message_page,
+    get_message_context,
+    get_message_window,
+    open_streaming_message,
+    finalize_streaming_message,
+)
+from app.services.message_delta_buffer import message_delta_buffer
+from app.services.message_stream import stream_hub_for, stream_session_messages
+from app.services.write_buffer import message_write_buffer
+from app.db.models import ChatSession
+from app.db.session import get_db, get_read_db, shard_router
+from app.core.config import settings
+from app.core.pagination import decode_cursor
+from app.core.responses import FastJSONResponse
 from app.core.security import api_key_auth
 from app.core.logging import logger
 
@@ -18,30 +49,242 @@ async def create_message(
 ):
     try:
         logger.info(f"Creating message for session: {message.session_id}")
+        if settings.MESSAGE_WRITE_BUFFER_ENABLED:
+            return await message_write_buffer.submit(message)
         return await add_messages(db, message)
     except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == 422:
+            raise  # per-message rejection from the write buffer
         logger.exception(
             f"Error creating message for session {message.session_id}: {e}"
         )
         raise HTTPException(status_code=500, detail="Failed to create message")
 
 
+@router.post(
+    "/batch",
+    response_model=ChatMessageBatchOut,
+    dependencies=[Depends(api_key_auth)],
+)
+async def create_messages_batch(
+    payload: ChatMessageBatchCreate, db: AsyncSession = Depends(get_db)
+):
+    try:
+        logger.info(f"Creating batch of {len(payload.messages)} message(s)")
+        if shard_router.sharded:
+            # The batch may span sessions of users on different shards
+            return await add_messages_across_shards(payload.messages)
+        return await add_messages_bulk(db, payload.messages)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error creating message batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create messages")
+
+
+@router.post(
+    "/stream",
+    response_model=ChatMessageOut,
+    status_code=201,
+    dependencies=[Depends(api_key_auth)],
+)
+async def open_message_stream(
+    message: ChatMessageStreamCreate, db: AsyncSession = Depends(get_db)
+):
+    """Open a message whose content is appended with /deltas, then /finalize."""
+    try:
+        logger.info(f"Opening streaming message in session: {message.session_id}")
+        new_msg = await open_streaming_message(db, message)
+        message_delta_buffer.track(new_msg.id, new_msg.session_id)
+        return new_msg
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error opening streaming message in session {message.session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to open streaming message")
+
+
+@router.post(
+    "/{message_id}/deltas",
+    response_model=ChatMessageDeltaOut,
+    status_code=202,
+    dependencies=[Depends(api_key_auth)],
+)
+async def append_delta(
+    message_id: UUID, delta: ChatMessageDelta, db: AsyncSession = Depends(get_db)
+):
+    try:
+        buffered = await message_delta_buffer.append(db, message_id, delta.offset, delta.delta)
+        return {"message_id": message_id, "buffered_chars": buffered}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error appending to message {message_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to append to message")
+
+
+@router.post(
+    "/{message_id}/finalize",
+    response_model=ChatMessageOut,
+    dependencies=[Depends(api_key_auth)],
+)
+async def finalize_message(
+    message_id: UUID,
+    payload: Optional[ChatMessageFinalize] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    pending = []
+    try:
+        logger.info(f"Finalizing streaming message {message_id}")
+        pending = await message_delta_buffer.take(message_id)
+        content = payload.content if payload else None
+        return await finalize_streaming_message(db, message_id, content, pending)
+    except HTTPException as e:
+        if e.status_code >= 500:
+            # Still streaming as far as the database knows; keep its text
+            message_delta_buffer.restore(pending)
+        raise
+    except Exception as e:
+        logger.exception(f"Error finalizing message {message_id}: {e}")
+        message_delta_buffer.restore(pending)
+        raise HTTPException(status_code=500, detail="Failed to finalize message")
+
+
 @router.get(
     "/session/{session_id}",
     response_model=List[ChatMessageOut],
+    response_class=FastJSONResponse,
     dependencies=[Depends(api_key_auth)],
 )
 async def get_messages(
     session_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="Cursor to page forward from"),
+    before: Optional[str] = Query(None, description="Cursor to page backward from"),
+    reverse: bool = Query(False, description="Start from the newest messages"),
+    include_context: bool = Query(False, description="Also return RAG contexts"),
 ):
     try:
         logger.info(
-            f"Fetching messages for session {session_id} | limit={limit}, offset={offset}"
+            f"Fetching messages for session {session_id} | limit={limit}, offset={offset}, "
+            f"after={after}, before={before}, reverse={reverse}"
+        )
+        if offset:
+            if after or before or reverse:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Offset cannot be combined with cursor pagination.",
+                )
+            messages = await get_message_by_session(
+                db, session_id, limit, offset, include_context=include_context
+            )
+            return FastJSONResponse(messages)
+
+        page = await get_message_page(
+            db,
+            session_id,
+            limit,
+            after=after,
+            before=before,
+            reverse=reverse,
+            include_context=include_context,
         )
-        return await get_message_by_session(db, session_id, limit, offset)
+        headers = {}
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        if page["prev_cursor"]:
+            headers["X-Prev-Cursor"] = page["prev_cursor"]
+        # Rows are already shaped like ChatMessageOut; skip re-validation
+        return FastJSONResponse(page["messages"], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error fetching messages for session {session_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch messages")
+
+
+@router.get(
+    "/session/{session_id}/window",
+    response_model=List[ChatMessageWindowOut],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(api_key_auth)],
+)
+async def get_window(
+    session_id: UUID,
+    max_tokens: int = Query(..., ge=1, description="Token budget of the window"),
+    max_messages: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        logger.info(
+            f"Fetching window for session {session_id} | max_tokens={max_tokens}, "
+            f"max_messages={max_messages}"
+        )
+        window = await get_message_window(db, session_id, max_tokens, max_messages)
+        return FastJSONResponse(
+            window["messages"], headers={"X-Window-Tokens": str(window["total_tokens"])}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error fetching window for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch message window")
+
+
+@router.get("/session/{session_id}/stream", dependencies=[Depends(api_key_auth)])
+async def stream_messages(
+    session_id: UUID,
+    last_event_id: Optional[str] = Header(None, description="Resume after this event"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Server-Sent Events of new messages in a session."""
+    if not settings.MESSAGE_NOTIFY_ENABLED:
+        # Nothing publishes new messages, so a stream would never see one
+        raise HTTPException(status_code=503, detail="Live message streams are disabled")
+    if last_event_id:
+        decode_cursor(last_event_id)  # reject a bad cursor before streaming
+
+    try:
+        logger.info(f"Opening live stream of session {session_id}")
+        result = await db.execute(select(ChatSession.id).where(ChatSession.id == session_id))
+        found = result.scalar_one_or_none()
+        # The stream outlives the request's DB session; return its connection now
+        await db.close()
+        if not found:
+            raise HTTPException(status_code=404, detail="Session not found")
+        shard = await shard_router.shard_for_id(session_id)
+        hub = stream_hub_for(shard)
+        subscription = await hub.subscribe(session_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error opening live stream of session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to open message stream")
+
+    return StreamingResponse(
+        stream_session_messages(
+            subscription, last_event_id, hub=hub, session_factory=shard.session_factory
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs when the client leaves before the first event
+        background=BackgroundTask(hub.unsubscribe, subscription),
+    )
+
+
+@router.get(
+    "/{message_id}/context",
+    response_model=ChatMessageContextOut,
+    dependencies=[Depends(api_key_auth)],
+)
+async def get_context(message_id: UUID, db: AsyncSession = Depends(get_read_db)):
+    try:
+        logger.info(f"Fetching context of message {message_id}")
+        return await get_message_context(db, message_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error fetching context of message {message_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch message context")
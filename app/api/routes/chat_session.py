@@ -3,20 +3,24 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.core.rate_limiter import limiter
+from app.core.responses import FastJSONResponse
 from app.schemas.session import (
     ChatSessionCreate,
     ChatSessionOut,
+    ChatSessionUpdate,
     RenameSession,
     FavoriteSession,
 )
 from app.services.session_service import (
     create_chat_session,
     get_chat_session_by_user,
+    get_chat_session_page,
     rename_chat_session,
     set_favorite_status,
+    update_chat_session,
     delete_chat_session,
 )
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.core.security import api_key_auth
 from app.core.logging import logger
 
@@ -41,23 +45,53 @@ async def create_sessions(
 
 
 @router.get(
-    "/", response_model=List[ChatSessionOut], dependencies=[Depends(api_key_auth)]
+    "/",
+    response_model=List[ChatSessionOut],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(api_key_auth)],
 )
 @limiter.limit("5/minute")
 async def get_sessions(
     request: Request,
     user_id: str,
     is_favorite: Optional[bool] = Query(False),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    include: Optional[str] = Query(None, description="Comma-separated: stats,preview"),
+    order: str = Query("created", description="created (newest first) or activity (latest message first)"),
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
 ):
     try:
         logger.info(
-            f"Fetching sessions for user: {user_id}, is_favorite: {is_favorite}"
+            f"Fetching sessions for user: {user_id}, is_favorite: {is_favorite}, "
+            f"limit: {limit}, include: {include}, order: {order}"
         )
-        return await get_chat_session_by_user(
-            db, user_id=user_id, is_favorite=is_favorite
+        if limit is None and cursor is None and include is None and order == "created":
+            # Cache misses are filled from the primary: a lagging replica
+            # could otherwise repopulate the cache with pre-write data.
+            sessions = await get_chat_session_by_user(
+                db, user_id=user_id, is_favorite=is_favorite
+            )
+            return FastJSONResponse(sessions)
+
+        page = await get_chat_session_page(
+            read_db,
+            user_id=user_id,
+            is_favorite=is_favorite,
+            limit=limit or 20,
+            cursor=cursor,
+            include={part.strip() for part in (include or "").split(",") if part.strip()},
+            order=order,
         )
+        headers = {}
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        # Rows are already shaped like ChatSessionOut; skip re-validation
+        return FastJSONResponse(page["sessions"], headers=headers)
     except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == 400:
+            raise  # bad cursor, include or order option
         logger.exception(f"Error fetching sessions for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch sessions")
 
@@ -98,6 +132,24 @@ async def toggle_favorite(
         raise HTTPException(status_code=500, detail="Failed to set favorite status")
 
 
+@router.patch(
+    "/{session_id}",
+    response_model=ChatSessionOut,
+    dependencies=[Depends(api_key_auth)],
+)
+async def update_session(
+    session_id: str, payload: ChatSessionUpdate, db: AsyncSession = Depends(get_db)
+):
+    try:
+        logger.info(f"Updating session {session_id}")
+        return await update_chat_session(db, session_id=session_id, update_data=payload)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error updating session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to update session")
+
+
 @router.delete("/{session_id}", status_code=204, dependencies=[Depends(api_key_auth)])
 async def delete_session(session_id: str, db: AsyncSession = Depends(get_db)):
     try:
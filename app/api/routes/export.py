@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from uuid import UUID
+
+from app.db.models import ChatSession
+from app.services.export_service import stream_session_export, stream_user_export
+from app.db.session import get_db, shard_router
+from app.core.security import api_key_auth
+from app.core.logging import logger
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _ndjson_response(stream, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream,
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/session/{session_id}", dependencies=[Depends(api_key_auth)])
+async def export_session(session_id: UUID, db: AsyncSession = Depends(get_db)):
+    try:
+        logger.info(f"Exporting session {session_id}")
+        result = await db.execute(select(ChatSession.id).where(ChatSession.id == session_id))
+        found = result.scalar_one_or_none()
+    except Exception as e:
+        logger.exception(f"Error exporting session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to export session")
+
+    if not found:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Stream from the shard the existence check ran on
+    shard = await shard_router.shard_for_id(session_id)
+    return _ndjson_response(
+        stream_session_export(session_id, shard.session_factory),
+        f"session-{session_id}.ndjson",
+    )
+
+
+@router.get("/user/{user_id}", dependencies=[Depends(api_key_auth)])
+async def export_user(user_id: str):
+    logger.info(f"Exporting history of user {user_id}")
+    shard = await shard_router.shard_for_user(user_id)
+    return _ndjson_response(
+        stream_user_export(user_id, shard.session_factory), f"user-{user_id}.ndjson"
+    )
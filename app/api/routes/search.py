@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, Query, Response, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.schemas.search import SearchHit, SimilarHit, SimilarSearch
+from app.services.search_service import search_messages, similar_messages, MAX_SEARCH_LIMIT
+from app.db.session import get_read_db
+from app.core.security import api_key_auth
+from app.core.logging import logger
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+@router.get("", response_model=List[SearchHit], dependencies=[Depends(api_key_auth)])
+async def search(
+    response: Response,
+    user_id: str,
+    q: str = Query(..., min_length=1, description="Web-search style query"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        logger.info(f"Searching messages of user {user_id} | limit={limit}")
+        page = await search_messages(db, user_id=user_id, q=q, limit=limit, cursor=cursor)
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        return page["hits"]
+    except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == 400:
+            raise  # bad query or cursor
+        logger.exception(f"Error searching messages of user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search messages")
+
+
+@router.post(
+    "/similar",
+    response_model=List[List[SimilarHit]],
+    dependencies=[Depends(api_key_auth)],
+)
+async def search_similar(body: SimilarSearch, db: AsyncSession = Depends(get_read_db)):
+    """Nearest messages of the user to each query embedding, best first."""
+    try:
+        logger.info(f"Similarity search for user {body.user_id} | queries={len(body.queries)}")
+        return await similar_messages(db, user_id=body.user_id, queries=body.queries, k=body.k)
+    except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code in (400, 422):
+            raise
+        logger.exception(f"Error in similarity search for user {body.user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search similar messages")
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.api.routes.export import NDJSON_MEDIA_TYPE
+from app.services.export_service import to_ndjson
+from app.services.purge_service import purge_user
+from app.db.session import shard_router
+from app.core.security import api_key_auth
+from app.core.logging import logger
+
+router = APIRouter(prefix="/users", tags=["Users"])
+
+
+async def _progress_lines(user_id: str, session_factory):
+    async for progress in purge_user(user_id, session_factory=session_factory):
+        yield to_ndjson(progress)
+
+
+@router.delete("/{user_id}", dependencies=[Depends(api_key_auth)])
+async def delete_user(user_id: str):
+    """Purge a user's sessions and messages, streaming NDJSON progress.
+
+    The last line carries ``"done": true``. If the stream is cut short,
+    the committed chunks stay deleted; repeat the request to finish.
+    """
+    logger.info(f"Purging all data of user {user_id}")
+    shard = await shard_router.shard_for_user(user_id, write=True)
+    return StreamingResponse(
+        _progress_lines(user_id, shard.session_factory), media_type=NDJSON_MEDIA_TYPE
+    )
@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Hashable, Tuple
+
+MISS = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class CacheBackend:
+    """Interface for read-through caches.
+
+    Readers call ``begin`` before querying the source of truth and pass the
+    returned token to ``set``. A value is only stored if no invalidation of
+    its key happened in between, so a slow read can never repopulate the
+    cache with data that a concurrent write already made stale.
+
+    Invalidations only reach the process that makes them. With several
+    workers, a write through one leaves the others' entries to expire, so
+    their staleness is bounded by the TTL rather than prevented.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: Hashable) -> Any:
+        raise NotImplementedError
+
+    def begin(self, key: Hashable) -> int:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any, token: int) -> None:
+        raise NotImplementedError
+
+    def invalidate(self, *keys: Hashable) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    def get(self, key):
+        self.stats.misses += 1
+        return MISS
+
+    def begin(self, key):
+        return 0
+
+    def set(self, key, value, token):
+        pass
+
+    def invalidate(self, *keys):
+        self.stats.invalidations += len(keys)
+
+    def clear(self):
+        pass
+
+
+class LRUTTLCache(CacheBackend):
+    """In-process cache bounded by entry count, with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Epoch at which each key was last invalidated, bounded like the entries.
+        # Once a record is dropped, ``_forgotten_epoch`` conservatively stands in.
+        self._epoch = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._forgotten_epoch = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return MISS
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return MISS
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def begin(self, key):
+        return self._epoch
+
+    def set(self, key, value, token):
+        if token < self._forgotten_epoch or token < self._invalidated.get(key, -1):
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, *keys):
+        self._epoch += 1
+        for key in keys:
+            self._entries.pop(key, None)
+            self._invalidated[key] = self._epoch
+            self._invalidated.move_to_end(key)
+            self.stats.invalidations += 1
+
+        while len(self._invalidated) > self.max_entries:
+            _, epoch = self._invalidated.popitem(last=False)
+            self._forgotten_epoch = max(self._forgotten_epoch, epoch)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def build_cache(backend: str, max_entries: int, ttl_seconds: float) -> CacheBackend:
+    if backend == "memory":
+        return LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend '{backend}'")
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
+from typing import Dict, List, Optional
 import os
 
 # Explicitly load the .env file
@@ -12,6 +13,117 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     RATE_LIMIT: str = "10/Minute"
     LOG_LEVEL: str = "INFO"
+    # Share of INFO-and-below logs kept, decided per request
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_QUEUE_SIZE: int = 10000
+
+    # Rate-limit counters; shm:// shares them between the workers of a host
+    RATE_LIMIT_STORAGE_URI: str = "shm://rag-chat-rate-limits"
+    RATE_LIMIT_STRATEGY: str = "sliding-window-counter"
+    RATE_LIMIT_SLOTS: int = 65536
+
+    # RAG contexts whose JSON is at least this many bytes are stored
+    # zlib-compressed; 0 disables compression
+    CONTEXT_COMPRESSION_THRESHOLD: int = 0
+
+    # Hash partitions of chat_messages on session_id, created by init_db for a
+    # new database; 0 keeps a single table
+    MESSAGE_PARTITIONS: int = 0
+
+    # Cold-session archiver (scripts/archive_sessions.py): sessions whose
+    # newest message is older than this move into chat_session_archives
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 100
+
+    # Sessions recounted per transaction by repair_session_activity
+    # (scripts/repair_session_activity.py)
+    ACTIVITY_REPAIR_BATCH_SIZE: int = 500
+
+    # User purges and the retention sweeper delete at most this many rows
+    # per transaction
+    PURGE_CHUNK_SIZE: int = 5000
+    # Messages older than this many days are deleted by a sweeper that every
+    # worker runs, one worker per shard at a time; 0 keeps everything
+    RETENTION_MAX_AGE_DAYS: int = 0
+    RETENTION_SWEEP_INTERVAL_SECONDS: float = 3600.0
+
+    # Live message streams (GET /messages/session/{id}/stream), off unless
+    # enabled. New messages are then published with NOTIFY, which serializes
+    # every writing commit on a global lock. LISTEN needs a session-pooled
+    # connection, so set DATABASE_LISTEN_URL when DATABASE_URL goes through
+    # a transaction-pooling pgbouncer.
+    MESSAGE_NOTIFY_ENABLED: bool = False
+    DATABASE_LISTEN_URL: Optional[str] = None
+    MESSAGE_STREAM_QUEUE_SIZE: int = 100
+    MESSAGE_STREAM_MAX_SUBSCRIBERS: int = 20000
+    MESSAGE_STREAM_HEARTBEAT_SECONDS: float = 15.0
+
+    # Deltas appended to streaming messages are written every this many ms,
+    # or sooner once this many characters are pending
+    MESSAGE_DELTA_FLUSH_MS: float = 200.0
+    MESSAGE_DELTA_FLUSH_CHARS: int = 4096
+    # Longest text a streamed message may reach, and how far past its known
+    # end a delta may start (deltas may arrive out of order, via any worker)
+    MESSAGE_STREAM_MAX_CHARS: int = 1_000_000
+    MESSAGE_DELTA_MAX_GAP_CHARS: int = 65536
+    # Failed writes of a message's runs before they are dropped; losing the
+    # database connection does not count
+    MESSAGE_DELTA_MAX_ATTEMPTS: int = 3
+
+    # Length of message embeddings and the memory the per-user similarity
+    # indexes of a worker may hold before least recently used ones are dropped
+    EMBEDDING_DIMENSIONS: int = 384
+    EMBEDDING_INDEX_MAX_MB: int = 512
+    # Loaded indexes re-read messages other workers wrote at most this often
+    EMBEDDING_INDEX_REFRESH_SECONDS: float = 60.0
+
+    # Connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Transaction-pooling pgbouncer cannot keep prepared statements per client
+    DB_PGBOUNCER_MODE: bool = False
+
+    # Further databases to spread users over, as a JSON object of shard name
+    # to URL; DATABASE_URL is the shard named "main". Users are placed on the
+    # shards listed in SHARD_RING (default: all of them) by consistent
+    # hashing; change the ring with scripts/rebalance_shards.py.
+    DATABASE_SHARD_URLS: Dict[str, str] = {}
+    SHARD_RING: List[str] = []
+    # Workers re-read the slots being moved between shards this often
+    SHARD_DIRECTORY_TTL_SECONDS: float = 5.0
+    # Pre-sharding session/message IDs whose shard a worker remembers
+    SHARD_LOOKUP_CACHE_SIZE: int = 100000
+    # Rows copied or deleted per statement when moving a slot between shards
+    SHARD_MOVE_BATCH_SIZE: int = 1000
+
+    # Optional read replica for read-only routes
+    DATABASE_READ_URL: Optional[str] = None
+    DB_READ_MAX_LAG_SECONDS: float = 5.0
+    DB_READ_HEALTH_CHECK_INTERVAL: float = 5.0
+
+    # Group-commit buffer for POST /messages/ (opt-in)
+    MESSAGE_WRITE_BUFFER_ENABLED: bool = False
+    MESSAGE_WRITE_BUFFER_WINDOW_MS: float = 5.0
+    MESSAGE_WRITE_BUFFER_MAX_BATCH: int = 100
+
+    # Per-worker read-through cache for per-user session lists ("memory" or
+    # "none"). Writes through another worker show up after at most the TTL.
+    SESSION_CACHE_BACKEND: str = "memory"
+    SESSION_CACHE_MAX_ENTRIES: int = 10000
+    SESSION_CACHE_TTL_SECONDS: float = 30.0
+
+    # Per-worker cache of each session's newest messages for /window. Messages
+    # added or removed through another worker are noticed on the next read by
+    # checking the session's counters; streamed content edits there show up
+    # after at most the TTL.
+    MESSAGE_TAIL_CACHE_BACKEND: str = "memory"
+    MESSAGE_TAIL_CACHE_MAX_SESSIONS: int = 10000
+    MESSAGE_TAIL_CACHE_TTL_SECONDS: float = 10.0
+    MESSAGE_TAIL_SIZE: int = 50
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,28 @@
+import json
+import zlib
+from typing import Any, Optional
+
+from app.core.config import settings
+
+
+def pack_context(context: Any) -> dict:
+    """Column values for a message's RAG context.
+
+    Contexts whose JSON encoding reaches CONTEXT_COMPRESSION_THRESHOLD bytes
+    are stored zlib-compressed in ``context_zlib`` with ``context`` left NULL;
+    smaller ones stay in the JSONB ``context`` column.
+    """
+    threshold = settings.CONTEXT_COMPRESSION_THRESHOLD
+    if context is None or threshold <= 0:
+        return {"context": context, "context_zlib": None}
+
+    encoded = json.dumps(context, separators=(",", ":")).encode()
+    if len(encoded) < threshold:
+        return {"context": context, "context_zlib": None}
+    return {"context": None, "context_zlib": zlib.compress(encoded)}
+
+
+def unpack_context(context: Any, context_zlib: Optional[bytes]) -> Any:
+    if context_zlib is not None:
+        return json.loads(zlib.decompress(context_zlib))
+    return context
@@ -0,0 +1,64 @@
+import re
+import time
+from contextvars import ContextVar
+from typing import Optional
+from uuid import uuid4
+
+from loguru import logger
+
+REQUEST_ID_HEADER = "x-request-id"
+SERVER_TIMING_HEADER = "server-timing"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Set for the lifetime of each HTTP request, read by every log record
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+
+class RequestContextMiddleware:
+    """Raw ASGI middleware giving every request a correlation ID and timing.
+
+    A well-formed inbound X-Request-ID (e.g. from the load balancer) is
+    reused, anything else is replaced; the ID is echoed on the response
+    along with a Server-Timing header measured up to the response start.
+    One access line with the full duration is logged per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid4().hex
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode(), request_id.encode()))
+                headers.append(
+                    (SERVER_TIMING_HEADER.encode(), f"app;dur={elapsed_ms:.1f}".encode())
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = correlation_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.info(f"{scope['method']} {scope['path']} {status} {elapsed_ms:.1f}ms")
+            correlation_id.reset(token)
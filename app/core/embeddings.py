@@ -0,0 +1,29 @@
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+# Embeddings are stored as little-endian float32, 4 bytes per dimension
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def pack_embedding(values: Optional[Sequence[float]]) -> Optional[bytes]:
+    """Column value of a message embedding (None stays None)."""
+    if values is None:
+        return None
+    return np.asarray(values, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def unpack_embeddings(blobs: Iterable[bytes], dimensions: int) -> np.ndarray:
+    """Stack embedding blobs into an (n, dimensions) float32 matrix."""
+    data = b"".join(blobs)
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE).reshape(-1, dimensions)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so dot products are cosine similarities.
+
+    All-zero rows are left as they are and score 0 against everything.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32, copy=False)
@@ -1,18 +1,42 @@
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 from app.core.logging import logger
 
 
-class GlobalExceptionMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class GlobalExceptionMiddleware:
+    """Raw ASGI middleware turning unhandled errors into a JSON 500.
+
+    Unlike BaseHTTPMiddleware it does not run the app in a separate task or
+    buffer the response through a memory stream, so streaming bodies pass
+    straight through. An error raised after the response has started can
+    no longer become a 500; it is logged and re-raised so the server
+    aborts the connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_wrapper)
         except Exception as exc:
             logger.exception(f"Unhandled exception: {exc}")
-            return JSONResponse(
+            if response_started:
+                raise
+            response = JSONResponse(
                 status_code=HTTP_500_INTERNAL_SERVER_ERROR,
                 content={"detail": "Internal server error"},
             )
+            await response(scope, receive, send)
@@ -1,7 +1,155 @@
-from loguru import logger
+"""Queued, structured JSON logging.
+
+Log calls only build a loguru record and append it to an in-memory queue;
+a background thread serializes records to JSON lines and writes them in
+batches, so a slow stdout never blocks the event loop. Records carry the
+request's correlation ID, and INFO-and-below logs can be sampled per
+request with LOG_SAMPLE_RATE.
+"""
+
+import atexit
+import json
+import random
 import sys
+import threading
+import traceback
+import zlib
+from collections import deque
+from typing import Optional, TextIO
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.correlation import correlation_id
+
+_SAMPLING_RESOLUTION = 10000
+_WARNING = 30
+
+
+class QueuedJSONSink:
+    """Loguru sink handing records to a background writer thread.
+
+    The queue is bounded; when the writer falls behind, the oldest records
+    are dropped (and counted) rather than growing memory or blocking.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        max_queue: int = 10000,
+        flush_interval: float = 0.05,
+    ):
+        self._stream = stream
+        self._queue = deque(maxlen=max_queue)
+        self._flush_interval = flush_interval
+        self._stopped = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def __call__(self, message):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(message.record)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if not self._drain():
+                self._stopped.wait(self._flush_interval)
+        self._drain()
+
+    def _drain(self) -> int:
+        lines = []
+        while True:
+            try:
+                record = self._queue.popleft()
+            except IndexError:
+                break
+            lines.append(to_json(record))
+        if lines:
+            self._stream.write("".join(lines))
+            self._stream.flush()
+        return len(lines)
+
+    def stop(self):
+        """Write out everything queued so far and stop the writer thread."""
+        self._stopped.set()
+        self._thread.join()
+
 
+def to_json(record) -> str:
+    extra = dict(record["extra"])
+    entry = {
+        "ts": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "request_id": extra.pop("request_id", None),
+    }
+    if extra:
+        entry["extra"] = extra
+    if record["exception"] is not None:
+        error_type, error, error_traceback = record["exception"]
+        entry["exception"] = "".join(
+            traceback.format_exception(error_type, error, error_traceback)
+        )
+    return json.dumps(entry, default=str) + "\n"
 
-def setup_logging():
+
+def _add_correlation_id(record):
+    record["extra"].setdefault("request_id", correlation_id.get())
+
+
+def sample_filter(sample_rate: float):
+    """Keep warnings and above; keep a ``sample_rate`` share of the rest.
+
+    Sampling is decided per correlation ID, so a request's logs are kept
+    or dropped together.
+    """
+    threshold = int(sample_rate * _SAMPLING_RESOLUTION)
+
+    def _filter(record) -> bool:
+        if record["level"].no >= _WARNING or threshold >= _SAMPLING_RESOLUTION:
+            return True
+        request_id = record["extra"].get("request_id")
+        if request_id is None:
+            return random.random() < sample_rate
+        return zlib.crc32(request_id.encode()) % _SAMPLING_RESOLUTION < threshold
+
+    return _filter
+
+
+_sink: Optional[QueuedJSONSink] = None
+
+
+def setup_logging(stream: TextIO = None) -> QueuedJSONSink:
+    global _sink
     logger.remove()
-    logger.add(sys.stdout, format="{time} {level} {message}", level="INFO")
+    if _sink is not None:
+        _sink.stop()
+
+    _sink = QueuedJSONSink(stream or sys.stdout, max_queue=settings.LOG_QUEUE_SIZE)
+    logger.configure(patcher=_add_correlation_id)
+    logger.add(
+        _sink,
+        format="{message}",
+        level=settings.LOG_LEVEL.upper(),
+        filter=sample_filter(settings.LOG_SAMPLE_RATE),
+    )
+    return _sink
+
+
+def flush_logging():
+    """Drain queued records; call on shutdown so the last logs are not lost."""
+    global _sink
+    if _sink is not None:
+        logger.remove()
+        _sink.stop()
+        _sink = None
+
+
+atexit.register(flush_logging)
@@ -0,0 +1,246 @@
+"""Minimal Prometheus text-format metrics.
+
+Instruments are plain dicts keyed by label-value tuples, updated from the
+event loop thread only, so recording is a dict lookup and an addition with
+no locking. Everything expensive (cumulative buckets, formatting, pool and
+cache gauges) happens at scrape time.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def _render_samples(self):
+        for labelvalues, value in list(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: non-cumulative bucket counts (last slot is +Inf), then sum
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def _render_samples(self):
+        for labelvalues, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}"
+            labels = _labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_number(series[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackMetric(Metric):
+    """Gauge (or counter) whose samples are read from callbacks at scrape time."""
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames,
+        callback: Callable[[], Iterable],
+        kind: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._callbacks = [callback]
+
+    def add_callback(self, callback: Callable[[], Iterable]):
+        self._callbacks.append(callback)
+
+    def _render_samples(self):
+        for callback in self._callbacks:
+            for labelvalues, value in callback():
+                yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template and method.",
+        ("method", "route"),
+    )
+)
+http_responses = registry.register(
+    Counter(
+        "http_responses_total",
+        "HTTP responses by route template, method and status code.",
+        ("method", "route", "status"),
+    )
+)
+db_statement_duration = registry.register(
+    Histogram(
+        "db_statement_duration_seconds",
+        "Database statement execution time by engine and statement type.",
+        ("engine", "statement"),
+    )
+)
+rate_limit_rejections = registry.register(
+    Counter(
+        "rate_limit_rejections_total",
+        "Requests rejected by the rate limiter, by path.",
+        ("path",),
+    )
+)
+
+
+class MetricsMiddleware:
+    """Raw ASGI middleware recording per-route latency and status codes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Templates, not raw paths, keep label cardinality bounded
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, method, path)
+            http_responses.inc(method, path, str(status))
+
+
+def _statement_type(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement of an (async) engine and export its pool gauges."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        db_statement_duration.observe(
+            time.perf_counter() - started, name, _statement_type(statement)
+        )
+
+    pool = sync_engine.pool
+    _pool_gauge("db_pool_checked_out", "Connections currently checked out.").add_callback(
+        lambda: [((name,), pool.checkedout())] if hasattr(pool, "checkedout") else []
+    )
+    _pool_gauge("db_pool_overflow", "Connections open beyond pool_size.").add_callback(
+        lambda: [((name,), max(pool.overflow(), 0))] if hasattr(pool, "overflow") else []
+    )
+
+
+def _pool_gauge(metric_name: str, documentation: str) -> CallbackMetric:
+    try:
+        return registry.get(metric_name)
+    except KeyError:
+        gauge = CallbackMetric(metric_name, documentation, ("engine",), lambda: [])
+        return registry.register(gauge)
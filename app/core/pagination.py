@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+from typing import Optional, Tuple
+from fastapi import HTTPException
+
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token."""
+    return _encode([created_at.isoformat(), str(row_id)])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, row_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+
+
+def encode_activity_cursor(last_message_at: Optional[datetime], row_id: UUID) -> str:
+    """Encode a (last_message_at, id) position; empty sessions have no timestamp."""
+    return _encode([last_message_at.isoformat() if last_message_at else None, str(row_id)])
+
+
+def decode_activity_cursor(cursor: str) -> Tuple[Optional[datetime], UUID]:
+    try:
+        last_message_at, row_id = _decode(cursor)
+        if last_message_at is not None:
+            last_message_at = datetime.fromisoformat(last_message_at)
+        return last_message_at, UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+
+
+def encode_rank_cursor(rank: float, row_id: UUID) -> str:
+    """Encode a (rank, id) keyset position for relevance-ordered results."""
+    return _encode([rank, str(row_id)])
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, UUID]:
+    try:
+        rank, row_id = _decode(cursor)
+        return float(rank), UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
@@ -0,0 +1,205 @@
+"""Rate-limit counters shared by every worker process on one host.
+
+Counters live in a memory-mapped file (under ``/dev/shm`` when available)
+holding an open-addressed table of fixed-size slots. A hit locks the few
+slots its key may occupy, rolls the window forward and updates the count in
+a single read-modify-write, so each request costs one atomic operation
+however many workers serve the traffic.
+
+Registered with ``limits`` under the ``shm://`` scheme: ``shm://<name>``
+places the table in shared memory, ``shm:///<absolute path>`` anywhere.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from struct import Struct
+from urllib.parse import urlparse
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport
+
+# Key fingerprint, window length (ms), window index, previous count, current count
+SLOT = Struct("<Qqqqq")
+PROBE_SLOTS = 8  # Slots a key may land in, locked together on every hit
+DEFAULT_SLOTS = 65536
+
+
+def _fingerprint(key: str) -> int:
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1  # 0 marks an empty slot
+
+
+def _shared_memory_path(name: str) -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport):
+    """Fixed- and sliding-window-counter storage shared through ``mmap``.
+
+    When every probe slot of a key holds a live counter, the one closest to
+    expiry is evicted, which can only make limits more lenient; size
+    ``slots`` well above the number of keys active in one window.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(
+        self,
+        uri: str = "shm://rate-limits",
+        wrap_exceptions: bool = False,
+        slots: int = DEFAULT_SLOTS,
+        **options,
+    ):
+        parsed = urlparse(uri)
+        self.path = _shared_memory_path(parsed.netloc) if parsed.netloc else parsed.path
+        self.slots = int(slots)
+        size = (self.slots + PROBE_SLOTS) * SLOT.size
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)  # New pages read as empty slots
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        # Record locks are per process, so threads of one worker queue here
+        self._thread_lock = threading.Lock()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    @contextmanager
+    def _locked(self, key: str):
+        fingerprint = _fingerprint(key)
+        start = (fingerprint % self.slots) * SLOT.size
+        length = PROBE_SLOTS * SLOT.size
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield fingerprint, start
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _find(self, fingerprint: int, start: int):
+        """Return (offset, slot) for the key, or (free offset, None)."""
+        victim, victim_stale_at = start, None
+        for offset in range(start, start + PROBE_SLOTS * SLOT.size, SLOT.size):
+            slot = SLOT.unpack_from(self._map, offset)
+            if slot[0] == fingerprint:
+                return offset, slot
+            # Both of a slot's windows are over two window lengths after it opened
+            stale_at = (slot[2] + 2) * slot[1] if slot[0] else 0
+            if victim_stale_at is None or stale_at < victim_stale_at:
+                victim, victim_stale_at = offset, stale_at
+        return victim, None
+
+    def _current(self, fingerprint: int, start: int, expiry: float, now: float):
+        """Locate the key's counters, rolled forward to the window holding ``now``."""
+        expiry_ms = max(int(expiry * 1000), 1)
+        window = int(now * 1000) // expiry_ms
+        offset, slot = self._find(fingerprint, start)
+
+        previous = current = 0
+        if slot is not None and slot[1] == expiry_ms:
+            if slot[2] == window:
+                previous, current = slot[3], slot[4]
+            elif slot[2] == window - 1:
+                previous = slot[4]
+        return offset, expiry_ms, window, previous, current
+
+    def _stored(self, key: str, now: float):
+        """Counters of a key at its stored window length, or None."""
+        with self._locked(key) as (fingerprint, start):
+            offset, slot = self._find(fingerprint, start)
+            if slot is None:
+                return None
+            return self._current(fingerprint, start, slot[1] / 1000, now)[1:]
+
+    def acquire_sliding_window_entry(
+        self, key: str, limit: int, expiry: int, amount: int = 1
+    ) -> bool:
+        if amount > limit:
+            return False
+
+        now = time.time()
+        with self._locked(key) as (fingerprint, start):
+            offset, expiry_ms, window, previous, current = self._current(
+                fingerprint, start, expiry, now
+            )
+            remaining_ms = (window + 1) * expiry_ms - now * 1000
+            weighted = previous * remaining_ms / expiry_ms + current
+            acquired = weighted + amount <= limit
+            if acquired:
+                current += amount
+            SLOT.pack_into(
+                self._map, offset, fingerprint, expiry_ms, window, previous, current
+            )
+        return acquired
+
+    def get_sliding_window(self, key: str, expiry: int):
+        now = time.time()
+        with self._locked(key) as (fingerprint, start):
+            _, expiry_ms, window, previous, current = self._current(
+                fingerprint, start, expiry, now
+            )
+        previous_ttl = (window + 1) * expiry_ms / 1000 - now
+        return previous, previous_ttl, current, previous_ttl + expiry
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self.clear(key)
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        with self._locked(key) as (fingerprint, start):
+            offset, expiry_ms, window, previous, current = self._current(
+                fingerprint, start, expiry, time.time()
+            )
+            current += amount
+            SLOT.pack_into(
+                self._map, offset, fingerprint, expiry_ms, window, previous, current
+            )
+        return current
+
+    def get(self, key: str) -> int:
+        stored = self._stored(key, time.time())
+        return stored[3] if stored else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        stored = self._stored(key, now)
+        if not stored or not stored[3]:
+            return now
+        expiry_ms, window = stored[0], stored[1]
+        return (window + 1) * expiry_ms / 1000
+
+    def check(self) -> bool:
+        return not self._map.closed
+
+    def clear(self, key: str) -> None:
+        with self._locked(key) as (fingerprint, start):
+            offset, slot = self._find(fingerprint, start)
+            if slot is not None:
+                SLOT.pack_into(self._map, offset, 0, 0, 0, 0, 0)
+
+    def reset(self) -> int:
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                cleared = sum(
+                    1
+                    for offset in range(0, len(self._map), SLOT.size)
+                    if SLOT.unpack_from(self._map, offset)[0]
+                )
+                self._map[:] = bytes(len(self._map))
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return cleared
@@ -1,5 +1,31 @@
+import hashlib
+
+from fastapi import Request
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.core.config import settings
+from app.core import rate_limit_storage  # noqa: F401  registers the shm:// scheme
+
+
+def rate_limit_key(request: Request) -> str:
+    """Bucket requests by API key and user rather than by client address.
+
+    Behind the load balancer every request shares one source IP, so the
+    address is only a fallback for calls without an API key.
+    """
+    api_key = request.headers.get("x-api-key")
+    if not api_key:
+        return f"ip:{get_remote_address(request)}"
+
+    key_digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    user_id = request.path_params.get("user_id") or request.query_params.get("user_id")
+    return f"key:{key_digest}:user:{user_id or '-'}"
+
 
-limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
+limiter = Limiter(
+    key_func=rate_limit_key,
+    default_limits=[settings.RATE_LIMIT],
+    strategy=settings.RATE_LIMIT_STRATEGY,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    storage_options={"slots": settings.RATE_LIMIT_SLOTS},
+)
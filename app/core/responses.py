@@ -0,0 +1,16 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson.
+
+    UUIDs, datetimes and enums are encoded natively, so list endpoints can
+    return plain dicts built from DB rows. UTC datetimes are written with a
+    trailing "Z", matching Pydantic's output for the same fields.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
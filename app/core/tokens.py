@@ -0,0 +1,20 @@
+"""Token estimates for prompt-window budgeting.
+
+The estimate is about four characters per token, close to what BPE
+tokenizers produce for English text. It is computed once when a message is
+written and stored in ``chat_messages.token_count``; rows written before
+that column existed fall back to the same formula in SQL.
+"""
+
+from sqlalchemy import func
+
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimated_tokens_sql(content_column):
+    """SQL counterpart of ``count_tokens`` (integer division in Postgres)."""
+    return (func.char_length(content_column) + (CHARS_PER_TOKEN - 1)) // CHARS_PER_TOKEN
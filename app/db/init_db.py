@@ -1,10 +1,178 @@
+from sqlalchemy import text
+
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import shard_router
 from app.db.models import *
+from app.db.models.chat_message import SEARCH_CONFIG
+from app.core.config import settings
 from app.core.logging import logger
+from app.services.archive_service import index_archived_messages
+from app.services.session_service import repair_session_activity
+
+# relkind of chat_messages: 'p' partitioned, 'r' plain table, NULL missing
+MESSAGES_TABLE_KIND = """
+SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')
+"""
+
+MESSAGE_PARTITION_COUNT = """
+SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass('chat_messages')
+"""
+
+# create_all only creates missing tables, so columns and indexes added to the
+# models later are brought to existing databases here, in order. Every
+# statement is a no-op once applied.
+SCHEMA_UPGRADES = (
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_messages_session_created_id
+    ON chat_messages (session_id, created_at, id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_created_id
+    ON chat_sessions (user_id, created_at, id)
+    """,
+    f"""
+    ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', content)) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_messages_content_tsv
+    ON chat_messages USING gin (content_tsv)
+    """,
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS context_zlib bytea",
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS token_count integer",
+    "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS archived_at timestamptz",
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS streaming boolean NOT NULL DEFAULT false",
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS embedding bytea",
+    """
+    ALTER TABLE chat_sessions
+        ADD COLUMN IF NOT EXISTS message_count integer NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS last_message_at timestamptz
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_activity
+    ON chat_sessions (user_id, last_message_at DESC NULLS LAST, id DESC)
+    """,
+    """
+    ALTER TABLE chat_session_archives
+        ADD COLUMN IF NOT EXISTS message_ids uuid[] NOT NULL DEFAULT '{}'
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_session_archives_message_ids
+    ON chat_session_archives USING gin (message_ids)
+    """,
+)
+
+# Columns whose rows need filling in when SCHEMA_UPGRADES adds them
+ACTIVITY_COUNTERS = ("chat_sessions", "message_count")
+ARCHIVED_MESSAGE_IDS = ("chat_session_archives", "message_ids")
+COLUMN_MISSING = """
+SELECT NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = current_schema()
+        AND table_name = :table AND column_name = :column
+)
+"""
+
+# Primary key of chat_messages and how many columns it spans
+MESSAGE_PRIMARY_KEY = """
+SELECT conname, cardinality(conkey) AS columns FROM pg_constraint
+WHERE conrelid = to_regclass('chat_messages') AND contype = 'p'
+"""
+
+MESSAGES_WITHOUT_SESSION = """
+SELECT EXISTS (SELECT 1 FROM chat_messages WHERE session_id IS NULL)
+"""
+
+
+async def _partition_messages(conn, partitions: int):
+    """Hash-partition chat_messages on session_id before create_all runs.
+
+    A session's messages share a partition, so every per-session read and
+    write touches one partition's (smaller) indexes, and each partition is
+    vacuumed on its own. Returns True once the partitions need creating.
+    """
+    kind = (await conn.execute(text(MESSAGES_TABLE_KIND))).scalar()
+    if kind == "r":
+        logger.warning(
+            "chat_messages already exists unpartitioned; MESSAGE_PARTITIONS is "
+            "ignored until its rows are moved into a partitioned table"
+        )
+        return False
+    if kind == "p":
+        existing = (await conn.execute(text(MESSAGE_PARTITION_COUNT))).scalar()
+        if existing != partitions:
+            logger.warning(
+                f"chat_messages has {existing} partition(s), MESSAGE_PARTITIONS is "
+                f"{partitions}; repartitioning is not automatic"
+            )
+            return False
+    ChatMessage.__table__.dialect_kwargs["postgresql_partition_by"] = "HASH (session_id)"
+    return True
+
+
+async def _widen_message_key(conn):
+    """Move a primary key on id alone to (id, session_id), as the models have it.
+
+    Tables created before partitioning have the narrow key, which imports'
+    ``ON CONFLICT (id, session_id)`` cannot use.
+    """
+    key = (await conn.execute(text(MESSAGE_PRIMARY_KEY))).first()
+    if key is None or key.columns > 1:
+        return
+    if (await conn.execute(text(MESSAGES_WITHOUT_SESSION))).scalar():
+        logger.warning(
+            "chat_messages has rows without a session_id; its primary key stays on "
+            "id, and imports fail, until they are deleted"
+        )
+        return
+    await conn.execute(
+        text(
+            f'ALTER TABLE chat_messages DROP CONSTRAINT "{key.conname}", '
+            f"ADD PRIMARY KEY (id, session_id)"
+        )
+    )
+    logger.info("chat_messages primary key widened to (id, session_id)")
+
+
+async def _upgrade_schema(conn) -> set:
+    """Apply SCHEMA_UPGRADES; returns the backfilled columns it just added."""
+    added = set()
+    for table, column in (ACTIVITY_COUNTERS, ARCHIVED_MESSAGE_IDS):
+        params = {"table": table, "column": column}
+        if (await conn.execute(text(COLUMN_MISSING), params)).scalar():
+            added.add((table, column))
+    await _widen_message_key(conn)
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+    return added
 
 
 async def init_db():
-    async with engine.begin() as conn:
+    """Create or upgrade the tables on every shard (shard_slots is only read on main)."""
+    for shard in shard_router.shards.values():
+        await _init_shard(shard)
+        logger.info(f"Tables of shard {shard.name} created or upgraded.")
+
+
+async def _init_shard(shard):
+    partitions = settings.MESSAGE_PARTITIONS
+    async with shard.engine.begin() as conn:
+        partitioned = partitions > 0 and await _partition_messages(conn, partitions)
         await conn.run_sync(Base.metadata.create_all)
-    logger.info("Tables created if not existing.")
+        if partitioned:
+            for remainder in range(partitions):
+                await conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS chat_messages_p{remainder} "
+                        f"PARTITION OF chat_messages "
+                        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+                    )
+                )
+            logger.info(f"chat_messages hash-partitioned into {partitions} partition(s)")
+        added = await _upgrade_schema(conn)
+    if ACTIVITY_COUNTERS in added:
+        # Sessions from before the counters start at zero until recounted
+        report = await repair_session_activity(shard.session_factory)
+        logger.info(f"Activity counters of shard {shard.name} backfilled: {report}")
+    if ARCHIVED_MESSAGE_IDS in added:
+        await index_archived_messages(shard.session_factory)
@@ -1,2 +1,5 @@
 from app.db.models.chat_message import ChatMessage
 from app.db.models.chat_session import ChatSession
+from app.db.models.chat_session_archive import ChatSessionArchive
+from app.db.models.import_checkpoint import ImportCheckpoint
+from app.db.models.shard_slot import ShardSlot
@@ -1,12 +1,19 @@
 import uuid
-from sqlalchemy import Column, ForeignKey, DateTime, Enum, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import (
+    Column, ForeignKey, DateTime, Enum, Integer, Text, Index, Computed, LargeBinary,
+    Boolean, false,
+)
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from enum import Enum as PyEnum
 from app.db.base import Base
 
 
+# Text search configuration of the generated search column and its queries
+SEARCH_CONFIG = "english"
+
+
 class senderEnum(PyEnum):
     user = "user"
     assistant = "assistant"
@@ -16,12 +23,44 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Part of the primary key so the table can be hash-partitioned on it
+    # (see init_db). That leaves ids unique only by construction: they are
+    # random UUIDs minted by the server, and imports skip ids already present
+    # (import_service.MERGE_MESSAGES). Statements that know the session match
+    # on it too; lookups by id alone expect at most one row and fail otherwise.
     session_id = Column(
-        UUID(as_uuid=True), ForeignKey("chat_sessions.id", ondelete="CASCADE")
+        UUID(as_uuid=True),
+        ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+        primary_key=True,
     )
     sender = Column(Enum(senderEnum), nullable=False)
     content = Column(Text, nullable=False)
-    context = Column(JSONB, nullable=True)
+    # Retrieved RAG chunks; deferred because listings rarely need them.
+    # Oversized contexts live compressed in context_zlib (see context_codec).
+    context = deferred(Column(JSONB, nullable=True))
+    context_zlib = deferred(Column(LargeBinary, nullable=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Estimated tokens of content (app.core.tokens), set on write; NULL for
+    # rows written before it existed
+    token_count = Column(Integer, nullable=True)
+    # True while an assistant reply is still being appended to (see
+    # app.services.message_delta_buffer); content holds the text so far
+    streaming = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Optional float32 embedding of content for similarity search
+    # (app.core.embeddings); deferred so listings never load it
+    embedding = deferred(Column(LargeBinary, nullable=True))
+    # Maintained by Postgres; deferred so listings never load it
+    content_tsv = deferred(
+        Column(
+            TSVECTOR,
+            Computed(f"to_tsvector('{SEARCH_CONFIG}', content)", persisted=True),
+        )
+    )
 
     session = relationship("ChatSession", back_populates="messages")
+
+    __table_args__ = (
+        # Serves keyset pagination of a session's history in both directions
+        Index("ix_chat_messages_session_created_id", "session_id", "created_at", "id"),
+        Index("ix_chat_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
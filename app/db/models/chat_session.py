@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import Column, String, Boolean, DateTime, Index, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -18,7 +18,29 @@ class ChatSession(Base):
         DateTime(timezone=True),
         onupdate=func.now(),
     )
+    # Set while the session's messages live in chat_session_archives
+    archived_at = Column(DateTime(timezone=True), nullable=True)
+    # Maintained in the transactions that add or delete messages (archived
+    # messages still count); repair_session_activity recomputes them.
+    # updatedAt only tracks edits of the session itself.
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
 
     messages = relationship(
-        "ChatMessage", back_populates="session", cascade="all, delete-orphan"
+        "ChatMessage",
+        back_populates="session",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Serves keyset pagination of a user's session list, newest first
+        Index("ix_chat_sessions_user_created_id", "user_id", "created_at", "id"),
+        # Serves ?order=activity: most recent message first, empty sessions last
+        Index(
+            "ix_chat_sessions_user_activity",
+            user_id,
+            last_message_at.desc().nullslast(),
+            id.desc(),
+        ),
     )
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, DateTime, LargeBinary
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ChatSessionArchive(Base):
+    """Messages of a cold session, packed into one compressed blob.
+
+    Written by the archiver (app.services.archive_service) in place of the
+    session's chat_messages rows and unpacked back into them on the next write.
+    """
+
+    __tablename__ = "chat_session_archives"
+
+    session_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # zlib-compressed JSON array of the messages, oldest first
+    messages_zlib = Column(LargeBinary, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    # IDs of the packed messages, so a message can be found by ID alone
+    message_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=False, server_default="{}")
+
+    __table_args__ = (
+        Index("ix_chat_session_archives_message_ids", "message_ids", postgresql_using="gin"),
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    job_id = Column(String, primary_key=True)
+    records_committed = Column(Integer, nullable=False, default=0)
+    sessions_imported = Column(Integer, nullable=False, default=0)
+    messages_imported = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
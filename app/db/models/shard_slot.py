@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, false
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ShardSlot(Base):
+    """Placement of a hash slot that differs from the shard ring.
+
+    Only read from the main shard (see app.db.sharding). Rows are written by
+    the rebalancer: one pins a slot to the shard holding its users while the
+    ring changes, ``moving`` refuses writes while the slot is being copied.
+    """
+
+    __tablename__ = "shard_slots"
+
+    slot = Column(Integer, primary_key=True, autoincrement=False)
+    shard = Column(String, nullable=False)
+    moving = Column(Boolean, nullable=False, default=False, server_default=false())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
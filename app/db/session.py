@@ -1,13 +1,164 @@
+import time
+from uuid import uuid4
+from fastapi import Request
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import instrument_engine
+from app.db.sharding import MAIN_SHARD, Shard, ShardRouter
 
-engine = create_async_engine(settings.DATABASE_URL, future=True, echo=False)
+
+def engine_options() -> dict:
+    connect_args = {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_PGBOUNCER_MODE:
+        # Statements may land on a different server connection each
+        # transaction, so never cache them and never reuse their names.
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+
+    return dict(
+        future=True,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options())
 AsyncSessionLocal = sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
 
+read_engine = (
+    create_async_engine(settings.DATABASE_READ_URL, **engine_options())
+    if settings.DATABASE_READ_URL
+    else None
+)
+AsyncReadSessionLocal = (
+    sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+    if read_engine is not None
+    else None
+)
+
+instrument_engine(engine, "primary")
+if read_engine is not None:
+    instrument_engine(read_engine, "replica")
+
+# DATABASE_URL is the "main" shard; see app.db.sharding
+shards = [
+    Shard(
+        MAIN_SHARD,
+        settings.DATABASE_URL,
+        engine,
+        AsyncSessionLocal,
+        AsyncReadSessionLocal or AsyncSessionLocal,
+    )
+]
+for name, url in settings.DATABASE_SHARD_URLS.items():
+    shard_engine = create_async_engine(url, **engine_options())
+    instrument_engine(shard_engine, f"shard-{name}")
+    shard_sessions = sessionmaker(bind=shard_engine, class_=AsyncSession, expire_on_commit=False)
+    shards.append(Shard(name, url, shard_engine, shard_sessions, shard_sessions))
+
+shard_router = ShardRouter(
+    shards,
+    ring=settings.SHARD_RING,
+    directory_ttl=settings.SHARD_DIRECTORY_TTL_SECONDS,
+    lookup_cache_size=settings.SHARD_LOOKUP_CACHE_SIZE,
+)
+
+# Zero when caught up or when the server is not a standby at all
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaHealth:
+    """Cached verdict on whether the read replica may serve requests.
+
+    The replica is probed at most once per ``interval`` seconds; in between,
+    routing costs a clock read. A failed probe or lag above ``max_lag``
+    sends reads to the primary until the next probe.
+    """
+
+    def __init__(self, engine, max_lag: float, interval: float):
+        self._engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self._usable = False
+        self._checked_at = float("-inf")
+
+    async def is_usable(self) -> bool:
+        if self._engine is None:
+            return False
+
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return self._usable
+
+        self._checked_at = now
+        try:
+            async with self._engine.connect() as conn:
+                lag = float((await conn.execute(REPLICA_LAG_QUERY)).scalar() or 0)
+            usable = lag <= self.max_lag
+            if not usable:
+                logger.warning(f"Read replica lagging by {lag:.1f}s, using primary")
+        except Exception as e:
+            logger.warning(f"Read replica unavailable, using primary: {e}")
+            usable = False
+
+        self._usable = usable
+        return usable
+
+
+replica_health = ReplicaHealth(
+    read_engine,
+    max_lag=settings.DB_READ_MAX_LAG_SECONDS,
+    interval=settings.DB_READ_HEALTH_CHECK_INTERVAL,
+)
+
+
+# Requests that may write are refused while their user's slot is moving
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+async def get_db(request: Request):
+    """Session on the shard of the request's session, message or user."""
+    shard = await shard_router.shard_for_request(
+        request, write=request.method not in READ_METHODS
+    )
+    async with shard.session_factory() as session:
+        yield session
+
+
+async def get_read_db(request: Request):
+    """Session for read-only routes: the replica when healthy, else the primary.
+
+    Replica reads may trail recent writes by up to DB_READ_MAX_LAG_SECONDS.
+    Only the main shard has a replica; other shards serve reads themselves.
+    """
+    shard = await shard_router.shard_for_request(request)
+    session_factory = shard.session_factory
+    if shard is shard_router.main and await replica_health.is_usable():
+        session_factory = AsyncReadSessionLocal
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
+    async with session_factory() as session:
         yield session
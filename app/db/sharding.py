@@ -0,0 +1,247 @@
+"""Spread users' sessions and messages over several databases.
+
+Every user hashes to one of ``SLOTS`` fixed slots, and the slots are placed
+on the shards named in SHARD_RING by consistent hashing, so adding or
+removing a shard only moves the slots it gains or loses. The slot, not the
+shard, is what gets baked into data: session and message IDs are version 8
+UUIDs whose first two bytes hold the owner's slot, so an ID routes without a
+lookup. IDs minted before sharding (version 4) are resolved once by asking
+every shard and cached.
+
+Slots whose data is not where the ring puts it (while the rebalancer moves
+them, see app.services.shard_rebalance) are listed in the ``shard_slots``
+table of the main shard; workers re-read it every
+SHARD_DIRECTORY_TTL_SECONDS. With a single shard none of this costs a query.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Request
+from sqlalchemy import BigInteger, bindparam, cast, func, literal, union_all
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.future import select
+
+from app.db.models import ChatMessage, ChatSession, ShardSlot
+
+# Fixed for the lifetime of the data: slots are encoded into IDs
+SLOTS = 1024
+VNODES = 64  # Points per shard on the ring
+MAIN_SHARD = "main"
+# Request fields that route a request, most specific first
+ROUTING_KEYS = ("session_id", "message_id", "user_id")
+
+
+def user_slot(user_id: str) -> int:
+    return int.from_bytes(hashlib.md5(user_id.encode()).digest()[:4], "big") % SLOTS
+
+
+def user_slot_sql(user_id_column):
+    """``user_slot`` computed by Postgres, for selecting a slot's rows."""
+    prefix = literal("x").concat(func.substr(func.md5(user_id_column), 1, 8))
+    return cast(cast(prefix, BIT(32)), BigInteger) % SLOTS
+
+
+def new_shard_id(slot: int) -> UUID:
+    """A random version 8 UUID carrying ``slot`` in its first two bytes."""
+    raw = bytearray(os.urandom(16))
+    raw[0:2] = slot.to_bytes(2, "big")
+    raw[6] = (raw[6] & 0x0F) | 0x80  # version 8
+    raw[8] = (raw[8] & 0x3F) | 0x80  # RFC 4122 variant
+    return UUID(bytes=bytes(raw))
+
+
+def id_slot(value: UUID) -> Optional[int]:
+    """Slot encoded in an ID, or None for IDs minted before sharding."""
+    if value.version != 8:
+        return None
+    return int.from_bytes(value.bytes[:2], "big") % SLOTS
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of slots onto shard names."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = VNODES):
+        points = sorted(
+            (_point(f"{node}#{replica}"), node) for node in set(nodes) for replica in range(vnodes)
+        )
+        if not points:
+            raise ValueError("A shard ring needs at least one shard")
+        self._points = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        position = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._nodes[position]
+
+    def placement(self) -> Tuple[str, ...]:
+        """Shard of every slot, indexed by slot."""
+        return tuple(self.node_for(f"slot-{slot}") for slot in range(SLOTS))
+
+
+class Shard(NamedTuple):
+    name: str
+    url: str
+    engine: Any
+    session_factory: Any
+    # Factory for background reads; the replica of the main shard if any
+    read_session_factory: Any
+
+
+# Owner of a session or message ID; either branch finds at most one row
+LEGACY_OWNER = union_all(
+    select(ChatSession.user_id).where(ChatSession.id == bindparam("entity_id")),
+    select(ChatSession.user_id)
+    .join(ChatMessage, ChatMessage.session_id == ChatSession.id)
+    .where(ChatMessage.id == bindparam("entity_id")),
+).limit(1)
+
+
+class ShardRouter:
+    """Resolves users, IDs and requests to the shard holding their data."""
+
+    def __init__(
+        self,
+        shards: Sequence[Shard],
+        ring: Sequence[str] = (),
+        directory_ttl: float = 5.0,
+        lookup_cache_size: int = 100000,
+    ):
+        self.shards: Dict[str, Shard] = {shard.name: shard for shard in shards}
+        if len(self.shards) != len(shards):
+            raise ValueError("Shard names must be unique")
+        unknown = set(ring) - set(self.shards)
+        if unknown:
+            raise ValueError(f"SHARD_RING names unconfigured shard(s): {sorted(unknown)}")
+        self.main = self.shards[MAIN_SHARD]
+        self.ring = HashRing(ring or self.shards)
+        self._placement = self.ring.placement()
+        self.directory_ttl = directory_ttl
+        self._overrides: Dict[int, Tuple[str, bool]] = {}
+        self._directory_read_at = float("-inf")
+        self._directory_lock = asyncio.Lock()
+        self.lookup_cache_size = lookup_cache_size
+        # Slots of pre-sharding IDs; an ID never changes owner
+        self._legacy_slots: "OrderedDict[UUID, int]" = OrderedDict()
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def ring_shard(self, slot: int) -> str:
+        return self._placement[slot]
+
+    async def read_directory(self) -> Dict[int, Tuple[str, bool]]:
+        async with self.main.session_factory() as db:
+            result = await db.execute(select(ShardSlot.slot, ShardSlot.shard, ShardSlot.moving))
+            return {row.slot: (row.shard, row.moving) for row in result.all()}
+
+    async def directory(self) -> Dict[int, Tuple[str, bool]]:
+        """Slot overrides, re-read at most every ``directory_ttl`` seconds."""
+        if time.monotonic() - self._directory_read_at < self.directory_ttl:
+            return self._overrides
+        async with self._directory_lock:
+            if time.monotonic() - self._directory_read_at >= self.directory_ttl:
+                self._overrides = await self.read_directory()
+                self._directory_read_at = time.monotonic()
+        return self._overrides
+
+    async def shard_for_slot(self, slot: int, write: bool = False) -> Shard:
+        if not self.sharded:
+            return self.main
+        override = (await self.directory()).get(slot)
+        if override is None:
+            return self.shards[self._placement[slot]]
+        name, moving = override
+        if moving and write:
+            raise HTTPException(
+                status_code=503,
+                detail="This user's data is being moved between shards; retry shortly.",
+                headers={"Retry-After": str(max(1, round(self.directory_ttl)))},
+            )
+        return self.shards[name]
+
+    async def shard_for_user(self, user_id: str, write: bool = False) -> Shard:
+        if not self.sharded:
+            return self.main
+        return await self.shard_for_slot(user_slot(user_id), write)
+
+    async def slot_for_id(self, entity_id: UUID) -> Optional[int]:
+        """Slot of a session or message ID; None if no shard knows the ID."""
+        slot = id_slot(entity_id)
+        if slot is not None:
+            return slot
+
+        slot = self._legacy_slots.get(entity_id)
+        if slot is not None:
+            self._legacy_slots.move_to_end(entity_id)
+            return slot
+
+        owners = await asyncio.gather(
+            *(self._legacy_owner(shard, entity_id) for shard in self.shards.values())
+        )
+        user_id = next((owner for owner in owners if owner is not None), None)
+        if user_id is None:
+            return None
+        slot = self._legacy_slots[entity_id] = user_slot(user_id)
+        if len(self._legacy_slots) > self.lookup_cache_size:
+            self._legacy_slots.popitem(last=False)
+        return slot
+
+    async def _legacy_owner(self, shard: Shard, entity_id: UUID) -> Optional[str]:
+        async with shard.read_session_factory() as db:
+            result = await db.execute(LEGACY_OWNER, {"entity_id": entity_id})
+            return result.scalar_one_or_none()
+
+    async def shard_for_id(self, entity_id: UUID, write: bool = False) -> Shard:
+        """Shard of a session or message ID; unknown IDs go to the main shard."""
+        if not self.sharded:
+            return self.main
+        slot = await self.slot_for_id(entity_id)
+        if slot is None:
+            return self.main
+        return await self.shard_for_slot(slot, write)
+
+    async def shard_for_request(self, request: Request, write: bool = False) -> Shard:
+        """Shard named by a request's path, query or JSON body fields.
+
+        Requests naming none of ROUTING_KEYS (or a malformed one, which
+        validation rejects anyway) are served by the main shard.
+        """
+        if not self.sharded:
+            return self.main
+        for fields in (request.path_params, request.query_params, await _json_fields(request)):
+            for key in ROUTING_KEYS:
+                value = fields.get(key)
+                if not value or not isinstance(value, str):
+                    continue
+                if key == "user_id":
+                    return await self.shard_for_user(value, write)
+                try:
+                    entity_id = UUID(value)
+                except ValueError:
+                    return self.main
+                return await self.shard_for_id(entity_id, write)
+        return self.main
+
+
+async def _json_fields(request: Request) -> dict:
+    # FastAPI has already read (and cached) the body of a route with one
+    if request.headers.get("content-type", "").split(";")[0] != "application/json":
+        return {}
+    try:
+        body = await request.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
@@ -1,14 +1,24 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from app.api.routes import register_routes
 from app.core.logging import setup_logging
+from app.core.correlation import RequestContextMiddleware
 from app.core.exception_handler import GlobalExceptionMiddleware
+from app.core.metrics import MetricsMiddleware, registry, rate_limit_rejections, CONTENT_TYPE
 
 from app.core.rate_limiter import limiter
+from app.services.write_buffer import message_write_buffer
+from app.services.message_delta_buffer import message_delta_buffer
+from app.services.purge_service import run_retention_sweeper
+from app.services.message_stream import stream_hubs
+from app.core.config import settings
 
 setup_logging()
 
@@ -22,20 +32,59 @@ app = FastAPI(
 )
 
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    rate_limit_rejections.inc(request.url.path)
+    return _rate_limit_exceeded_handler(request, exc)
+
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # ["http://localhost:3000"]
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["Authorization", "Content-Type"],
 )
 
 app.add_middleware(GlobalExceptionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
 register_routes(app)
 
 
+@app.on_event("startup")
+async def start_retention_sweeper():
+    if settings.RETENTION_MAX_AGE_DAYS > 0:
+        app.state.retention_sweeper = asyncio.create_task(run_retention_sweeper())
+
+
+@app.on_event("shutdown")
+async def stop_retention_sweeper():
+    sweeper = getattr(app.state, "retention_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+
+
+@app.on_event("shutdown")
+async def close_message_streams():
+    for hub in stream_hubs():
+        await hub.close()
+
+
+@app.on_event("shutdown")
+async def flush_write_buffer():
+    await message_write_buffer.drain()
+    await message_delta_buffer.drain()
+
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,14 +1,38 @@
-from pydantic import BaseModel
+import json
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from sqlalchemy import inspect
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
 
 
 class ChatMessageCreate(BaseModel):
     session_id: UUID
     sender: str
     content: str
-    context: Optional[str] = None
+    context: Optional[Any] = None
+    embedding: Optional[List[float]] = None
+
+    @field_validator("embedding")
+    @classmethod
+    def check_dimensions(cls, value):
+        if value is not None and len(value) != settings.EMBEDDING_DIMENSIONS:
+            raise ValueError(f"Embedding must have {settings.EMBEDDING_DIMENSIONS} dimensions")
+        return value
+
+    @field_validator("context", mode="before")
+    @classmethod
+    def decode_json_string(cls, value):
+        # Older clients send the context pre-serialized; store it as JSON
+        # rather than as a JSON string holding JSON.
+        if isinstance(value, str) and value.lstrip()[:1] in ("{", "["):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
 
 
 class ChatMessageOut(BaseModel):
@@ -16,8 +40,85 @@ class ChatMessageOut(BaseModel):
     session_id: UUID
     sender: str
     content: str
-    context: Optional[str]
+    context: Optional[Any] = None
     created_at: datetime
+    # True while the message is still being streamed in
+    streaming: bool = False
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @model_validator(mode="before")
+    @classmethod
+    def skip_unloaded_columns(cls, data):
+        # Deferred columns that were not loaded (e.g. context) are left at
+        # their default instead of triggering a lazy load.
+        state = inspect(data, raiseerr=False)
+        if state is None or not hasattr(state, "unloaded"):
+            return data
+        unloaded = state.unloaded
+        return {
+            name: getattr(data, name)
+            for name in cls.model_fields
+            if name not in unloaded and hasattr(data, name)
+        }
+
+
+class ChatMessageStreamCreate(BaseModel):
+    session_id: UUID
+    sender: str = "assistant"
+    context: Optional[Any] = None
+
+
+class ChatMessageDelta(BaseModel):
+    # Character offset of the delta within the message, i.e. the length of
+    # everything streamed before it; makes appends idempotent and ordering-proof
+    offset: int = Field(..., ge=0, le=settings.MESSAGE_STREAM_MAX_CHARS)
+    delta: str
+
+    @model_validator(mode="after")
+    def fits_in_a_message(self):
+        if self.offset + len(self.delta) > settings.MESSAGE_STREAM_MAX_CHARS:
+            raise ValueError(
+                f"A streamed message is limited to {settings.MESSAGE_STREAM_MAX_CHARS} characters"
+            )
+        return self
+
+
+class ChatMessageDeltaOut(BaseModel):
+    message_id: UUID
+    buffered_chars: int
+
+
+class ChatMessageFinalize(BaseModel):
+    # The complete reply; when given it replaces whatever was streamed
+    content: Optional[str] = None
+
+
+class ChatMessageWindowOut(BaseModel):
+    id: UUID
+    session_id: UUID
+    sender: str
+    content: str
+    created_at: datetime
+    token_count: int
+
+
+class ChatMessageContextOut(BaseModel):
+    message_id: UUID
+    context: Optional[Any] = None
+
+
+class ChatMessageBatchCreate(BaseModel):
+    # Items are validated one by one in the service so that a single bad
+    # message is reported back instead of rejecting the whole batch.
+    messages: List[Dict[str, Any]]
+
+
+class ChatMessageBatchError(BaseModel):
+    index: int
+    detail: Any
+
 
-    class config:
-        orm_mode = True
+class ChatMessageBatchOut(BaseModel):
+    created: List[ChatMessageOut]
+    errors: List[ChatMessageBatchError]
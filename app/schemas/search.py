@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from uuid import UUID
+from datetime import datetime
+from typing import List, Optional
+
+
+class SearchHit(BaseModel):
+    message_id: UUID
+    session_id: UUID
+    session_title: Optional[str]
+    sender: str
+    snippet: str
+    rank: float
+    created_at: datetime
+
+
+class SimilarSearch(BaseModel):
+    user_id: str
+    # One or more query embeddings, scored together in one pass
+    queries: List[List[float]]
+    k: int = 10
+
+
+class SimilarHit(BaseModel):
+    message_id: UUID
+    session_id: UUID
+    session_title: Optional[str]
+    sender: str
+    content: str
+    score: float
+    created_at: datetime
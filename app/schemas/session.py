@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from uuid import UUID
 from datetime import datetime
 from typing import Optional
@@ -10,8 +10,8 @@ class ChatSessionCreate(BaseModel):
 
 
 class ChatSessionUpdate(BaseModel):
-    title: Optional[str]
-    is_favorite: Optional[bool]
+    title: Optional[str] = None
+    is_favorite: Optional[bool] = None
 
 
 class ChatSessionOut(BaseModel):
@@ -20,9 +20,14 @@ class ChatSessionOut(BaseModel):
     title: str
     is_favorite: bool
     created_at: datetime
-
-    class config:
-        orm_mode = True
+    # Activity counters kept on the session row, so always filled for a
+    # single session; the session list only selects them with ?include=stats
+    message_count: Optional[int] = None
+    last_message_at: Optional[datetime] = None
+    # Only populated when requested with ?include=preview
+    last_message_preview: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 class RenameSession(BaseModel):
@@ -0,0 +1,317 @@
+import base64
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from uuid import UUID
+
+import orjson
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.db.models import ChatMessage, ChatSession, ChatSessionArchive
+from app.db.session import AsyncSessionLocal
+from app.core.config import settings
+from app.core.context_codec import pack_context, unpack_context
+from app.core.logging import logger
+
+# Columns read from chat_messages when archiving a session
+ARCHIVE_COLUMNS = (
+    ChatMessage.id,
+    ChatMessage.sender,
+    ChatMessage.content,
+    ChatMessage.context,
+    ChatMessage.context_zlib,
+    ChatMessage.created_at,
+    ChatMessage.token_count,
+    ChatMessage.embedding,
+)
+
+
+class ArchivedMessage(NamedTuple):
+    """A message unpacked from an archive, shaped like a chat_messages row."""
+
+    id: UUID
+    session_id: UUID
+    sender: str
+    content: str
+    context: object
+    context_zlib: Optional[bytes]
+    created_at: datetime
+    token_count: Optional[int]
+    streaming: bool = False
+    embedding: Optional[bytes] = None
+
+
+def pack_archive(rows) -> bytes:
+    """Compress a session's message rows (oldest first) into one blob."""
+    messages = [
+        [
+            row.id,
+            getattr(row.sender, "value", row.sender),
+            row.content,
+            unpack_context(row.context, row.context_zlib),
+            row.created_at,
+            row.token_count,
+            base64.b64encode(row.embedding).decode() if row.embedding else None,
+        ]
+        for row in rows
+    ]
+    return zlib.compress(orjson.dumps(messages))
+
+
+def unpack_archive(session_id: UUID, blob: bytes) -> List[ArchivedMessage]:
+    return [
+        ArchivedMessage(
+            id=UUID(message_id),
+            session_id=session_id,
+            sender=sender,
+            content=content,
+            context=context,
+            context_zlib=None,
+            created_at=datetime.fromisoformat(created_at),
+            token_count=token_count,
+            # Archives packed before embeddings existed have no seventh field
+            embedding=base64.b64decode(embedding[0]) if embedding and embedding[0] else None,
+        )
+        for message_id, sender, content, context, created_at, token_count, *embedding in (
+            orjson.loads(zlib.decompress(blob))
+        )
+    ]
+
+
+async def load_archived_messages(
+    db: AsyncSession, session_id: UUID
+) -> Optional[List[ArchivedMessage]]:
+    """Messages of an archived session, oldest first, or None if it is not archived."""
+    result = await db.execute(
+        select(ChatSessionArchive.messages_zlib).where(
+            ChatSessionArchive.session_id == session_id
+        )
+    )
+    blob = result.scalar_one_or_none()
+    if blob is None:
+        return None
+    return unpack_archive(session_id, blob)
+
+
+async def find_archived_message(db: AsyncSession, message_id: UUID) -> Optional[ArchivedMessage]:
+    """An archived message by ID alone, or None if no archive holds it."""
+    result = await db.execute(
+        select(ChatSessionArchive.session_id, ChatSessionArchive.messages_zlib).where(
+            ChatSessionArchive.message_ids.contains([message_id])
+        )
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+    return next(
+        (m for m in unpack_archive(row.session_id, row.messages_zlib) if m.id == message_id),
+        None,
+    )
+
+
+def _set_archived_at(session_id: UUID, value):
+    # Archiving is not an edit of the session, so updatedAt is left alone
+    return (
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(archived_at=value, updatedAt=ChatSession.updatedAt)
+    )
+
+
+async def rehydrate_session(db: AsyncSession, session_id: UUID) -> int:
+    """Move an archived session's messages back into chat_messages.
+
+    Runs in the caller's transaction, which must hold a lock on the session
+    row (see ``lock_sessions_for_write``). Returns the number of messages
+    restored.
+    """
+    result = await db.execute(
+        delete(ChatSessionArchive)
+        .where(ChatSessionArchive.session_id == session_id)
+        .returning(ChatSessionArchive.messages_zlib)
+    )
+    blob = result.scalar_one_or_none()
+    restored = 0
+    if blob is not None:
+        rows = []
+        for message in unpack_archive(session_id, blob):
+            row = {
+                "id": message.id,
+                "session_id": session_id,
+                "sender": message.sender,
+                "content": message.content,
+                "created_at": message.created_at,
+                "token_count": message.token_count,
+                "embedding": message.embedding,
+            }
+            row.update(pack_context(message.context))
+            rows.append(row)
+        if rows:
+            await db.execute(insert(ChatMessage), rows)
+        restored = len(rows)
+
+    await db.execute(_set_archived_at(session_id, None))
+    logger.info(f"Rehydrated {restored} archived message(s) of session: {session_id}")
+    return restored
+
+
+async def lock_sessions_for_write(
+    db: AsyncSession, session_ids: Iterable[UUID]
+) -> Dict[UUID, str]:
+    """Lock sessions about to receive messages and rehydrate archived ones.
+
+    The KEY SHARE lock is the one the foreign key check would take anyway; it
+    waits out an archiver holding the session, so new messages never land
+    beside an archive. Returns the user ID of each session that exists.
+    """
+    result = await db.execute(
+        select(ChatSession.id, ChatSession.user_id, ChatSession.archived_at)
+        .where(ChatSession.id.in_(set(session_ids)))
+        .with_for_update(key_share=True)
+    )
+    existing = {}
+    for row in result.all():
+        existing[row.id] = row.user_id
+        if row.archived_at is not None:
+            await rehydrate_session(db, row.id)
+    return existing
+
+
+async def archive_session(db: AsyncSession, session_id: UUID, cutoff: datetime) -> int:
+    """Archive one session if its newest message is older than ``cutoff``.
+
+    The session row is locked FOR UPDATE, which blocks concurrent message
+    inserts until the archive is committed. Returns the number of messages
+    archived (0 when the session was skipped).
+    """
+    locked = await db.execute(
+        select(ChatSession.id)
+        .where(ChatSession.id == session_id, ChatSession.archived_at.is_(None))
+        .with_for_update()
+    )
+    if locked.scalar_one_or_none() is None:
+        await db.rollback()
+        return 0
+
+    result = await db.execute(
+        select(*ARCHIVE_COLUMNS)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+    )
+    rows = result.all()
+    # Re-checked under the lock: a message may have arrived since selection
+    if not rows or rows[-1].created_at >= cutoff:
+        await db.rollback()
+        return 0
+
+    db.add(
+        ChatSessionArchive(
+            session_id=session_id,
+            messages_zlib=pack_archive(rows),
+            message_count=len(rows),
+            last_message_at=rows[-1].created_at,
+            message_ids=[row.id for row in rows],
+        )
+    )
+    await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+    await db.execute(_set_archived_at(session_id, func.now()))
+    await db.commit()
+    return len(rows)
+
+
+async def archive_cold_sessions(
+    session_factory=AsyncSessionLocal,
+    after_days: int = settings.ARCHIVE_AFTER_DAYS,
+    batch_size: int = settings.ARCHIVE_BATCH_SIZE,
+) -> dict:
+    """Archive every session with no message in the last ``after_days`` days.
+
+    Candidates are walked in ID order, ``batch_size`` at a time, and each
+    session is archived in its own short transaction so live traffic is
+    never blocked for long. Sessions without messages are left alone.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=after_days)
+
+    sessions = messages = 0
+    last_id = None
+    async with session_factory() as db:
+        while True:
+            # Candidates come from the activity counters; archive_session
+            # re-checks the messages themselves under its lock
+            query = select(ChatSession.id).where(
+                ChatSession.archived_at.is_(None), ChatSession.last_message_at < cutoff
+            )
+            if last_id is not None:
+                query = query.where(ChatSession.id > last_id)
+            result = await db.execute(query.order_by(ChatSession.id).limit(batch_size))
+            candidates = result.scalars().all()
+            await db.rollback()  # end the read before locking sessions one by one
+
+            for session_id in candidates:
+                try:
+                    archived = await archive_session(db, session_id, cutoff)
+                except Exception as e:
+                    logger.exception(f"Failed to archive session {session_id}: {e}")
+                    await db.rollback()
+                    continue
+                if archived:
+                    sessions += 1
+                    messages += archived
+
+            if len(candidates) < batch_size:
+                break
+            last_id = candidates[-1]
+
+    report = {
+        "sessions_archived": sessions,
+        "messages_archived": messages,
+        "cutoff": cutoff.isoformat(),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Archived cold sessions: {report}")
+    return report
+
+
+async def index_archived_messages(
+    session_factory=AsyncSessionLocal, batch_size: int = settings.ARCHIVE_BATCH_SIZE
+) -> dict:
+    """Fill in message_ids of archives packed before the column existed."""
+    started = time.perf_counter()
+    indexed = 0
+    async with session_factory() as db:
+        while True:
+            result = await db.execute(
+                select(ChatSessionArchive.session_id, ChatSessionArchive.messages_zlib)
+                .where(
+                    func.cardinality(ChatSessionArchive.message_ids) == 0,
+                    ChatSessionArchive.message_count > 0,
+                )
+                .order_by(ChatSessionArchive.session_id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            for row in rows:
+                await db.execute(
+                    update(ChatSessionArchive)
+                    .where(ChatSessionArchive.session_id == row.session_id)
+                    .values(
+                        message_ids=[
+                            m.id for m in unpack_archive(row.session_id, row.messages_zlib)
+                        ]
+                    )
+                )
+            await db.commit()
+            indexed += len(rows)
+            if len(rows) < batch_size:
+                break
+
+    report = {
+        "archives_indexed": indexed,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Indexed messages of archived sessions: {report}")
+    return report
@@ -0,0 +1,282 @@
+"""Per-user in-memory matrices of message embeddings for similarity search.
+
+A user's embeddings are read from chat_messages on their first search and
+kept as one float32 matrix of unit-length rows, so a batch of queries is a
+single matrix product followed by a partial sort. Messages added through
+this worker are appended as they are committed; ones written by other
+workers are picked up by a periodic incremental re-read, and ones found
+deleted when a search reads its winning rows are pruned. Matrices are
+evicted least recently used first once the worker's budget is exceeded.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.future import select
+
+from app.db.models import ChatMessage, ChatSession
+from app.db.session import AsyncReadSessionLocal, AsyncSessionLocal, shard_router
+from app.core.config import settings
+from app.core.embeddings import EMBEDDING_DTYPE, normalize, unpack_embeddings
+from app.core.logging import logger
+from app.core.metrics import registry, CallbackMetric
+
+INITIAL_CAPACITY = 1024
+# created_at is taken when the writing transaction starts, so a re-read also
+# covers this much before the newest indexed message
+REFRESH_SLACK = timedelta(seconds=30)
+
+
+class EmbeddingRow(NamedTuple):
+    id: UUID
+    session_id: UUID
+    created_at: datetime
+    embedding: Optional[bytes]
+
+
+class UserVectors:
+    """Unit-length embeddings of one user's messages, one matrix row each."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.matrix = np.empty((0, dimensions), dtype=np.float32)
+        self.size = 0
+        self.message_ids: List[UUID] = []
+        self.session_ids: List[UUID] = []
+        self._indexed = set()
+        self.latest: Optional[datetime] = None
+        self.refreshed_at = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def extend(self, rows: Iterable) -> int:
+        """Append rows not indexed yet; returns how many were added."""
+        blob_size = self.dimensions * EMBEDDING_DTYPE.itemsize
+        fresh = []
+        for row in rows:
+            if row.embedding is None or len(row.embedding) != blob_size:
+                continue  # written under a different EMBEDDING_DIMENSIONS
+            if row.id in self._indexed:
+                continue
+            self._indexed.add(row.id)
+            fresh.append(row)
+            if self.latest is None or row.created_at > self.latest:
+                self.latest = row.created_at
+        if not fresh:
+            return 0
+
+        size = self.size + len(fresh)
+        if size > len(self.matrix):
+            capacity = max(size, len(self.matrix) + len(self.matrix) // 4, INITIAL_CAPACITY)
+            grown = np.empty((capacity, self.dimensions), dtype=np.float32)
+            grown[: self.size] = self.matrix[: self.size]
+            self.matrix = grown
+        vectors = unpack_embeddings((row.embedding for row in fresh), self.dimensions)
+        self.matrix[self.size : size] = normalize(vectors)
+        self.message_ids.extend(row.id for row in fresh)
+        self.session_ids.extend(row.session_id for row in fresh)
+        # Published last: a concurrent search only reads the first ``size`` rows
+        self.size = size
+        return len(fresh)
+
+    def without(self, message_ids) -> "UserVectors":
+        """A copy lacking the rows of ``message_ids``."""
+        gone = set(message_ids)
+        keep = [
+            position for position, message_id in enumerate(self.message_ids[: self.size])
+            if message_id not in gone
+        ]
+        pruned = UserVectors(self.dimensions)
+        pruned.matrix = self.matrix[keep]
+        pruned.size = len(keep)
+        pruned.message_ids = [self.message_ids[position] for position in keep]
+        pruned.session_ids = [self.session_ids[position] for position in keep]
+        pruned._indexed = self._indexed - gone
+        pruned.latest = self.latest
+        pruned.refreshed_at = self.refreshed_at
+        return pruned
+
+    def top_k(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions and cosine scores of the ``k`` best rows per query.
+
+        ``queries`` are unit-length rows; results are ordered best first.
+        """
+        size = self.size
+        scores = queries @ self.matrix[:size].T
+        k = min(k, size)
+        if k < size:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(size), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class EmbeddingIndex:
+    """LRU of per-user vector matrices, each loaded on first use."""
+
+    def __init__(
+        self,
+        session_factory,
+        dimensions: int,
+        max_bytes: int,
+        refresh_seconds: float,
+        router=None,
+    ):
+        self._session_factory = session_factory
+        # Reads each user's rows from their shard when set
+        self._router = router
+        self.dimensions = dimensions
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self._users: "OrderedDict[str, UserVectors]" = OrderedDict()
+        self._loads: Dict[str, asyncio.Future] = {}
+        # Rows committed while a user's index is being read, applied after
+        self._added_while_loading: Dict[str, List[EmbeddingRow]] = {}
+        self.nbytes = 0
+
+    async def _read(self, user_id: str, since: Optional[datetime] = None) -> list:
+        query = (
+            select(
+                ChatMessage.id,
+                ChatMessage.session_id,
+                ChatMessage.created_at,
+                ChatMessage.embedding,
+            )
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+            .where(ChatSession.user_id == user_id, ChatMessage.embedding.is_not(None))
+        )
+        if since is not None:
+            query = query.where(ChatMessage.created_at > since)
+        session_factory = self._session_factory
+        if self._router is not None:
+            session_factory = (await self._router.shard_for_user(user_id)).read_session_factory
+        async with session_factory() as db:
+            result = await db.execute(query.order_by(ChatMessage.created_at, ChatMessage.id))
+            return result.all()
+
+    async def _load(self, user_id: str) -> UserVectors:
+        self._added_while_loading[user_id] = []
+        try:
+            started = time.perf_counter()
+            vectors = UserVectors(self.dimensions)
+            vectors.extend(await self._read(user_id))
+        finally:
+            added = self._added_while_loading.pop(user_id)
+        vectors.extend(added)
+
+        self._users[user_id] = vectors
+        self.nbytes += vectors.nbytes
+        self._evict()
+        logger.info(
+            f"Loaded {vectors.size} embedding(s) of user {user_id} "
+            f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return vectors
+
+    async def _refresh(self, user_id: str, vectors: UserVectors):
+        vectors.refreshed_at = time.monotonic()
+        since = vectors.latest - REFRESH_SLACK if vectors.latest else None
+        rows = await self._read(user_id, since)
+        if self._users.get(user_id) is vectors:
+            self._extend(vectors, rows)
+
+    def _extend(self, vectors: UserVectors, rows):
+        before = vectors.nbytes
+        vectors.extend(rows)
+        self.nbytes += vectors.nbytes - before
+        self._evict()
+
+    def _evict(self):
+        # The most recently used index stays even when it alone is over budget
+        while self.nbytes > self.max_bytes and len(self._users) > 1:
+            user_id, vectors = self._users.popitem(last=False)
+            self.nbytes -= vectors.nbytes
+            logger.info(f"Evicted embedding index of user {user_id} ({vectors.size} rows)")
+
+    async def get(self, user_id: str) -> UserVectors:
+        vectors = self._users.get(user_id)
+        if vectors is not None:
+            self._users.move_to_end(user_id)
+            if time.monotonic() - vectors.refreshed_at >= self.refresh_seconds:
+                await self._refresh(user_id, vectors)
+            return vectors
+
+        load = self._loads.get(user_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load(user_id))
+            self._loads[user_id] = load
+            load.add_done_callback(lambda _: self._loads.pop(user_id, None))
+        # Shielded so a cancelled request does not abort a load others await
+        return await asyncio.shield(load)
+
+    def add(self, user_id: str, rows: Iterable[EmbeddingRow]):
+        """Fold committed messages into the user's index if it is in memory."""
+        rows = [row for row in rows if row.embedding is not None]
+        if not rows:
+            return
+        vectors = self._users.get(user_id)
+        if vectors is not None:
+            self._extend(vectors, rows)
+        elif user_id in self._added_while_loading:
+            self._added_while_loading[user_id].extend(rows)
+
+    def forget(self, user_id: str, message_ids: Iterable[UUID]):
+        """Drop messages that no longer exist from the user's index."""
+        vectors = self._users.get(user_id)
+        if vectors is None:
+            return
+        # Swapped rather than pruned in place: a search may be reading it
+        pruned = vectors.without(message_ids)
+        self._users[user_id] = pruned
+        self.nbytes += pruned.nbytes - vectors.nbytes
+        logger.info(
+            f"Pruned {vectors.size - pruned.size} embedding(s) from the index of user {user_id}"
+        )
+
+    def discard(self, user_id: str):
+        vectors = self._users.pop(user_id, None)
+        if vectors is not None:
+            self.nbytes -= vectors.nbytes
+
+    async def search(
+        self, user_id: str, queries: np.ndarray, k: int
+    ) -> List[List[Tuple[UUID, UUID, float]]]:
+        """(session_id, message_id, score) of the ``k`` nearest messages per query."""
+        vectors = await self.get(user_id)
+        if vectors.size == 0:
+            return [[] for _ in queries]
+        # BLAS releases the GIL, so large matrices do not stall the event loop
+        positions, scores = await asyncio.to_thread(vectors.top_k, normalize(queries), k)
+        return [
+            [
+                (vectors.session_ids[position], vectors.message_ids[position], float(score))
+                for position, score in zip(row_positions, row_scores)
+            ]
+            for row_positions, row_scores in zip(positions.tolist(), scores.tolist())
+        ]
+
+
+embedding_index = EmbeddingIndex(
+    AsyncReadSessionLocal or AsyncSessionLocal,
+    dimensions=settings.EMBEDDING_DIMENSIONS,
+    max_bytes=settings.EMBEDDING_INDEX_MAX_MB * 1024 * 1024,
+    refresh_seconds=settings.EMBEDDING_INDEX_REFRESH_SECONDS,
+    router=shard_router if shard_router.sharded else None,
+)
+registry.register(
+    CallbackMetric(
+        "embedding_index_bytes",
+        "Memory held by this worker's per-user embedding matrices.",
+        (),
+        lambda: [((), embedding_index.nbytes)],
+    )
+)
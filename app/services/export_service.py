@@ -0,0 +1,111 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator
+from uuid import UUID
+from sqlalchemy.future import select
+
+from app.db.models import ChatMessage, ChatSession, ChatSessionArchive
+from app.db.session import AsyncSessionLocal
+from app.core.context_codec import unpack_context
+from app.core.logging import logger
+from app.services.archive_service import unpack_archive
+
+EXPORT_CHUNK_SIZE = 1000  # Rows fetched per server-side cursor round-trip
+
+SESSION_FIELDS = ("id", "user_id", "title", "is_favorite", "created_at")
+MESSAGE_FIELDS = ("id", "session_id", "sender", "content", "context", "created_at")
+
+
+def _json_default(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def to_ndjson(record: dict) -> str:
+    return json.dumps(record, default=_json_default, separators=(",", ":")) + "\n"
+
+
+async def _stream_export(where_clause, label: str, session_factory) -> AsyncIterator[str]:
+    """Stream sessions and their messages as NDJSON, one chunk per fetch.
+
+    Each session is emitted as a ``{"type": "session"}`` line followed by its
+    messages in chronological order. Rows come from a server-side cursor, so
+    memory stays flat no matter how many messages are exported. Archived
+    sessions have no message rows and are unpacked from their archive blob
+    instead. The export opens its own DB session because request-scoped ones
+    are closed before a streaming body is sent.
+    """
+    query = (
+        select(
+            *(getattr(ChatSession, field) for field in SESSION_FIELDS),
+            *(getattr(ChatMessage, field) for field in MESSAGE_FIELDS),
+            ChatMessage.context_zlib,
+            ChatSessionArchive.messages_zlib,
+        )
+        .outerjoin(ChatMessage, ChatMessage.session_id == ChatSession.id)
+        .outerjoin(ChatSessionArchive, ChatSessionArchive.session_id == ChatSession.id)
+        .where(where_clause)
+        .order_by(
+            ChatSession.created_at,
+            ChatSession.id,
+            ChatMessage.created_at,
+            ChatMessage.id,
+        )
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+
+    exported = 0
+    current_session = None
+    split = len(SESSION_FIELDS)
+    context_index = MESSAGE_FIELDS.index("context")
+    async with session_factory() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            lines = []
+            for row in partition:
+                session_values, message_values = row[:split], list(row[split:-2])
+                if session_values[0] != current_session:
+                    current_session = session_values[0]
+                    lines.append(
+                        to_ndjson({"type": "session", **dict(zip(SESSION_FIELDS, session_values))})
+                    )
+                if message_values[0] is not None:
+                    message_values[context_index] = unpack_context(
+                        message_values[context_index], row[-2]
+                    )
+                    lines.append(
+                        to_ndjson({"type": "message", **dict(zip(MESSAGE_FIELDS, message_values))})
+                    )
+                    exported += 1
+                elif row[-1] is not None:
+                    for message in unpack_archive(current_session, row[-1]):
+                        lines.append(
+                            to_ndjson(
+                                {
+                                    "type": "message",
+                                    **{field: getattr(message, field) for field in MESSAGE_FIELDS},
+                                }
+                            )
+                        )
+                        exported += 1
+            yield "".join(lines)
+
+    logger.info(f"Exported {exported} message(s) for {label}")
+
+
+def stream_session_export(
+    session_id: UUID, session_factory=AsyncSessionLocal
+) -> AsyncIterator[str]:
+    return _stream_export(
+        ChatSession.id == session_id, f"session {session_id}", session_factory
+    )
+
+
+def stream_user_export(user_id: str, session_factory=AsyncSessionLocal) -> AsyncIterator[str]:
+    return _stream_export(ChatSession.user_id == user_id, f"user {user_id}", session_factory)
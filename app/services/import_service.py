@@ -0,0 +1,388 @@
+import csv
+import json
+import time
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from app.db.models.chat_message import senderEnum
+from app.db.session import engine, shard_router
+from app.db.sharding import ShardRouter
+from app.core.context_codec import pack_context
+from app.core.tokens import count_tokens
+from app.core.logging import logger
+from app.services.archive_service import unpack_archive
+
+IMPORT_CHUNK_SIZE = 10000  # Records committed per transaction / checkpoint
+
+Record = Tuple[str, dict]  # ("session" | "message", fields)
+# Kind of a record that could not be parsed; counted as invalid with fields["error"]
+UNPARSABLE = "unparsable"
+
+CREATE_STAGING_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS import_sessions_staging (
+    id uuid, user_id text, title text, is_favorite boolean, created_at timestamptz
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_messages_staging (
+    id uuid, session_id uuid, sender text, content text, context text,
+    created_at timestamptz, context_zlib bytea, token_count integer, embedding bytea
+) ON COMMIT DELETE ROWS;
+"""
+
+# Duplicate IDs collapse to one row per chunk; sessions already present keep
+# their ID and take the imported title/favorite, existing messages are kept.
+# Message IDs are checked on their own because the primary key also holds
+# session_id (for partitioning), so nothing else keeps them unique; the check
+# runs under LOCK_MESSAGE_MERGE so concurrent imports cannot both pass it.
+MERGE_SESSIONS = """
+INSERT INTO chat_sessions (id, user_id, title, is_favorite, created_at)
+SELECT DISTINCT ON (id)
+    id, user_id, COALESCE(title, 'Untitled'), COALESCE(is_favorite, false),
+    COALESCE(created_at, now())
+FROM import_sessions_staging
+ORDER BY id
+ON CONFLICT (id) DO UPDATE
+SET title = EXCLUDED.title, is_favorite = EXCLUDED.is_favorite
+WHERE (chat_sessions.title, chat_sessions.is_favorite)
+    IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.is_favorite)
+"""
+
+MERGE_MESSAGES = """
+INSERT INTO chat_messages
+    (id, session_id, sender, content, context, created_at, context_zlib, token_count, embedding)
+SELECT DISTINCT ON (s.id)
+    s.id, s.session_id, s.sender::senderenum, s.content, s.context::jsonb,
+    COALESCE(s.created_at, now()), s.context_zlib, s.token_count, s.embedding
+FROM import_messages_staging s
+JOIN chat_sessions cs ON cs.id = s.session_id
+WHERE NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.id = s.id)
+ORDER BY s.id
+ON CONFLICT (id, session_id) DO NOTHING
+"""
+
+# Held until the chunk commits; serializes message merges across imports
+LOCK_MESSAGE_MERGE = "SELECT pg_advisory_xact_lock(hashtext('import_service.merge_messages'))"
+
+# Activity counters of the sessions that received messages. They are
+# recounted rather than incremented because the merge also re-inserts the
+# messages of rehydrated archives, which were already counted.
+REFRESH_STAGED_ACTIVITY = """
+UPDATE chat_sessions cs
+SET message_count = m.message_count, last_message_at = m.last_message_at
+FROM (
+    SELECT session_id, count(*) AS message_count, max(created_at) AS last_message_at
+    FROM chat_messages
+    WHERE session_id IN (SELECT session_id FROM import_messages_staging)
+    GROUP BY session_id
+) m
+WHERE cs.id = m.session_id
+"""
+
+# Sessions receiving messages, locked like the foreign key check would so the
+# archiver cannot pack them mid-import; archived ones are unpacked first.
+LOCK_STAGED_SESSIONS = """
+SELECT id, archived_at IS NOT NULL AS archived FROM chat_sessions
+WHERE id IN (SELECT session_id FROM import_messages_staging)
+FOR KEY SHARE
+"""
+
+TAKE_ARCHIVES = """
+DELETE FROM chat_session_archives WHERE session_id = ANY($1::uuid[])
+RETURNING session_id, messages_zlib
+"""
+
+CLEAR_ARCHIVED = """
+UPDATE chat_sessions SET archived_at = NULL WHERE id = ANY($1::uuid[])
+"""
+
+SAVE_CHECKPOINT = """
+INSERT INTO import_checkpoints
+    (job_id, records_committed, sessions_imported, messages_imported, updated_at)
+VALUES ($1, $2, $3, $4, now())
+ON CONFLICT (job_id) DO UPDATE
+SET records_committed = EXCLUDED.records_committed,
+    sessions_imported = EXCLUDED.sessions_imported,
+    messages_imported = EXCLUDED.messages_imported,
+    updated_at = now()
+"""
+
+LOAD_CHECKPOINT = """
+SELECT records_committed, sessions_imported, messages_imported
+FROM import_checkpoints WHERE job_id = $1
+"""
+
+SESSION_COLUMNS = ("id", "user_id", "title", "is_favorite", "created_at")
+MESSAGE_COLUMNS = (
+    "id", "session_id", "sender", "content", "context", "created_at", "context_zlib",
+    "token_count", "embedding",
+)
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    return datetime.fromisoformat(value)
+
+
+def _parse_bool(value) -> Optional[bool]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "t", "yes")
+
+
+def _session_row(fields: dict) -> tuple:
+    if not fields.get("user_id"):
+        raise ValueError("user_id is required")
+    return (
+        UUID(str(fields["id"])),
+        fields["user_id"],
+        fields.get("title") or None,
+        _parse_bool(fields.get("is_favorite")),
+        _parse_datetime(fields.get("created_at")),
+    )
+
+
+def _message_row(fields: dict) -> tuple:
+    if fields.get("sender") not in senderEnum.__members__:
+        raise ValueError(f"Invalid sender '{fields.get('sender')}'")
+    if not fields.get("content"):
+        raise ValueError("content is required")
+
+    context = fields.get("context")
+    if context == "":
+        context = None
+    elif isinstance(context, str):
+        context = json.loads(context)  # CSV carries it as JSON text
+    packed = pack_context(context)
+
+    return (
+        UUID(str(fields["id"])),
+        UUID(str(fields["session_id"])),
+        fields["sender"],
+        fields["content"],
+        json.dumps(packed["context"]) if packed["context"] is not None else None,
+        _parse_datetime(fields.get("created_at")),
+        packed["context_zlib"],
+        count_tokens(fields["content"]),
+        None,  # embeddings are not part of the export format
+    )
+
+
+async def ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """Parse the format written by the /export endpoints."""
+    async for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            kind = record.pop("type", None)
+        except (ValueError, AttributeError, TypeError) as e:
+            # Not JSON, or not an object
+            yield UNPARSABLE, {"error": f"Malformed line: {e}"}
+            continue
+        yield kind, record
+
+
+async def csv_records(kind: str, lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """Parse a CSV of one kind ("session" or "message") with a header row."""
+    header = None
+    pending: List[str] = []
+    async for line in lines:
+        pending.append(line.rstrip("\r\n"))
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            continue  # still inside a quoted field that spans lines
+        pending = []
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            continue
+        yield kind, dict(zip(header, values))
+
+
+async def iterate_lines(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+async def aiter_body_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed request body into text lines without buffering it whole."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            yield line.decode()
+    if pending:
+        yield pending.decode()
+
+
+def _archived_message_row(message) -> tuple:
+    packed = pack_context(message.context)
+    return (
+        message.id,
+        message.session_id,
+        message.sender,
+        message.content,
+        json.dumps(packed["context"]) if packed["context"] is not None else None,
+        message.created_at,
+        packed["context_zlib"],
+        message.token_count,
+        message.embedding,
+    )
+
+
+async def _restore_archived(pg) -> int:
+    """Stage the archived messages of sessions this chunk writes to.
+
+    They are merged back along with the imported ones, so those sessions are
+    live again when the chunk commits. Returns the number of messages staged.
+    """
+    archived = [row["id"] for row in await pg.fetch(LOCK_STAGED_SESSIONS) if row["archived"]]
+    if not archived:
+        return 0
+
+    rows = []
+    for archive in await pg.fetch(TAKE_ARCHIVES, archived):
+        rows.extend(
+            map(_archived_message_row, unpack_archive(archive["session_id"], archive["messages_zlib"]))
+        )
+    if rows:
+        await pg.copy_records_to_table(
+            "import_messages_staging", records=rows, columns=MESSAGE_COLUMNS
+        )
+    await pg.execute(CLEAR_ARCHIVED, archived)
+    logger.info(f"Rehydrated {len(archived)} archived session(s) before merging")
+    return len(rows)
+
+
+async def _merge_chunk(pg, sessions: List[tuple], messages: List[tuple]):
+    await pg.execute(CREATE_STAGING_TABLES)
+    sessions_imported = messages_imported = 0
+    if sessions:
+        await pg.copy_records_to_table(
+            "import_sessions_staging", records=sessions, columns=SESSION_COLUMNS
+        )
+        sessions_imported = int((await pg.execute(MERGE_SESSIONS)).split()[-1])
+    if messages:
+        await pg.copy_records_to_table(
+            "import_messages_staging", records=messages, columns=MESSAGE_COLUMNS
+        )
+        restored = await _restore_archived(pg)
+        await pg.execute(LOCK_MESSAGE_MERGE)
+        merged = int((await pg.execute(MERGE_MESSAGES)).split()[-1])
+        if merged:
+            await pg.execute(REFRESH_STAGED_ACTIVITY)
+        messages_imported = merged - restored
+    return sessions_imported, messages_imported
+
+
+async def import_records(
+    records: AsyncIterator[Record],
+    job_id: str,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    router: ShardRouter = shard_router,
+) -> dict:
+    """Load sessions and messages with binary COPY, resumable per chunk.
+
+    Every chunk is copied into temp staging tables, merged into the real
+    tables and checkpointed in the same transaction. Re-running a job with
+    the same ``job_id`` and input skips the records that were already
+    committed, and replaying them anyway is harmless because merges are
+    idempotent on ID.
+
+    Records are merged into the main database only, so imports are refused
+    (501) once data is sharded: users hashing elsewhere would be unreachable.
+    """
+    if router.sharded:
+        raise HTTPException(
+            status_code=501,
+            detail="Imports are not supported while data is sharded; import "
+            "before adding shards.",
+        )
+
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+
+        checkpoint = await pg.fetchrow(LOAD_CHECKPOINT, job_id)
+        committed, sessions_total, messages_total = checkpoint or (0, 0, 0)
+        resumed_from = committed
+        if committed:
+            logger.info(f"Resuming import {job_id} after {committed} record(s)")
+
+        seen = invalid = 0
+        sessions: List[tuple] = []
+        messages: List[tuple] = []
+
+        async def flush():
+            nonlocal committed, sessions_total, messages_total
+            async with pg.transaction():
+                sessions_imported, messages_imported = await _merge_chunk(
+                    pg, sessions, messages
+                )
+                await pg.execute(
+                    SAVE_CHECKPOINT,
+                    job_id,
+                    seen,
+                    sessions_total + sessions_imported,
+                    messages_total + messages_imported,
+                )
+            committed = seen
+            sessions_total += sessions_imported
+            messages_total += messages_imported
+            sessions.clear()
+            messages.clear()
+            logger.info(f"Import {job_id}: committed {committed} record(s)")
+
+        async for kind, fields in records:
+            seen += 1
+            if seen <= resumed_from:
+                continue
+            try:
+                if kind == "session":
+                    sessions.append(_session_row(fields))
+                elif kind == "message":
+                    messages.append(_message_row(fields))
+                elif kind == UNPARSABLE:
+                    raise ValueError(fields["error"])
+                else:
+                    raise ValueError(f"Unknown record type '{kind}'")
+            except (KeyError, TypeError, ValueError) as e:
+                invalid += 1
+                logger.warning(f"Import {job_id}: skipping record {seen}: {e}")
+
+            if len(sessions) + len(messages) >= chunk_size:
+                await flush()
+
+        if sessions or messages:
+            await flush()
+        elif seen > committed:
+            committed = seen  # trailing invalid records
+            await pg.execute(
+                SAVE_CHECKPOINT, job_id, committed, sessions_total, messages_total
+            )
+
+    elapsed = time.perf_counter() - started
+    processed = seen - resumed_from
+    report = {
+        "job_id": job_id,
+        "records_read": processed,
+        "resumed_from": resumed_from,
+        "invalid": invalid,
+        "sessions_imported": sessions_total,
+        "messages_imported": messages_total,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(processed / elapsed, 1) if elapsed else None,
+    }
+    logger.info(f"Import {job_id} finished: {report}")
+    return report
@@ -0,0 +1,286 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import AsyncSessionLocal, shard_router
+from app.services.message_service import (
+    APPEND_DELTAS,
+    message_tail_cache,
+    streaming_message_end,
+)
+from app.core.config import settings
+from app.core.logging import logger
+
+
+def delta_runs(message_id: UUID, session_id: UUID, deltas: List[Tuple[int, str]]) -> List[dict]:
+    """Merge buffered (offset, text) deltas into APPEND_DELTAS parameters.
+
+    Deltas that continue one another become a single run; a gap or an
+    overlap (e.g. a retried delta) starts a new one, applied in order.
+    """
+    runs: List[list] = []
+    for offset, text in sorted(deltas, key=lambda delta: delta[0]):
+        if runs and runs[-1][0] + len(runs[-1][1]) == offset:
+            runs[-1][1] += text
+        else:
+            runs.append([offset, text])
+    return [
+        {
+            "message_id": message_id,
+            "message_session_id": session_id,
+            "start": offset,
+            "stop": offset + len(text),
+            "text": text,
+        }
+        for offset, text in runs
+    ]
+
+
+def _connection_lost(error: Exception) -> bool:
+    """Whether a write failed for want of a database rather than because of its runs."""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+class MessageDeltaBuffer:
+    """Coalesce token deltas of streaming messages into periodic UPDATEs.
+
+    Deltas are held in memory until ``window_ms`` has passed since the first
+    pending one or ``max_chars`` are pending, then every message's runs are
+    written in one transaction. If that fails, each message's runs are
+    written on their own; those that fail go back into the buffer for the
+    next flush, and are dropped after ``max_attempts`` failures not caused
+    by a lost connection, so one bad message cannot hold up the rest. A
+    crash loses at most that window; the reply's producer can still
+    finalize with the full content. With a ``router``, runs are written
+    once per shard of their messages.
+
+    A delta may start at most ``max_gap`` characters past the end of what
+    is buffered or stored for its message.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        window_ms: float,
+        max_chars: int,
+        max_tracked: int = 10000,
+        router=None,
+        max_gap: int = 65536,
+        max_attempts: int = 3,
+    ):
+        self._session_factory = session_factory
+        self._router = router
+        self.window = window_ms / 1000
+        self.max_chars = max(1, max_chars)
+        self.max_tracked = max_tracked
+        self.max_gap = max_gap
+        self.max_attempts = max(1, max_attempts)
+        # Sessions of messages known to be streaming, so appends skip the DB
+        self._sessions: "OrderedDict[UUID, UUID]" = OrderedDict()
+        # Known length of each tracked message: stored or buffered, whichever is longer
+        self._ends: Dict[UUID, int] = {}
+        # Failed writes of each message's runs, towards max_attempts
+        self._failures: Dict[UUID, int] = {}
+        self._pending: Dict[UUID, List[Tuple[int, str]]] = {}
+        self._pending_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        # Flushes writing each message's runs, awaited before finalizing it
+        self._inflight: Dict[UUID, Set[asyncio.Task]] = {}
+
+    def track(self, message_id: UUID, session_id: UUID, end: int = 0):
+        self._sessions[message_id] = session_id
+        self._sessions.move_to_end(message_id)
+        self._ends[message_id] = max(self._ends.get(message_id, 0), end)
+        excess = len(self._sessions) - self.max_tracked
+        if excess > 0:
+            # Messages with deltas still pending are kept for their flush
+            idle = [known for known in self._sessions if known not in self._pending]
+            for stale in idle[:excess]:
+                del self._sessions[stale]
+                self._ends.pop(stale, None)
+
+    async def append(self, db: AsyncSession, message_id: UUID, offset: int, delta: str) -> int:
+        """Buffer a delta; returns the characters now pending for the message."""
+        if message_id not in self._sessions or offset > self._ends[message_id] + self.max_gap:
+            # Other workers may have stored what this one has not seen
+            self.track(message_id, *await streaming_message_end(db, message_id))
+        if offset > self._ends[message_id] + self.max_gap:
+            raise HTTPException(
+                status_code=422, detail="Delta starts too far past the end of the message"
+            )
+        self._ends[message_id] = max(self._ends[message_id], offset + len(delta))
+
+        deltas = self._pending.setdefault(message_id, [])
+        deltas.append((offset, delta))
+        self._pending_chars += len(delta)
+
+        if self._pending_chars >= self.max_chars:
+            self._schedule_flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+        return sum(len(text) for _, text in deltas)
+
+    async def take(self, message_id: UUID) -> List[dict]:
+        """Remove a message's pending deltas (e.g. to finalize it) as runs.
+
+        Flushes already writing the message's runs are waited for first, so
+        none commits after the finalizing UPDATE (whose runs would then no
+        longer match); runs such a flush failed to write are returned too.
+        """
+        inflight = self._inflight.get(message_id)
+        if inflight:
+            await asyncio.gather(*inflight, return_exceptions=True)
+
+        session_id = self._sessions.pop(message_id, None)
+        self._ends.pop(message_id, None)
+        self._failures.pop(message_id, None)
+        deltas = self._pending.pop(message_id, [])
+        self._pending_chars -= sum(len(text) for _, text in deltas)
+        if session_id is None or not deltas:
+            return []
+        return delta_runs(message_id, session_id, deltas)
+
+    def restore(self, runs: List[dict]):
+        """Put back runs taken for a finalize that failed, to be flushed as usual."""
+        if runs:
+            self._requeue(runs)
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending, self._pending_chars = self._pending, {}, 0
+        if not batch:
+            return
+
+        params = [
+            run
+            for message_id, deltas in batch.items()
+            for run in delta_runs(message_id, self._sessions[message_id], deltas)
+        ]
+        task = asyncio.ensure_future(self._flush(params))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+        for message_id in batch:
+            self._inflight.setdefault(message_id, set()).add(task)
+        task.add_done_callback(lambda done: self._forget_flush(done, batch))
+
+    def _forget_flush(self, task: asyncio.Task, message_ids):
+        for message_id in message_ids:
+            tasks = self._inflight.get(message_id)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del self._inflight[message_id]
+
+    def _requeue(self, params: List[dict]):
+        """Put runs that failed to be written back for the next flush."""
+        for run in params:
+            message_id = run["message_id"]
+            self._sessions.setdefault(message_id, run["message_session_id"])
+            self._ends[message_id] = max(self._ends.get(message_id, 0), run["stop"])
+            self._pending.setdefault(message_id, []).append((run["start"], run["text"]))
+            self._pending_chars += len(run["text"])
+        # Retried after a full window rather than at once, so a database
+        # outage is not hammered
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+    async def _flush(self, params: List[dict]):
+        if self._router is None:
+            await self._write(self._session_factory, params)
+            return
+
+        groups: Dict[str, List[dict]] = {}
+        try:
+            for run in params:
+                shard = await self._router.shard_for_id(run["message_id"], write=True)
+                groups.setdefault(shard.name, []).append(run)
+        except Exception as e:
+            logger.exception(f"Routing {len(params)} streamed run(s) failed; will retry: {e}")
+            self._requeue(params)
+            return
+        await asyncio.gather(
+            *(
+                self._write(self._router.shards[name].session_factory, runs)
+                for name, runs in groups.items()
+            )
+        )
+
+    async def _write(self, session_factory, params: List[dict]):
+        try:
+            await self._execute(session_factory, params)
+            return
+        except Exception as e:
+            by_message: Dict[UUID, List[dict]] = {}
+            for run in params:
+                by_message.setdefault(run["message_id"], []).append(run)
+            if len(by_message) == 1 or _connection_lost(e):
+                for runs in by_message.values():
+                    self._retry_or_drop(runs, e)
+                return
+            logger.warning(
+                f"Flushing {len(params)} streamed run(s) failed; writing each message's "
+                f"runs on their own: {e}"
+            )
+
+        for runs in by_message.values():
+            try:
+                await self._execute(session_factory, runs)
+            except Exception as e:
+                self._retry_or_drop(runs, e)
+
+    async def _execute(self, session_factory, params: List[dict]):
+        async with session_factory() as db:
+            await db.execute(APPEND_DELTAS, params)
+            await db.commit()
+        for run in params:
+            self._failures.pop(run["message_id"], None)
+        for session_id in {run["message_session_id"] for run in params}:
+            message_tail_cache.invalidate(str(session_id))
+
+    def _retry_or_drop(self, runs: List[dict], error: Exception):
+        """Requeue one message's runs after a failed write, or drop them for good."""
+        message_id = runs[0]["message_id"]
+        if not _connection_lost(error):
+            failures = self._failures[message_id] = self._failures.get(message_id, 0) + 1
+            if failures >= self.max_attempts:
+                del self._failures[message_id]
+                logger.error(
+                    f"Dropped {len(runs)} streamed run(s) of message {message_id} after "
+                    f"{failures} failed write(s): {error}"
+                )
+                return
+        logger.warning(
+            f"Writing {len(runs)} streamed run(s) of message {message_id} failed; "
+            f"will retry: {error}"
+        )
+        self._requeue(runs)
+
+    async def drain(self):
+        """Flush anything pending and wait for in-flight flushes."""
+        self._schedule_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+message_delta_buffer = MessageDeltaBuffer(
+    AsyncSessionLocal,
+    window_ms=settings.MESSAGE_DELTA_FLUSH_MS,
+    max_chars=settings.MESSAGE_DELTA_FLUSH_CHARS,
+    router=shard_router if shard_router.sharded else None,
+    max_gap=settings.MESSAGE_DELTA_MAX_GAP_CHARS,
+    max_attempts=settings.MESSAGE_DELTA_MAX_ATTEMPTS,
+)
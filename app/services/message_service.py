@@ -1,13 +1,180 @@
+import orjson
+from sqlalchemy import DateTime, Integer, Text, bindparam, func, insert, text, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm.attributes import set_committed_value
 from uuid import UUID
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException
+from pydantic import ValidationError
 
-from app.db.models.chat_message import ChatMessage
-from app.schemas.message import ChatMessageCreate
+from app.db.models.chat_message import ChatMessage, senderEnum
+from app.db.models.chat_session import ChatSession
+from app.db.session import shard_router
+from app.db.sharding import ShardRouter, new_shard_id, user_slot
+from app.schemas.message import ChatMessageCreate, ChatMessageStreamCreate
+from app.core.cache import build_cache, MISS
+from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import registry, CallbackMetric
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.context_codec import pack_context, unpack_context
+from app.core.tokens import count_tokens, estimated_tokens_sql
+from app.core.embeddings import pack_embedding
+from app.services.archive_service import (
+    find_archived_message,
+    load_archived_messages,
+    lock_sessions_for_write,
+)
+from app.services.embedding_index import EmbeddingRow, embedding_index
 
 MAX_LIMIT = 100  # Limit to prevent heavy DB loads
+MAX_BATCH_SIZE = 1000  # Upper bound on messages accepted by a single batch call
+MAX_WINDOW_MESSAGES = 500
+MAX_WINDOW_TOKENS = 1_000_000
+
+# NOTIFY channel of new messages (see app.services.message_stream). Payloads
+# must stay under Postgres' 8000-byte limit; longer messages are announced
+# without their content and read back by the listening worker.
+MESSAGE_CHANNEL = "chat_messages"
+MAX_NOTIFY_PAYLOAD = 7900
+PUBLISH_MESSAGES = text(
+    "SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"
+)
+
+# Newest messages of recently read sessions, keyed by str(session_id). Entries
+# are {"messages": tuple oldest-first, "complete": True if that is the whole
+# session, "stamp": the session's (message_count, last_message_at) they were
+# read at}; writes through this worker fold new messages in. A tail whose
+# stamp no longer matches the session row was changed through another worker.
+message_tail_cache = build_cache(
+    settings.MESSAGE_TAIL_CACHE_BACKEND,
+    max_entries=settings.MESSAGE_TAIL_CACHE_MAX_SESSIONS,
+    ttl_seconds=settings.MESSAGE_TAIL_CACHE_TTL_SECONDS,
+)
+registry.register(
+    CallbackMetric(
+        "message_tail_cache_events_total",
+        "Message tail cache hits, misses, evictions, expirations and invalidations.",
+        ("event",),
+        lambda: [((event,), count) for event, count in message_tail_cache.stats.as_dict().items()],
+        kind="counter",
+    )
+)
+
+
+def _tail_item(message) -> dict:
+    """Window entry for an ORM message or a column row."""
+    tokens = message.token_count
+    return {
+        "id": message.id,
+        "session_id": message.session_id,
+        "sender": getattr(message.sender, "value", message.sender),
+        "content": message.content,
+        "created_at": message.created_at,
+        "token_count": tokens if tokens is not None else count_tokens(message.content),
+    }
+
+
+def _remember_in_tail(messages):
+    """Fold freshly committed messages into the cached tails of their sessions."""
+    by_session = {}
+    for message in messages:
+        by_session.setdefault(str(message.session_id), []).append(message)
+
+    for key, new_messages in by_session.items():
+        cached = message_tail_cache.get(key)
+        # Invalidating first makes any tail load still in flight discard its
+        # (possibly pre-commit) rows instead of overwriting ours.
+        message_tail_cache.invalidate(key)
+        if cached is MISS or cached["stamp"] is None:
+            continue
+        if any(m.created_at is None for m in new_messages):
+            continue
+
+        merged = sorted(
+            (*cached["messages"], *map(_tail_item, new_messages)),
+            key=lambda item: (item["created_at"], item["id"]),
+        )
+        kept = merged[-settings.MESSAGE_TAIL_SIZE:]
+        # What _bump_session_activity made of the counters, if the tail was current
+        count, last_at = cached["stamp"]
+        newest = max(m.created_at for m in new_messages)
+        token = message_tail_cache.begin(key)
+        message_tail_cache.set(
+            key,
+            {
+                "messages": tuple(kept),
+                "complete": cached["complete"] and len(kept) == len(merged),
+                "stamp": (count + len(new_messages), max(last_at or newest, newest)),
+            },
+            token,
+        )
+
+
+def _notification(message) -> str:
+    item = {
+        "id": message.id,
+        "session_id": message.session_id,
+        "sender": getattr(message.sender, "value", message.sender),
+        "content": message.content,
+        "context": None,
+        "created_at": message.created_at,
+        "streaming": bool(message.streaming),
+    }
+    payload = orjson.dumps(item, option=orjson.OPT_UTC_Z)
+    if len(payload) > MAX_NOTIFY_PAYLOAD:
+        del item["content"], item["context"]
+        item["truncated"] = True
+        payload = orjson.dumps(item, option=orjson.OPT_UTC_Z)
+    return payload.decode()
+
+
+_session_table = ChatSession.__table__
+# Activity counters of a session receiving messages, bumped once per session
+# in the inserting transaction; updatedAt is left alone.
+BUMP_SESSION_ACTIVITY = (
+    _session_table.update()
+    .where(_session_table.c.id == bindparam("activity_session_id"))
+    .values(
+        message_count=_session_table.c.message_count + bindparam("added", type_=Integer),
+        last_message_at=func.greatest(
+            _session_table.c.last_message_at,
+            bindparam("last_at", type_=DateTime(timezone=True)),
+        ),
+        updatedAt=_session_table.c.updatedAt,
+    )
+)
+
+
+async def _bump_session_activity(db: AsyncSession, messages):
+    created: Dict[UUID, list] = {}
+    for message in messages:
+        created.setdefault(message.session_id, []).append(message.created_at)
+    if not created:
+        return
+    # In session ID order, so concurrent batches lock sessions alike
+    await db.execute(
+        BUMP_SESSION_ACTIVITY,
+        [
+            {
+                "activity_session_id": session_id,
+                "added": len(times),
+                "last_at": max(filter(None, times), default=None),
+            }
+            for session_id, times in sorted(created.items())
+        ],
+    )
+
+
+async def _publish(db: AsyncSession, messages):
+    """NOTIFY live streams of new messages; delivered only if the transaction commits."""
+    if not settings.MESSAGE_NOTIFY_ENABLED or not messages:
+        return
+    await db.execute(
+        PUBLISH_MESSAGES,
+        {"channel": MESSAGE_CHANNEL, "payloads": [_notification(m) for m in messages]},
+    )
 
 
 async def add_messages(
@@ -19,10 +186,29 @@ async def add_messages(
                 status_code=422, detail="Session ID and content are required."
             )
 
-        new_msg = ChatMessage(**message_data.dict())
+        owners = await lock_sessions_for_write(db, [message_data.session_id])
+        values = message_data.model_dump()
+        values.update(pack_context(message_data.context))
+        values["token_count"] = count_tokens(message_data.content)
+        values["embedding"] = pack_embedding(message_data.embedding)
+        if message_data.session_id in owners:
+            values["id"] = new_shard_id(user_slot(owners[message_data.session_id]))
+        new_msg = ChatMessage(**values)
         db.add(new_msg)
-        await db.commit()
+        await db.flush()
+        # Loaded before committing so the notification carries created_at
         await db.refresh(new_msg)
+        await _bump_session_activity(db, [new_msg])
+        await _publish(db, [new_msg])
+        await db.commit()
+        # Echo the context back even when it was stored compressed
+        set_committed_value(new_msg, "context", message_data.context)
+        _remember_in_tail([new_msg])
+        if values["embedding"] is not None and new_msg.session_id in owners:
+            embedding_index.add(
+                owners[new_msg.session_id],
+                [EmbeddingRow(new_msg.id, new_msg.session_id, new_msg.created_at, values["embedding"])],
+            )
         logger.info(f"Message added to session: {new_msg.session_id}")
         return new_msg
 
@@ -32,8 +218,210 @@ async def add_messages(
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+def _validate_batch_item(item: Dict[str, Any]) -> ChatMessageCreate:
+    message_data = ChatMessageCreate.model_validate(item)
+    if not message_data.content:
+        raise ValueError("Content is required.")
+    if message_data.sender not in senderEnum.__members__:
+        raise ValueError(f"Invalid sender '{message_data.sender}'.")
+    return message_data
+
+
+async def add_messages_bulk(db: AsyncSession, items: List[Dict[str, Any]]) -> dict:
+    if not items:
+        raise HTTPException(status_code=422, detail="At least one message is required.")
+
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size must not exceed {MAX_BATCH_SIZE}",
+        )
+
+    errors = []
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, _validate_batch_item(item)))
+        except ValidationError as e:
+            errors.append(
+                {"index": index, "detail": e.errors(include_url=False, include_input=False)}
+            )
+        except ValueError as e:
+            errors.append({"index": index, "detail": str(e)})
+
+    if not valid:
+        return {"created": [], "errors": errors}
+
+    try:
+        session_ids = {message_data.session_id for _, message_data in valid}
+        existing = await lock_sessions_for_write(db, session_ids)
+
+        rows, contexts = [], []
+        for index, message_data in valid:
+            if message_data.session_id not in existing:
+                errors.append(
+                    {
+                        "index": index,
+                        "detail": f"Session {message_data.session_id} not found.",
+                    }
+                )
+                continue
+            row = message_data.model_dump()
+            row["id"] = new_shard_id(user_slot(existing[message_data.session_id]))
+            row.update(pack_context(message_data.context))
+            row["token_count"] = count_tokens(message_data.content)
+            row["embedding"] = pack_embedding(message_data.embedding)
+            rows.append(row)
+            contexts.append(message_data.context)
+
+        created = []
+        if rows:
+            # One multi-row INSERT ... RETURNING per page of rows, all inside a
+            # single transaction; rows come back in parameter order.
+            result = await db.scalars(
+                insert(ChatMessage).returning(
+                    ChatMessage, sort_by_parameter_order=True
+                ),
+                rows,
+            )
+            created = result.all()
+            await _bump_session_activity(db, created)
+            await _publish(db, created)
+            await db.commit()
+            # Echo contexts back like add_messages, even when stored compressed
+            for message, context in zip(created, contexts):
+                set_committed_value(message, "context", context)
+            _remember_in_tail(created)
+            for row, message in zip(rows, created):
+                if row["embedding"] is not None:
+                    embedding_index.add(
+                        existing[message.session_id],
+                        [EmbeddingRow(message.id, message.session_id, message.created_at, row["embedding"])],
+                    )
+
+        errors.sort(key=lambda error: error["index"])
+        logger.info(
+            f"Bulk added {len(created)} message(s) across {len(session_ids)} session(s), "
+            f"{len(errors)} rejected"
+        )
+        return {"created": created, "errors": errors}
+
+    except Exception as e:
+        logger.exception(f"Error bulk adding messages: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+def _item_session_id(item: Dict[str, Any]) -> Optional[UUID]:
+    try:
+        return UUID(str(item.get("session_id")))
+    except (AttributeError, ValueError):
+        return None
+
+
+async def add_messages_across_shards(
+    items: List[Dict[str, Any]], router: ShardRouter = shard_router
+) -> dict:
+    """``add_messages_bulk`` for items whose sessions may live on several shards.
+
+    Items are grouped by shard and each group is written in that shard's own
+    transaction; the result has the same shape, with created messages in
+    item order and errors indexed into ``items``. A failing shard fails the
+    call, but groups already committed on other shards stay written.
+    """
+    if not items:
+        raise HTTPException(status_code=422, detail="At least one message is required.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size must not exceed {MAX_BATCH_SIZE}",
+        )
+
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        session_id = _item_session_id(item) if isinstance(item, dict) else None
+        # Malformed items are rejected by validation on the main shard
+        shard = router.main
+        if session_id is not None:
+            shard = await router.shard_for_id(session_id, write=True)
+        groups.setdefault(shard.name, []).append(index)
+
+    created = []
+    errors = []
+    for name, indexes in groups.items():
+        async with router.shards[name].session_factory() as db:
+            result = await add_messages_bulk(db, [items[index] for index in indexes])
+        rejected = {indexes[error["index"]] for error in result["errors"]}
+        errors.extend(dict(error, index=indexes[error["index"]]) for error in result["errors"])
+        # Created rows come back in group order, skipping rejected items
+        accepted = [index for index in indexes if index not in rejected]
+        created.extend(zip(accepted, result["created"]))
+
+    created.sort(key=lambda pair: pair[0])
+    errors.sort(key=lambda error: error["index"])
+    return {"created": [message for _, message in created], "errors": errors}
+
+
+# ChatMessageOut fields, selected as plain columns: list endpoints build their
+# JSON from rows without loading ORM entities or validating through Pydantic.
+MESSAGE_OUT_COLUMNS = (
+    ChatMessage.id,
+    ChatMessage.session_id,
+    ChatMessage.sender,
+    ChatMessage.content,
+    ChatMessage.created_at,
+    ChatMessage.streaming,
+)
+
+
+def _select_messages(include_context: bool):
+    if include_context:
+        return select(*MESSAGE_OUT_COLUMNS, ChatMessage.context, ChatMessage.context_zlib)
+    return select(*MESSAGE_OUT_COLUMNS)
+
+
+async def _archived_rows(
+    db: AsyncSession,
+    session_id: UUID,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    backward: bool = False,
+) -> list:
+    """An archived session's messages past a cursor, in page order.
+
+    Only consulted once chat_messages came up empty: a session's messages
+    are either all live or all archived.
+    """
+    archived = await load_archived_messages(db, session_id)
+    if not archived:
+        return []
+    if after:
+        position = decode_cursor(after)
+        archived = [m for m in archived if (m.created_at, m.id) > position]
+    elif before:
+        position = decode_cursor(before)
+        archived = [m for m in archived if (m.created_at, m.id) < position]
+    return archived[::-1] if backward else archived
+
+
+def _message_out(row, include_context: bool) -> dict:
+    return {
+        "id": row.id,
+        "session_id": row.session_id,
+        "sender": getattr(row.sender, "value", row.sender),
+        "content": row.content,
+        "context": unpack_context(row.context, row.context_zlib) if include_context else None,
+        "created_at": row.created_at,
+        "streaming": row.streaming,
+    }
+
+
 async def get_message_by_session(
-    db: AsyncSession, session_id: UUID, limit: int = 20, offset: int = 0
+    db: AsyncSession,
+    session_id: UUID,
+    limit: int = 20,
+    offset: int = 0,
+    include_context: bool = False,
 ):
     if not isinstance(session_id, UUID):
         raise HTTPException(status_code=422, detail="Invalid session ID format.")
@@ -48,15 +436,19 @@ async def get_message_by_session(
         raise HTTPException(status_code=400, detail="Offset must be 0 or greater.")
 
     try:
-        result = await db.execute(
-            select(ChatMessage)
+        query = (
+            _select_messages(include_context)
             .where(ChatMessage.session_id == session_id)
-            .order_by(ChatMessage.created_at)
+            .order_by(ChatMessage.created_at, ChatMessage.id)
             .limit(limit)
             .offset(offset)
         )
+        result = await db.execute(query)
+        rows = result.all()
+        if not rows:
+            rows = (await _archived_rows(db, session_id))[offset:offset + limit]
 
-        messages = result.scalars().all()
+        messages = [_message_out(row, include_context) for row in rows]
 
         if not messages:
             logger.info(f"No messages found for session: {session_id}")
@@ -68,3 +460,402 @@ async def get_message_by_session(
     except Exception as e:
         logger.exception(f"Error fetching messages for session {session_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch messages")
+
+
+async def get_message_page(
+    db: AsyncSession,
+    session_id: UUID,
+    limit: int = 20,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    reverse: bool = False,
+    include_context: bool = False,
+) -> dict:
+    """Keyset-paginate a session's messages on (created_at, id).
+
+    ``after`` walks forward from a cursor, ``before`` (or ``reverse`` with no
+    cursor, i.e. the newest page) walks backward. Messages are always returned
+    in chronological order together with the cursors of the neighbouring pages.
+    Messages are plain dicts shaped like ``ChatMessageOut``; the ``context``
+    column is only read with ``include_context``.
+    """
+    if not isinstance(session_id, UUID):
+        raise HTTPException(status_code=422, detail="Invalid session ID format.")
+
+    if limit < 1 or limit > MAX_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Limit must be between 1 and {MAX_LIMIT}",
+        )
+
+    if after and before:
+        raise HTTPException(
+            status_code=400, detail="Only one of 'after' or 'before' may be given."
+        )
+
+    position = tuple_(ChatMessage.created_at, ChatMessage.id)
+    query = _select_messages(include_context).where(ChatMessage.session_id == session_id)
+    backward = bool(before) or (reverse and not after)
+
+    if after:
+        query = query.where(position > tuple_(*decode_cursor(after)))
+    elif before:
+        query = query.where(position < tuple_(*decode_cursor(before)))
+
+    if backward:
+        query = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+    else:
+        query = query.order_by(ChatMessage.created_at, ChatMessage.id)
+
+    try:
+        # One extra row tells us whether another page exists in this direction
+        result = await db.execute(query.limit(limit + 1))
+        rows = result.all()
+        if not rows:
+            rows = (await _archived_rows(db, session_id, after, before, backward))[:limit + 1]
+        messages = [_message_out(row, include_context) for row in rows]
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if backward:
+            messages.reverse()
+
+        next_cursor = prev_cursor = None
+        if messages:
+            first = encode_cursor(messages[0]["created_at"], messages[0]["id"])
+            last = encode_cursor(messages[-1]["created_at"], messages[-1]["id"])
+            if backward:
+                prev_cursor = first if has_more else None
+                next_cursor = last if before else None
+            else:
+                next_cursor = last if has_more else None
+                prev_cursor = first if after else None
+
+        logger.info(f"Retrieved {len(messages)} messages for session: {session_id}")
+        return {
+            "messages": messages,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        }
+
+    except Exception as e:
+        logger.exception(f"Error fetching messages for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch messages")
+
+
+async def open_streaming_message(
+    db: AsyncSession, message_data: ChatMessageStreamCreate
+) -> ChatMessage:
+    """Create an empty message that deltas are then appended to."""
+    try:
+        if message_data.sender not in senderEnum.__members__:
+            raise HTTPException(
+                status_code=422, detail=f"Invalid sender '{message_data.sender}'."
+            )
+        owners = await lock_sessions_for_write(db, [message_data.session_id])
+        if not owners:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        new_msg = ChatMessage(
+            id=new_shard_id(user_slot(owners[message_data.session_id])),
+            session_id=message_data.session_id,
+            sender=message_data.sender,
+            content="",
+            streaming=True,
+            # Left NULL while streaming so windows estimate from the text so far
+            token_count=None,
+            **pack_context(message_data.context),
+        )
+        db.add(new_msg)
+        await db.flush()
+        await db.refresh(new_msg)
+        await _bump_session_activity(db, [new_msg])
+        await _publish(db, [new_msg])
+        await db.commit()
+        set_committed_value(new_msg, "context", message_data.context)
+        logger.info(f"Opened streaming message {new_msg.id} in session: {new_msg.session_id}")
+        return new_msg
+
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        logger.exception(f"Error opening streaming message: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# Writes a run of streamed text at its character offset. A gap left by a run
+# that has not been flushed yet is padded with spaces, so runs may land in any
+# order, from any worker, and more than once.
+_messages = ChatMessage.__table__
+_padded = func.rpad(
+    _messages.c.content,
+    func.greatest(func.char_length(_messages.c.content), bindparam("stop", type_=Integer)),
+    " ",
+    type_=Text,
+)
+APPEND_DELTAS = (
+    update(_messages)
+    .where(
+        _messages.c.id == bindparam("message_id"),
+        _messages.c.session_id == bindparam("message_session_id"),
+        _messages.c.streaming.is_(True),
+    )
+    .values(
+        content=func.left(_padded, bindparam("start", type_=Integer), type_=Text)
+        + bindparam("text", type_=Text)
+        + func.substr(_padded, bindparam("stop", type_=Integer) + 1, type_=Text)
+    )
+)
+
+
+async def streaming_message_end(db: AsyncSession, message_id: UUID) -> Tuple[UUID, int]:
+    """Session and stored length of a message that is still streaming; 404/409 otherwise."""
+    result = await db.execute(
+        select(
+            ChatMessage.session_id,
+            ChatMessage.streaming,
+            func.char_length(ChatMessage.content).label("length"),
+        ).where(ChatMessage.id == message_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    if not row.streaming:
+        raise HTTPException(status_code=409, detail="Message is not streaming")
+    return row.session_id, row.length
+
+
+async def streaming_session_id(db: AsyncSession, message_id: UUID) -> UUID:
+    """Session of a message that is still streaming; 404/409 otherwise."""
+    return (await streaming_message_end(db, message_id))[0]
+
+
+async def finalize_streaming_message(
+    db: AsyncSession,
+    message_id: UUID,
+    content: Optional[str] = None,
+    pending: Optional[List[dict]] = None,
+) -> ChatMessage:
+    """Mark a streaming message complete.
+
+    ``pending`` are the APPEND_DELTAS parameters still buffered by this
+    worker; they are written first unless ``content`` replaces the text
+    outright. Runs another worker flushes afterwards no longer match.
+    """
+    try:
+        if pending:
+            session_id = pending[0]["message_session_id"]
+        else:
+            session_id = await streaming_session_id(db, message_id)
+        if pending and content is None:
+            await db.execute(APPEND_DELTAS, pending)
+
+        values = {"streaming": False}
+        if content is not None:
+            values.update(content=content, token_count=count_tokens(content))
+        else:
+            values["token_count"] = estimated_tokens_sql(ChatMessage.content)
+
+        result = await db.execute(
+            update(ChatMessage)
+            .where(
+                ChatMessage.session_id == session_id,
+                ChatMessage.id == message_id,
+                ChatMessage.streaming.is_(True),
+            )
+            .values(**values)
+            .returning(ChatMessage)
+            .execution_options(synchronize_session=False)
+        )
+        message = result.scalar_one_or_none()
+        if message is None:
+            raise HTTPException(status_code=404, detail="Streaming message not found")
+
+        await _publish(db, [message])
+        await db.commit()
+        # Cached tails may hold the partial text
+        message_tail_cache.invalidate(str(message.session_id))
+        logger.info(f"Finalized streaming message {message_id}")
+        return message
+
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        logger.exception(f"Error finalizing message {message_id}: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+async def get_message(db: AsyncSession, session_id: UUID, message_id: UUID) -> Optional[dict]:
+    """One message shaped like ChatMessageOut (without context), or None."""
+    result = await db.execute(
+        _select_messages(False).where(
+            ChatMessage.session_id == session_id, ChatMessage.id == message_id
+        )
+    )
+    row = result.one_or_none()
+    return _message_out(row, False) if row is not None else None
+
+
+async def get_message_context(db: AsyncSession, message_id: UUID) -> dict:
+    try:
+        result = await db.execute(
+            select(ChatMessage.context, ChatMessage.context_zlib).where(
+                ChatMessage.id == message_id
+            )
+        )
+        row = result.one_or_none()
+        if row is None:
+            # Its session may be archived
+            archived = await find_archived_message(db, message_id)
+            if archived is not None:
+                row = (archived.context, archived.context_zlib)
+    except Exception as e:
+        logger.exception(f"Error fetching context of message {message_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch message context")
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    return {"message_id": message_id, "context": unpack_context(*row)}
+
+
+# Stored token count, or the same estimate for rows written before it existed
+_TOKENS = func.coalesce(ChatMessage.token_count, estimated_tokens_sql(ChatMessage.content))
+_NEWEST_FIRST = (ChatMessage.created_at.desc(), ChatMessage.id.desc())
+
+
+def _fit_window(messages, max_tokens: int, max_messages: int):
+    """Take the newest messages that fit the budget.
+
+    Returns (window oldest-first, total tokens, whether a limit was hit
+    before running out of ``messages``).
+    """
+    window, total = [], 0
+    for message in reversed(messages):
+        if len(window) == max_messages or total + message["token_count"] > max_tokens:
+            return window[::-1], total, True
+        window.append(message)
+        total += message["token_count"]
+    return window[::-1], total, False
+
+
+async def _session_stamp(db: AsyncSession, session_id: UUID) -> Optional[tuple]:
+    """The (message_count, last_message_at) of a session, None if there is none."""
+    result = await db.execute(
+        select(ChatSession.message_count, ChatSession.last_message_at).where(
+            ChatSession.id == session_id
+        )
+    )
+    row = result.one_or_none()
+    return tuple(row) if row is not None else None
+
+
+async def _load_tail(db: AsyncSession, session_id: UUID, stamp: Optional[tuple]) -> dict:
+    size = settings.MESSAGE_TAIL_SIZE
+    result = await db.execute(
+        select(*MESSAGE_OUT_COLUMNS, _TOKENS.label("token_count"))
+        .where(ChatMessage.session_id == session_id)
+        .order_by(*_NEWEST_FIRST)
+        .limit(size + 1)
+    )
+    rows = result.all()
+    if not rows:
+        archived = await _archived_rows(db, session_id)
+        if archived:
+            # Read whole and left out of the cache; the next write rehydrates it
+            return {
+                "messages": tuple(map(_tail_item, archived)),
+                "complete": True,
+                "archived": True,
+                "stamp": stamp,
+            }
+    return {
+        "messages": tuple(_tail_item(row) for row in reversed(rows[:size])),
+        "complete": len(rows) <= size,
+        "stamp": stamp,
+    }
+
+
+async def _query_window(db: AsyncSession, session_id: UUID, max_tokens: int, max_messages: int):
+    # The running total is computed newest-first along the session index and
+    # the LIMIT stops the scan, so at most max_messages rows are read.
+    newest = (
+        select(
+            *MESSAGE_OUT_COLUMNS,
+            _TOKENS.label("token_count"),
+            func.sum(_TOKENS).over(order_by=_NEWEST_FIRST).label("running_tokens"),
+        )
+        .where(ChatMessage.session_id == session_id)
+        .order_by(*_NEWEST_FIRST)
+        .limit(max_messages)
+        .subquery("newest")
+    )
+    result = await db.execute(
+        select(newest)
+        .where(newest.c.running_tokens <= max_tokens)
+        .order_by(newest.c.created_at, newest.c.id)
+    )
+    window = [_tail_item(row) for row in result.all()]
+    return window, sum(item["token_count"] for item in window)
+
+
+async def get_message_window(
+    db: AsyncSession,
+    session_id: UUID,
+    max_tokens: int,
+    max_messages: int = 50,
+) -> dict:
+    """The newest messages of a session that fit in ``max_tokens``, oldest first.
+
+    Served from the per-session tail cache when the budget runs out within
+    the cached messages (or the cache holds the whole session); otherwise
+    the window is summed up in SQL. A cached tail is only trusted while the
+    session's message count and last message time still match it, so
+    messages added or removed through other workers are not missed.
+    """
+    if not isinstance(session_id, UUID):
+        raise HTTPException(status_code=422, detail="Invalid session ID format.")
+
+    if max_tokens < 1 or max_tokens > MAX_WINDOW_TOKENS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"max_tokens must be between 1 and {MAX_WINDOW_TOKENS}",
+        )
+
+    if max_messages < 1 or max_messages > MAX_WINDOW_MESSAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"max_messages must be between 1 and {MAX_WINDOW_MESSAGES}",
+        )
+
+    try:
+        key = str(session_id)
+        # Read before the tail, so a write landing in between leaves the
+        # cached tail ahead of its stamp and the next read reloads it
+        stamp = await _session_stamp(db, session_id)
+        tail = message_tail_cache.get(key)
+        if tail is not MISS and tail["stamp"] != stamp:
+            message_tail_cache.invalidate(key)
+            tail = MISS
+        if tail is MISS:
+            token = message_tail_cache.begin(key)
+            tail = await _load_tail(db, session_id, stamp)
+            if not tail.get("archived"):
+                message_tail_cache.set(key, tail, token)
+
+        window, total, limited = _fit_window(tail["messages"], max_tokens, max_messages)
+        if not limited and not tail["complete"]:
+            window, total = await _query_window(db, session_id, max_tokens, max_messages)
+
+        logger.info(
+            f"Window of {len(window)} message(s), {total} token(s) for session: {session_id}"
+        )
+        return {"messages": window, "total_tokens": total}
+
+    except Exception as e:
+        logger.exception(f"Error building message window for session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch message window")
@@ -0,0 +1,316 @@
+"""Live message feeds over one LISTEN connection per worker.
+
+``add_messages`` and ``add_messages_bulk`` publish every new message with
+``NOTIFY`` in the inserting transaction. Each worker keeps a single asyncpg
+connection listening on the channel and fans notifications out to in-process
+subscriptions, so idle subscribers cost a queue each and no DB connection.
+Each shard publishes on its own database, so a worker listens once per shard
+it has subscribers on.
+
+A subscription's queue is bounded. When a consumer falls that far behind,
+its backlog is dropped and it is told to re-read the gap from the database
+instead, so one slow client never blocks the others or grows memory.
+"""
+
+import asyncio
+import functools
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+import asyncpg
+import orjson
+from fastapi import HTTPException
+from sqlalchemy.engine import make_url
+
+from app.db.session import AsyncSessionLocal
+from app.db.sharding import MAIN_SHARD, Shard
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import registry, CallbackMetric
+from app.core.pagination import encode_cursor, decode_cursor
+from app.services.message_service import (
+    MESSAGE_CHANNEL,
+    MAX_LIMIT,
+    get_message,
+    get_message_page,
+)
+
+# Queued in place of the dropped backlog of a subscription that overflowed
+LAGGED = object()
+
+RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+SEEN_IDS = 1024  # Recently sent message IDs remembered to skip duplicates
+# Catch-up without any delivered message starts this long before subscribing
+CATCH_UP_SLACK = timedelta(seconds=5)
+
+
+def _listen_dsn(shard_url: Optional[str] = None) -> str:
+    url = make_url(shard_url or settings.DATABASE_LISTEN_URL or settings.DATABASE_URL)
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class Subscription:
+    def __init__(self, session_id: UUID, queue_size: int):
+        self.session_id = session_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.started_at = datetime.now(timezone.utc)
+
+    def push(self, message) -> bool:
+        """Queue a message; False if the queue overflowed and was reset to LAGGED."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(LAGGED)
+            return False
+
+
+class MessageStreamHub:
+    """Routes NOTIFY payloads from one LISTEN connection to subscriptions."""
+
+    def __init__(
+        self,
+        connect=None,
+        fetch_message=None,
+        queue_size: int = settings.MESSAGE_STREAM_QUEUE_SIZE,
+        max_subscribers: int = settings.MESSAGE_STREAM_MAX_SUBSCRIBERS,
+    ):
+        self._connect = connect or (lambda: asyncpg.connect(_listen_dsn()))
+        self._fetch_message = fetch_message or _fetch_message
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions: Dict[UUID, Set[Subscription]] = {}
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._conn = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._start_lock = asyncio.Lock()
+        self.subscribers = 0
+        self.overflows = 0
+
+    async def subscribe(self, session_id: UUID) -> Subscription:
+        if self.subscribers >= self.max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many live subscribers")
+        await self._ensure_listening()
+        subscription = Subscription(session_id, self.queue_size)
+        self._subscriptions.setdefault(session_id, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.session_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.session_id]
+        self.subscribers -= 1
+
+    async def _ensure_listening(self):
+        async with self._start_lock:
+            if self._conn is not None:
+                return
+            conn = await self._connect()
+            await conn.add_listener(MESSAGE_CHANNEL, self._on_notify)
+            conn.add_termination_listener(self._on_terminated)
+            self._conn = conn
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = self._spawn(self._dispatch())
+            logger.info(f"Listening on channel {MESSAGE_CHANNEL}")
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _on_notify(self, conn, pid, channel, payload):
+        # Runs in the connection's callback; parsing and fan-out happen in
+        # the dispatcher so notifications keep their order.
+        self._inbox.put_nowait(payload)
+
+    def _on_terminated(self, conn):
+        logger.warning(f"LISTEN connection on {MESSAGE_CHANNEL} was closed; reconnecting")
+        self._conn = None
+        self._spawn(self._reconnect())
+
+    async def _reconnect(self):
+        delay = RECONNECT_DELAY_SECONDS
+        while self._subscriptions:
+            try:
+                await self._ensure_listening()
+                break
+            except Exception as e:
+                logger.warning(f"Reconnecting LISTEN connection failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+        # Anything published while disconnected was missed
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.push(LAGGED)
+
+    async def _dispatch(self):
+        while True:
+            payload = await self._inbox.get()
+            try:
+                message = orjson.loads(payload)
+                session_id = UUID(message["session_id"])
+                if not self._subscriptions.get(session_id):
+                    continue
+                if message.pop("truncated", False):
+                    # Too large for a NOTIFY payload: read once for every subscriber
+                    message = await self._fetch_message(session_id, UUID(message["id"]))
+                    if message is None:
+                        continue
+                for subscription in tuple(self._subscriptions.get(session_id, ())):
+                    if not subscription.push(message):
+                        self.overflows += 1
+            except Exception as e:
+                logger.exception(f"Dropping message notification: {e}")
+
+    async def close(self):
+        for task in tuple(self._tasks):
+            task.cancel()
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            conn.remove_termination_listener(self._on_terminated)
+            await conn.close()
+
+
+async def _fetch_message(
+    session_id: UUID, message_id: UUID, session_factory=AsyncSessionLocal
+) -> Optional[dict]:
+    async with session_factory() as db:
+        return await get_message(db, session_id, message_id)
+
+
+message_stream_hub = MessageStreamHub()
+# Hubs of the other shards, created on their first subscription
+_shard_hubs: Dict[str, MessageStreamHub] = {}
+
+
+def stream_hub_for(shard: Shard) -> MessageStreamHub:
+    """The hub listening on the database a shard's messages are published on."""
+    if shard.name == MAIN_SHARD:
+        return message_stream_hub
+    hub = _shard_hubs.get(shard.name)
+    if hub is None:
+        dsn = _listen_dsn(shard.url)
+        hub = _shard_hubs[shard.name] = MessageStreamHub(
+            connect=lambda: asyncpg.connect(dsn),
+            fetch_message=functools.partial(
+                _fetch_message, session_factory=shard.session_factory
+            ),
+        )
+    return hub
+
+
+def stream_hubs() -> List[MessageStreamHub]:
+    return [message_stream_hub, *_shard_hubs.values()]
+
+
+registry.register(
+    CallbackMetric(
+        "message_stream_subscribers",
+        "Live message stream subscriptions held by this worker.",
+        (),
+        lambda: [((), sum(hub.subscribers for hub in stream_hubs()))],
+    )
+)
+registry.register(
+    CallbackMetric(
+        "message_stream_overflows_total",
+        "Times a slow subscriber's backlog was dropped for a database catch-up.",
+        (),
+        lambda: [((), sum(hub.overflows for hub in stream_hubs()))],
+        kind="counter",
+    )
+)
+
+
+def _event(message: dict) -> str:
+    cursor = encode_cursor(_as_datetime(message["created_at"]), UUID(str(message["id"])))
+    data = orjson.dumps(message, option=orjson.OPT_UTC_Z).decode()
+    return f"id: {cursor}\nevent: message\ndata: {data}\n\n"
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+async def stream_session_messages(
+    subscription: Subscription,
+    last_event_id: Optional[str] = None,
+    hub: MessageStreamHub = message_stream_hub,
+    session_factory=AsyncSessionLocal,
+    heartbeat_seconds: float = settings.MESSAGE_STREAM_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """Server-Sent Events of a subscription's messages; unsubscribes when done.
+
+    Event IDs are pagination cursors: a client reconnecting with
+    ``Last-Event-ID`` first receives what it missed, read from the database,
+    and so does a subscription whose queue overflowed. Messages sent twice
+    across such a catch-up are skipped by ID; the final version of a
+    streamed message is delivered after its placeholder. A comment line is sent every
+    ``heartbeat_seconds`` of silence to keep proxies from closing the stream.
+    """
+    session_id = subscription.session_id
+    seen_order = deque(maxlen=SEEN_IDS)
+    seen: Set[Tuple[str, bool]] = set()
+    position = decode_cursor(last_event_id) if last_event_id else None
+
+    def remember(message: dict) -> bool:
+        nonlocal position
+        message_id = str(message["id"])
+        # A finalized streaming message is sent again under its placeholder's
+        # ID, so the streaming flag is part of what makes an event new
+        key = (message_id, bool(message.get("streaming", False)))
+        if key in seen:
+            return False
+        if len(seen_order) == seen_order.maxlen:
+            seen.discard(seen_order[0])
+        seen_order.append(key)
+        seen.add(key)
+        current = (_as_datetime(message["created_at"]), UUID(message_id))
+        if position is None or current > position:
+            position = current
+        return True
+
+    async def catch_up():
+        after = position or (subscription.started_at - CATCH_UP_SLACK, UUID(int=0))
+        cursor = encode_cursor(*after)
+        async with session_factory() as db:
+            while cursor:
+                page = await get_message_page(db, session_id, MAX_LIMIT, after=cursor)
+                for message in page["messages"]:
+                    if remember(message):
+                        yield _event(message)
+                cursor = page["next_cursor"]
+
+    try:
+        if last_event_id:
+            async for event in catch_up():
+                yield event
+
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if message is LAGGED:
+                logger.info(f"Live subscriber of session {session_id} lagged; catching up")
+                async for event in catch_up():
+                    yield event
+            elif remember(message):
+                yield _event(message)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,259 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Integer, bindparam, case, delete, exists, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.db.models import ChatMessage, ChatSession, ChatSessionArchive
+from app.db.session import AsyncSessionLocal, shard_router
+from app.db.sharding import Shard
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.embedding_index import embedding_index
+from app.services.message_service import message_tail_cache
+from app.services.session_service import invalidate_session_lists
+
+# Both jobs delete at most chunk_size rows per transaction and keep no state
+# of their own: whatever is left after an interruption is simply picked up by
+# the next run.
+
+
+_session_table = ChatSession.__table__
+# Takes deleted messages off a session's activity counters; a session left
+# empty has no last message. updatedAt is left alone.
+DROP_SESSION_MESSAGES = (
+    _session_table.update()
+    .where(_session_table.c.id == bindparam("activity_session_id"))
+    .values(
+        message_count=_session_table.c.message_count - bindparam("removed", type_=Integer),
+        last_message_at=case(
+            (
+                _session_table.c.message_count <= bindparam("removed", type_=Integer),
+                None,
+            ),
+            else_=_session_table.c.last_message_at,
+        ),
+        updatedAt=_session_table.c.updatedAt,
+    )
+)
+
+
+async def _delete_message_chunk(
+    db: AsyncSession, where, chunk_size: int, keep_counts: bool = False
+) -> int:
+    """Delete up to ``chunk_size`` messages matching ``where`` and commit.
+
+    With ``keep_counts`` the sessions' activity counters are lowered in the
+    same transaction; purges skip that since the sessions go next.
+    """
+    doomed = select(ChatMessage.session_id, ChatMessage.id).where(where).limit(chunk_size)
+    statement = (
+        delete(ChatMessage)
+        .where(tuple_(ChatMessage.session_id, ChatMessage.id).in_(doomed))
+        .execution_options(synchronize_session=False)
+    )
+    if not keep_counts:
+        result = await db.execute(statement)
+        await db.commit()
+        return result.rowcount
+
+    result = await db.execute(statement.returning(ChatMessage.session_id))
+    removed = Counter(result.scalars().all())
+    if removed:
+        await db.execute(
+            DROP_SESSION_MESSAGES,
+            [
+                {"activity_session_id": session_id, "removed": count}
+                for session_id, count in sorted(removed.items())
+            ],
+        )
+    await db.commit()
+    return sum(removed.values())
+
+
+async def _delete_sessions(db: AsyncSession, where) -> List[UUID]:
+    """Delete the matching sessions (and their archives) and commit.
+
+    Callers empty the sessions first, so the message cascade finds nothing.
+    """
+    result = await db.execute(
+        delete(ChatSession)
+        .where(where)
+        .returning(ChatSession.id, ChatSession.user_id, ChatSession.is_favorite)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    await db.commit()
+    for row in rows:
+        invalidate_session_lists(row.user_id, row.is_favorite)
+        message_tail_cache.invalidate(str(row.id))
+    return [row.id for row in rows]
+
+
+async def purge_user(
+    user_id: str,
+    chunk_size: int = settings.PURGE_CHUNK_SIZE,
+    session_factory=AsyncSessionLocal,
+) -> AsyncIterator[dict]:
+    """Delete every session and message of a user, yielding progress.
+
+    Sessions are taken ``chunk_size`` at a time; their messages are deleted
+    in chunks before the sessions themselves go, so no transaction touches
+    more than ``chunk_size`` messages. A progress dict is yielded after each
+    commit and a final one with ``"done": True``. Stopping early (or a crash)
+    leaves a consistent, partially purged user; running the purge again
+    finishes it.
+    """
+    started = time.perf_counter()
+    progress = {"user_id": user_id, "sessions_deleted": 0, "messages_deleted": 0, "done": False}
+
+    async with session_factory() as db:
+        while True:
+            result = await db.execute(
+                select(ChatSession.id)
+                .where(ChatSession.user_id == user_id)
+                .order_by(ChatSession.id)
+                .limit(chunk_size)
+            )
+            session_ids = result.scalars().all()
+            if not session_ids:
+                break
+
+            while True:
+                deleted = await _delete_message_chunk(
+                    db, ChatMessage.session_id.in_(session_ids), chunk_size
+                )
+                progress["messages_deleted"] += deleted
+                if deleted:
+                    yield dict(progress)
+                if deleted < chunk_size:
+                    break
+
+            removed = await _delete_sessions(
+                db, ChatSession.id.in_(session_ids) & (ChatSession.user_id == user_id)
+            )
+            progress["sessions_deleted"] += len(removed)
+            logger.info(
+                f"Purge of user {user_id}: {progress['sessions_deleted']} session(s), "
+                f"{progress['messages_deleted']} message(s) deleted so far"
+            )
+            yield dict(progress)
+
+    embedding_index.discard(user_id)
+    progress.update(done=True, elapsed_seconds=round(time.perf_counter() - started, 3))
+    logger.info(f"Purged user {user_id}: {progress}")
+    yield progress
+
+
+async def sweep_retention(
+    max_age_days: int = settings.RETENTION_MAX_AGE_DAYS,
+    chunk_size: int = settings.PURGE_CHUNK_SIZE,
+    session_factory=AsyncSessionLocal,
+) -> dict:
+    """Delete messages older than ``max_age_days`` and the sessions they empty.
+
+    Only sessions created before the cutoff can hold expired messages, so
+    those are walked in ID order, ``chunk_size`` at a time, and their old
+    messages deleted through the (session_id, created_at, id) index. A
+    session is dropped once it is older than the cutoff and has nothing
+    newer left; an archived one goes when its newest archived message
+    expires.
+    """
+    if max_age_days < 1:
+        raise ValueError("max_age_days must be at least 1")
+
+    started = time.perf_counter()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    sessions = messages = 0
+    last_id = None
+
+    async with session_factory() as db:
+        while True:
+            query = select(ChatSession.id).where(ChatSession.created_at < cutoff)
+            if last_id is not None:
+                query = query.where(ChatSession.id > last_id)
+            result = await db.execute(query.order_by(ChatSession.id).limit(chunk_size))
+            session_ids = result.scalars().all()
+            await db.rollback()  # end the read; deletes run in their own transactions
+            if not session_ids:
+                break
+
+            while True:
+                deleted = await _delete_message_chunk(
+                    db,
+                    ChatMessage.session_id.in_(session_ids) & (ChatMessage.created_at < cutoff),
+                    chunk_size,
+                    keep_counts=True,
+                )
+                messages += deleted
+                if deleted < chunk_size:
+                    break
+
+            has_live = exists().where(ChatMessage.session_id == ChatSession.id)
+            has_recent_archive = exists().where(
+                ChatSessionArchive.session_id == ChatSession.id,
+                ChatSessionArchive.last_message_at >= cutoff,
+            )
+            removed = await _delete_sessions(
+                db,
+                ChatSession.id.in_(session_ids)
+                & (ChatSession.created_at < cutoff)
+                & ~has_live
+                & ~has_recent_archive,
+            )
+            sessions += len(removed)
+            logger.info(
+                f"Retention sweep: {messages} message(s), {sessions} session(s) deleted so far"
+            )
+            last_id = session_ids[-1]
+
+    report = {
+        "messages_deleted": messages,
+        "sessions_deleted": sessions,
+        "cutoff": cutoff.isoformat(),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Retention sweep finished: {report}")
+    return report
+
+
+# Advisory lock held by the worker sweeping a shard
+TRY_LOCK_SWEEP = text(
+    "SELECT pg_try_advisory_xact_lock(hashtext('purge_service.sweep_retention'))"
+)
+
+
+async def _sweep_shard(shard: Shard) -> Optional[dict]:
+    """Sweep a shard unless another worker is sweeping it; None if skipped.
+
+    The lock is taken in a transaction left open on a connection of its own
+    for the whole sweep, so it goes away with the sweep or the worker, also
+    behind a transaction-pooling pgbouncer.
+    """
+    async with shard.engine.connect() as conn, conn.begin():
+        if not (await conn.execute(TRY_LOCK_SWEEP)).scalar():
+            logger.info(f"Retention sweep of shard {shard.name} skipped: another worker runs it")
+            return None
+        return await sweep_retention(session_factory=shard.session_factory)
+
+
+async def run_retention_sweeper(
+    interval_seconds: float = settings.RETENTION_SWEEP_INTERVAL_SECONDS,
+):
+    """Sweep every shard every ``interval_seconds`` until cancelled.
+
+    Every worker runs this loop, but a shard is swept by one worker at a
+    time; the others skip it until their next round.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        for shard in shard_router.shards.values():
+            try:
+                await _sweep_shard(shard)
+            except Exception as e:
+                logger.exception(f"Retention sweep of shard {shard.name} failed: {e}")
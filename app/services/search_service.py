@@ -0,0 +1,215 @@
+import numpy as np
+from sqlalchemy import func, literal_column, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from fastapi import HTTPException
+from typing import List, Optional
+
+from app.db.models import ChatMessage, ChatSession
+from app.db.models.chat_message import SEARCH_CONFIG
+from app.core.config import settings
+from app.core.pagination import encode_rank_cursor, decode_rank_cursor
+from app.core.logging import logger
+from app.services.embedding_index import EmbeddingIndex, embedding_index
+
+MAX_SEARCH_LIMIT = 50
+MAX_SIMILAR_QUERIES = 32
+# Searches per similarity request while hits turn out to be deleted messages
+SIMILAR_REFILL_ROUNDS = 3
+MAX_QUERY_LENGTH = 256
+HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxWords=24, MinWords=8, "
+    "MaxFragments=2, FragmentDelimiter=\" … \""
+)
+
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: str,
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> dict:
+    """Rank a user's messages against a web-search style query.
+
+    Matches come from the GIN index on the generated ``content_tsv`` column
+    and are ordered by (rank, id) so pages can continue from a keyset cursor.
+    Snippets are highlighted with ``ts_headline`` only for the rows of the
+    returned page, since it re-parses the message text.
+    """
+    if not user_id:
+        raise HTTPException(status_code=422, detail="User ID is required.")
+
+    q = (q or "").strip()
+    if not q or len(q) > MAX_QUERY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query must be between 1 and {MAX_QUERY_LENGTH} characters",
+        )
+
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Limit must be between 1 and {MAX_SEARCH_LIMIT}",
+        )
+
+    config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+    ts_query = func.websearch_to_tsquery(config, q)
+    rank = func.ts_rank_cd(ChatMessage.content_tsv, ts_query)
+
+    matches = (
+        select(
+            ChatMessage.id,
+            ChatMessage.session_id,
+            ChatMessage.sender,
+            ChatMessage.content,
+            ChatMessage.created_at,
+            ChatSession.title.label("session_title"),
+            rank.label("rank"),
+        )
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatSession.user_id == user_id)
+        .where(ChatMessage.content_tsv.op("@@")(ts_query))
+    )
+    if cursor:
+        matches = matches.where(
+            tuple_(rank, ChatMessage.id) < tuple_(*decode_rank_cursor(cursor))
+        )
+
+    page = (
+        matches.order_by(rank.desc(), ChatMessage.id.desc())
+        .limit(limit + 1)
+        .subquery("page")
+    )
+    query = select(
+        page.c.id,
+        page.c.session_id,
+        page.c.session_title,
+        page.c.sender,
+        page.c.rank,
+        page.c.created_at,
+        func.ts_headline(config, page.c.content, ts_query, HEADLINE_OPTIONS).label("snippet"),
+    ).order_by(page.c.rank.desc(), page.c.id.desc())
+
+    try:
+        result = await db.execute(query)
+        rows = result.all()
+
+        has_more = len(rows) > limit
+        hits = [
+            {
+                "message_id": row.id,
+                "session_id": row.session_id,
+                "session_title": row.session_title,
+                "sender": getattr(row.sender, "value", row.sender),
+                "snippet": row.snippet,
+                "rank": row.rank,
+                "created_at": row.created_at,
+            }
+            for row in rows[:limit]
+        ]
+
+        next_cursor = None
+        if has_more:
+            last = hits[-1]
+            next_cursor = encode_rank_cursor(last["rank"], last["message_id"])
+
+        logger.info(f"Search for user {user_id} returned {len(hits)} hit(s)")
+        return {"hits": hits, "next_cursor": next_cursor}
+
+    except Exception as e:
+        logger.exception(f"Search failed for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+async def similar_messages(
+    db: AsyncSession,
+    user_id: str,
+    queries: List[List[float]],
+    k: int = 10,
+    index: EmbeddingIndex = embedding_index,
+) -> List[List[dict]]:
+    """The ``k`` messages of a user nearest to each query embedding.
+
+    All queries are scored by cosine similarity in one pass over the user's
+    in-memory embedding matrix; only the winning rows are then read from the
+    database. Hits on messages deleted, swept or archived since the index
+    was loaded are pruned from it and the search repeated, so each list is
+    refilled to ``k`` hits while the user has that many messages.
+    """
+    if not user_id:
+        raise HTTPException(status_code=422, detail="User ID is required.")
+
+    if k < 1 or k > MAX_SEARCH_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"k must be between 1 and {MAX_SEARCH_LIMIT}"
+        )
+
+    if not queries or len(queries) > MAX_SIMILAR_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Between 1 and {MAX_SIMILAR_QUERIES} query embeddings are required",
+        )
+
+    if any(len(query) != settings.EMBEDDING_DIMENSIONS for query in queries):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query embeddings must have {settings.EMBEDDING_DIMENSIONS} dimensions",
+        )
+
+    try:
+        vectors = np.asarray(queries, dtype=np.float32)
+        rows, gone = {}, set()
+        for _ in range(SIMILAR_REFILL_ROUNDS):
+            matches = await index.search(user_id, vectors, k)
+            keys = {
+                (session_id, message_id)
+                for hits in matches
+                for session_id, message_id, _ in hits
+                if message_id not in rows and message_id not in gone
+            }
+            if not keys:
+                break
+
+            result = await db.execute(
+                select(
+                    ChatMessage.id,
+                    ChatMessage.session_id,
+                    ChatMessage.sender,
+                    ChatMessage.content,
+                    ChatMessage.created_at,
+                    ChatSession.title.label("session_title"),
+                )
+                .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+                .where(ChatSession.user_id == user_id)
+                .where(tuple_(ChatMessage.session_id, ChatMessage.id).in_(keys))
+            )
+            rows.update((row.id, row) for row in result.all())
+            missing = {message_id for _, message_id in keys if message_id not in rows}
+            if not missing:
+                break
+            gone |= missing
+            index.forget(user_id, missing)
+
+        results = [
+            [
+                {
+                    "message_id": message_id,
+                    "session_id": session_id,
+                    "session_title": rows[message_id].session_title,
+                    "sender": getattr(rows[message_id].sender, "value", rows[message_id].sender),
+                    "content": rows[message_id].content,
+                    "score": score,
+                    "created_at": rows[message_id].created_at,
+                }
+                for session_id, message_id, score in hits
+                if message_id in rows
+            ]
+            for hits in matches
+        ]
+        logger.info(f"Similarity search of user {user_id}: {len(queries)} query(ies), k={k}")
+        return results
+
+    except Exception as e:
+        logger.exception(f"Similarity search failed for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
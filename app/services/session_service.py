@@ -1,11 +1,67 @@
+import time
+from sqlalchemy import update, delete, func, or_, true, tuple_, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
 from fastapi import HTTPException
+from typing import Optional, Set
 from uuid import UUID
 
-from app.db.models import ChatSession
-from app.schemas.session import ChatSessionCreate
+from app.db.models import ChatSession, ChatMessage, ChatSessionArchive
+from app.db.session import AsyncSessionLocal
+from app.db.sharding import new_shard_id, user_slot
+from app.schemas.session import ChatSessionCreate, ChatSessionUpdate
+from app.core.cache import build_cache, MISS
+from app.core.pagination import (
+    encode_cursor,
+    decode_cursor,
+    encode_activity_cursor,
+    decode_activity_cursor,
+)
+from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import registry, CallbackMetric
+from app.services.message_service import message_tail_cache
+
+# Session lists keyed by (user_id, is_favorite). Entries hold the output dicts,
+# which are only ever read after caching. Each worker has its own, so other
+# workers' writes are seen once the TTL expires.
+session_list_cache = build_cache(
+    settings.SESSION_CACHE_BACKEND,
+    max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS,
+)
+registry.register(
+    CallbackMetric(
+        "session_list_cache_events_total",
+        "Session list cache hits, misses, evictions, expirations and invalidations.",
+        ("event",),
+        lambda: [((event,), count) for event, count in session_list_cache.stats.as_dict().items()],
+        kind="counter",
+    )
+)
+
+
+# ChatSessionOut fields, selected as plain columns for the list endpoints
+SESSION_OUT_COLUMNS = ("id", "user_id", "title", "is_favorite", "created_at")
+SESSION_EXTRA_FIELDS = ("message_count", "last_message_at", "last_message_preview")
+
+
+def _session_out(row, extra: Optional[dict] = None) -> dict:
+    item = {name: getattr(row, name) for name in SESSION_OUT_COLUMNS}
+    item.update(dict.fromkeys(SESSION_EXTRA_FIELDS))
+    if extra:
+        item.update(extra)
+    return item
+
+
+def invalidate_session_lists(user_id: str, is_favorite: bool = True):
+    # The unfiltered list holds every session; the favorites list only
+    # needs dropping when a favorite session changes.
+    keys = [(user_id, False)]
+    if is_favorite:
+        keys.append((user_id, True))
+    session_list_cache.invalidate(*keys)
 
 
 async def create_chat_session(
@@ -18,11 +74,15 @@ async def create_chat_session(
             )
 
         new_session = ChatSession(
-            user_id=session_data.user_id, title=session_data.title
+            # The ID carries the user's shard slot, so it routes by itself
+            id=new_shard_id(user_slot(session_data.user_id)),
+            user_id=session_data.user_id,
+            title=session_data.title,
         )
         db.add(new_session)
         await db.commit()
         await db.refresh(new_session)
+        invalidate_session_lists(new_session.user_id, is_favorite=False)
         logger.info(f"Created new session for user: {session_data.user_id}")
         return new_session
 
@@ -39,12 +99,24 @@ async def get_chat_session_by_user(
         if not user_id:
             raise HTTPException(status_code=422, detail="User ID is required.")
 
-        query = select(ChatSession).where(ChatSession.user_id == user_id)
+        cache_key = (user_id, bool(is_favorite))
+        cached = session_list_cache.get(cache_key)
+        if cached is not MISS:
+            logger.info(
+                f"Served {len(cached)} cached session(s) for user {user_id} (is_favorite={is_favorite})"
+            )
+            return cached
+
+        token = session_list_cache.begin(cache_key)
+        query = select(
+            *(getattr(ChatSession, name) for name in SESSION_OUT_COLUMNS)
+        ).where(ChatSession.user_id == user_id)
         if is_favorite:
             query = query.where(ChatSession.is_favorite == True)
 
         result = await db.execute(query.order_by(ChatSession.created_at.desc()))
-        sessions = result.scalars().all()
+        sessions = [_session_out(row) for row in result.all()]
+        session_list_cache.set(cache_key, sessions, token)
 
         logger.info(
             f"Retrieved {len(sessions)} session(s) for user {user_id} (is_favorite={is_favorite})"
@@ -56,21 +128,177 @@ async def get_chat_session_by_user(
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+MAX_PAGE_SIZE = 100
+PREVIEW_LENGTH = 200
+SESSION_INCLUDES = {"stats", "preview"}
+SESSION_ORDERS = {"created", "activity"}
+
+
+def _activity_order(session):
+    return session.last_message_at.desc().nullslast(), session.id.desc()
+
+
+def _activity_page(sessions, cursor: Optional[str], limit: int):
+    """Page of ``sessions`` by latest message, empty sessions last.
+
+    Sessions with messages and empty ones are read as two ranges of the
+    (user_id, last_message_at DESC NULLS LAST, id DESC) index, so the page
+    costs ``limit`` rows however deep the cursor is.
+    """
+    last_message_at, after_id = decode_activity_cursor(cursor) if cursor else (None, None)
+    empty = sessions.where(ChatSession.last_message_at.is_(None))
+    if after_id is not None and last_message_at is None:
+        # Already past every session with messages
+        empty = empty.where(ChatSession.id < after_id)
+        return empty.order_by(ChatSession.id.desc()).limit(limit + 1).subquery("page")
+    empty = empty.order_by(ChatSession.id.desc()).limit(limit + 1)
+
+    active = sessions.where(ChatSession.last_message_at.is_not(None))
+    if last_message_at is not None:
+        active = active.where(
+            tuple_(ChatSession.last_message_at, ChatSession.id) < tuple_(last_message_at, after_id)
+        )
+    active = active.order_by(*_activity_order(ChatSession)).limit(limit + 1)
+    both = union_all(active, empty).subquery()
+    return select(both).order_by(*_activity_order(both.c)).limit(limit + 1).subquery("page")
+
+
+async def get_chat_session_page(
+    db: AsyncSession,
+    user_id: str,
+    is_favorite: bool = False,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include: Optional[Set[str]] = None,
+    order: str = "created",
+) -> dict:
+    """Cursor-paginate a user's sessions, newest first.
+
+    ``order="activity"`` sorts by latest message instead of creation. Stats
+    are the session's activity counters; the latest-message preview comes
+    from a LATERAL subquery joined onto the already-limited page, so the
+    query touches ``limit`` sessions' messages through the
+    (session_id, created_at, id) index no matter how many sessions the user
+    has.
+    """
+    include = include or set()
+    if not user_id:
+        raise HTTPException(status_code=422, detail="User ID is required.")
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Limit must be between 1 and {MAX_PAGE_SIZE}",
+        )
+
+    unknown = include - SESSION_INCLUDES
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown include option(s): {', '.join(sorted(unknown))}"
+        )
+
+    if order not in SESSION_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Order must be one of: {', '.join(sorted(SESSION_ORDERS))}",
+        )
+    by_activity = order == "activity"
+
+    page_query = select(ChatSession).where(ChatSession.user_id == user_id)
+    if is_favorite:
+        page_query = page_query.where(ChatSession.is_favorite == True)
+    if by_activity:
+        page = _activity_page(page_query, cursor, limit)
+    else:
+        if cursor:
+            page_query = page_query.where(
+                tuple_(ChatSession.created_at, ChatSession.id) < tuple_(*decode_cursor(cursor))
+            )
+        page = (
+            page_query.order_by(ChatSession.created_at.desc(), ChatSession.id.desc())
+            .limit(limit + 1)
+            .subquery("page")
+        )
+    session = aliased(ChatSession, page)
+
+    query = select(*(getattr(session, name) for name in SESSION_OUT_COLUMNS))
+    if by_activity:
+        query = query.add_columns(session.last_message_at.label("activity_at"))
+    extra_columns = []
+    if "stats" in include:
+        query = query.add_columns(session.message_count, session.last_message_at)
+        extra_columns += ["message_count", "last_message_at"]
+    if "preview" in include:
+        preview = (
+            select(func.left(ChatMessage.content, PREVIEW_LENGTH).label("last_message_preview"))
+            .where(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(1)
+            .lateral("preview")
+        )
+        query = query.add_columns(preview.c.last_message_preview)
+        query = query.outerjoin_from(session, preview, true())
+        extra_columns.append("last_message_preview")
+
+    try:
+        if by_activity:
+            query = query.order_by(*_activity_order(session))
+        else:
+            query = query.order_by(session.created_at.desc(), session.id.desc())
+        result = await db.execute(query)
+        rows = result.all()
+
+        has_more = len(rows) > limit
+        sessions = [
+            _session_out(row, {name: getattr(row, name) for name in extra_columns})
+            for row in rows[:limit]
+        ]
+
+        next_cursor = None
+        if has_more and by_activity:
+            next_cursor = encode_activity_cursor(rows[limit - 1].activity_at, rows[limit - 1].id)
+        elif has_more:
+            last = sessions[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+
+        logger.info(
+            f"Retrieved page of {len(sessions)} session(s) for user {user_id} "
+            f"(order={order}, include={sorted(include)})"
+        )
+        return {"sessions": sessions, "next_cursor": next_cursor}
+
+    except Exception as e:
+        logger.exception(f"Failed to fetch sessions for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+async def _update_session(db: AsyncSession, session_id: str, **values) -> ChatSession:
+    # Single UPDATE ... RETURNING round-trip instead of SELECT + commit + refresh
+    result = await db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(**values)
+        .returning(ChatSession)
+        .execution_options(synchronize_session=False)
+    )
+    session = result.scalar_one_or_none()
+
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    await db.commit()
+    invalidate_session_lists(
+        session.user_id, session.is_favorite or "is_favorite" in values
+    )
+    return session
+
+
 async def rename_chat_session(db: AsyncSession, session_id: str, new_title: str):
     try:
         if not new_title:
             raise HTTPException(status_code=422, detail="New title is required.")
 
-        query = select(ChatSession).where(ChatSession.id == session_id)
-        result = await db.execute(query)
-        session = result.scalar_one_or_none()
-
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-
-        session.title = new_title
-        await db.commit()
-        await db.refresh(session)
+        session = await _update_session(db, session_id, title=new_title)
 
         logger.info(f"Renamed session {session_id} to '{new_title}'")
         return session
@@ -83,16 +311,7 @@ async def rename_chat_session(db: AsyncSession, session_id: str, new_title: str)
 
 async def set_favorite_status(db: AsyncSession, session_id: str, is_favorite: bool):
     try:
-        query = select(ChatSession).where(ChatSession.id == session_id)
-        result = await db.execute(query)
-        session = result.scalar_one_or_none()
-
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-
-        session.is_favorite = is_favorite
-        await db.commit()
-        await db.refresh(session)
+        session = await _update_session(db, session_id, is_favorite=is_favorite)
 
         logger.info(f"Set favorite={is_favorite} for session {session_id}")
         return session
@@ -103,17 +322,47 @@ async def set_favorite_status(db: AsyncSession, session_id: str, is_favorite: bo
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+async def update_chat_session(
+    db: AsyncSession, session_id: str, update_data: ChatSessionUpdate
+):
+    try:
+        values = update_data.model_dump(exclude_unset=True, exclude_none=True)
+        if not values:
+            raise HTTPException(status_code=422, detail="Nothing to update.")
+        if "title" in values and not values["title"]:
+            raise HTTPException(status_code=422, detail="Title must not be empty.")
+
+        session = await _update_session(db, session_id, **values)
+
+        logger.info(f"Updated session {session_id} with {values}")
+        return session
+
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        logger.exception(f"Failed to update session {session_id}: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 async def delete_chat_session(db: AsyncSession, session_id: str):
     try:
-        query = select(ChatSession).where(ChatSession.id == session_id)
-        result = await db.execute(query)
-        session = result.scalar_one_or_none()
+        # Messages are removed by the ON DELETE CASCADE foreign key, so nothing
+        # is loaded into memory regardless of the session's size.
+        result = await db.execute(
+            delete(ChatSession)
+            .where(ChatSession.id == session_id)
+            .returning(ChatSession.user_id, ChatSession.is_favorite)
+        )
+        session = result.one_or_none()
 
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        await db.delete(session)
         await db.commit()
+        invalidate_session_lists(session.user_id, session.is_favorite)
+        message_tail_cache.invalidate(str(session_id))
 
         logger.info(f"Deleted session {session_id}")
 
@@ -121,3 +370,85 @@ async def delete_chat_session(db: AsyncSession, session_id: str):
         logger.exception(f"Failed to delete session {session_id}: {e}")
         await db.rollback()
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+async def repair_session_activity(
+    session_factory=AsyncSessionLocal,
+    batch_size: int = settings.ACTIVITY_REPAIR_BATCH_SIZE,
+) -> dict:
+    """Recompute message_count and last_message_at of every session.
+
+    Sessions are walked in ID order, ``batch_size`` at a time. Each batch is
+    locked FOR UPDATE first, which waits out writers in flight and holds off
+    new ones, so the recount that follows sees every committed message; only
+    sessions whose counters drifted are written. Archived sessions are
+    counted from their archive.
+    """
+    started = time.perf_counter()
+    live_count = (
+        select(func.count()).where(ChatMessage.session_id == ChatSession.id).scalar_subquery()
+    )
+    live_last = (
+        select(func.max(ChatMessage.created_at))
+        .where(ChatMessage.session_id == ChatSession.id)
+        .scalar_subquery()
+    )
+    archived_count = (
+        select(ChatSessionArchive.message_count)
+        .where(ChatSessionArchive.session_id == ChatSession.id)
+        .scalar_subquery()
+    )
+    archived_last = (
+        select(ChatSessionArchive.last_message_at)
+        .where(ChatSessionArchive.session_id == ChatSession.id)
+        .scalar_subquery()
+    )
+    # A session's messages are either all live or all archived
+    message_count = func.coalesce(archived_count, live_count)
+    last_message_at = func.coalesce(archived_last, live_last)
+
+    scanned = repaired = 0
+    last_id = None
+    async with session_factory() as db:
+        while True:
+            query = select(ChatSession.id)
+            if last_id is not None:
+                query = query.where(ChatSession.id > last_id)
+            result = await db.execute(
+                query.order_by(ChatSession.id).limit(batch_size).with_for_update()
+            )
+            session_ids = result.scalars().all()
+            if not session_ids:
+                await db.rollback()
+                break
+
+            result = await db.execute(
+                update(ChatSession)
+                .where(ChatSession.id.in_(session_ids))
+                .where(
+                    or_(
+                        ChatSession.message_count.is_distinct_from(message_count),
+                        ChatSession.last_message_at.is_distinct_from(last_message_at),
+                    )
+                )
+                .values(
+                    message_count=message_count,
+                    last_message_at=last_message_at,
+                    updatedAt=ChatSession.updatedAt,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            scanned += len(session_ids)
+            repaired += result.rowcount
+            last_id = session_ids[-1]
+            if len(session_ids) < batch_size:
+                break
+
+    report = {
+        "sessions_scanned": scanned,
+        "sessions_repaired": repaired,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Repaired session activity counters: {report}")
+    return report
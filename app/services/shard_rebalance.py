@@ -0,0 +1,265 @@
+"""Move hash slots between shards while the API keeps serving.
+
+Changing SHARD_RING takes three steps (see scripts/rebalance_shards.py):
+
+1. ``pin_moving_slots(new_ring)`` while workers still run the old ring pins
+   every slot the new ring places elsewhere to the shard holding it now, so
+   deploying the new ring changes nothing yet.
+2. Deploy the new SHARD_RING; added shards must be in DATABASE_SHARD_URLS,
+   removed ones stay there until they are drained.
+3. ``rebalance()`` moves each pinned slot to its ring shard and unpins it.
+
+A slot is moved by marking it ``moving``, which refuses writes of its users
+with 503 while reads carry on, waiting until every worker has seen that,
+copying its sessions, archives and messages, pointing it at the target,
+waiting again, and deleting it from the source. A slot holds 1/SLOTS of the
+users, so a user's writes pause only while their own slot is copied.
+Running ``rebalance()`` again resumes an interrupted move; ``prune_strays()``
+deletes what a move interrupted after its switch left on the source.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from app.db.models import ChatMessage, ChatSession, ChatSessionArchive, ShardSlot
+from app.db.session import shard_router
+from app.db.sharding import SLOTS, HashRing, Shard, ShardRouter, user_slot_sql
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.purge_service import _delete_message_chunk, _delete_sessions
+
+_sessions = ChatSession.__table__
+_archives = ChatSessionArchive.__table__
+_messages = ChatMessage.__table__
+
+
+def _copied_columns(table):
+    # Generated columns (content_tsv) are recomputed by the target
+    return [column for column in table.columns if column.computed is None]
+
+
+def slots_to_pin(
+    router: ShardRouter, new_ring: Sequence[str], overrides: Dict[int, Tuple[str, bool]]
+) -> Dict[int, str]:
+    """Unpinned slots the new ring moves, mapped to the shard holding them now."""
+    placement = HashRing(new_ring).placement()
+    return {
+        slot: router.ring_shard(slot)
+        for slot in range(SLOTS)
+        if slot not in overrides and placement[slot] != router.ring_shard(slot)
+    }
+
+
+async def pin_moving_slots(new_ring: Sequence[str], router: ShardRouter = shard_router) -> dict:
+    overrides = await router.read_directory()
+    pins = slots_to_pin(router, new_ring, overrides)
+    if pins:
+        async with router.main.session_factory() as db:
+            await db.execute(
+                pg_insert(ShardSlot).on_conflict_do_nothing(index_elements=[ShardSlot.slot]),
+                [{"slot": slot, "shard": shard} for slot, shard in sorted(pins.items())],
+            )
+            await db.commit()
+    logger.info(f"Pinned {len(pins)} slot(s) ahead of ring {list(new_ring)}")
+    return {"slots_pinned": len(pins), "slots_already_pinned": len(overrides)}
+
+
+async def _set_slot(router: ShardRouter, slot: int, shard: Optional[str], moving: bool = False):
+    """Point a slot at ``shard``, or back at the ring with None."""
+    async with router.main.session_factory() as db:
+        if shard is None:
+            await db.execute(delete(ShardSlot).where(ShardSlot.slot == slot))
+        else:
+            statement = pg_insert(ShardSlot).values(slot=slot, shard=shard, moving=moving)
+            await db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[ShardSlot.slot],
+                    set_={"shard": shard, "moving": moving, "updated_at": func.now()},
+                )
+            )
+        await db.commit()
+
+
+async def _copy_rows(
+    source_db, target_db, table, where, keys: Sequence[str], batch_size: int
+) -> int:
+    """Copy the rows matching ``where`` in key order, ``batch_size`` at a time."""
+    columns = _copied_columns(table)
+    key_columns = [table.c[key] for key in keys]
+    copied = 0
+    last = None
+    while True:
+        query = select(*columns).where(where)
+        if last is not None:
+            query = query.where(tuple_(*key_columns) > tuple_(*last))
+        result = await source_db.execute(query.order_by(*key_columns).limit(batch_size))
+        rows = result.all()
+        if rows:
+            await target_db.execute(insert(table), [dict(row._mapping) for row in rows])
+            copied += len(rows)
+        if len(rows) < batch_size:
+            return copied
+        last = [getattr(rows[-1], key) for key in keys]
+
+
+async def _copy_slot(source: Shard, target: Shard, slot: int, batch_size: int) -> dict:
+    """Copy a slot's sessions with their archives and messages, a page at a time."""
+    report = {"sessions_copied": 0, "archives_copied": 0, "messages_copied": 0}
+    last_id = None
+    async with source.session_factory() as source_db, target.session_factory() as target_db:
+        while True:
+            query = select(*_copied_columns(_sessions)).where(
+                user_slot_sql(_sessions.c.user_id) == slot
+            )
+            if last_id is not None:
+                query = query.where(_sessions.c.id > last_id)
+            result = await source_db.execute(query.order_by(_sessions.c.id).limit(batch_size))
+            rows = result.all()
+            if not rows:
+                break
+
+            await target_db.execute(insert(_sessions), [dict(row._mapping) for row in rows])
+            session_ids = [row.id for row in rows]
+            report["archives_copied"] += await _copy_rows(
+                source_db,
+                target_db,
+                _archives,
+                _archives.c.session_id.in_(session_ids),
+                ("session_id",),
+                batch_size,
+            )
+            report["messages_copied"] += await _copy_rows(
+                source_db,
+                target_db,
+                _messages,
+                _messages.c.session_id.in_(session_ids),
+                ("session_id", "id"),
+                batch_size,
+            )
+            await target_db.commit()
+            await source_db.rollback()  # end the read snapshot between pages
+            report["sessions_copied"] += len(rows)
+            last_id = session_ids[-1]
+    return report
+
+
+async def _delete_slot(shard: Shard, slot: int, batch_size: int) -> int:
+    """Delete a slot's sessions (and so their archives) and messages from a shard."""
+    sessions = 0
+    async with shard.session_factory() as db:
+        while True:
+            result = await db.execute(
+                select(ChatSession.id)
+                .where(user_slot_sql(ChatSession.user_id) == slot)
+                .order_by(ChatSession.id)
+                .limit(batch_size)
+            )
+            session_ids = result.scalars().all()
+            if not session_ids:
+                return sessions
+            while True:
+                deleted = await _delete_message_chunk(
+                    db, ChatMessage.session_id.in_(session_ids), batch_size
+                )
+                if deleted < batch_size:
+                    break
+            sessions += len(await _delete_sessions(db, ChatSession.id.in_(session_ids)))
+
+
+async def move_slot(
+    slot: int,
+    source: str,
+    target: str,
+    router: ShardRouter = shard_router,
+    batch_size: int = settings.SHARD_MOVE_BATCH_SIZE,
+    settle_seconds: Optional[float] = None,
+) -> dict:
+    """Move one slot's data from ``source`` to ``target``, refusing its writes meanwhile.
+
+    ``settle_seconds`` (default: twice SHARD_DIRECTORY_TTL_SECONDS) is how
+    long every worker is given to notice a change of the slot's placement
+    and finish requests begun before it.
+    """
+    started = time.perf_counter()
+    settle = 2 * router.directory_ttl if settle_seconds is None else settle_seconds
+
+    await _set_slot(router, slot, source, moving=True)
+    await asyncio.sleep(settle)
+    # Anything on the target is left from an interrupted move and is stale
+    await _delete_slot(router.shards[target], slot, batch_size)
+    report = await _copy_slot(router.shards[source], router.shards[target], slot, batch_size)
+
+    await _set_slot(router, slot, None if router.ring_shard(slot) == target else target)
+    await asyncio.sleep(settle)
+    await _delete_slot(router.shards[source], slot, batch_size)
+
+    report.update(
+        slot=slot,
+        source=source,
+        target=target,
+        elapsed_seconds=round(time.perf_counter() - started, 3),
+    )
+    logger.info(f"Moved slot {slot}: {report}")
+    return report
+
+
+async def rebalance(
+    router: ShardRouter = shard_router,
+    batch_size: int = settings.SHARD_MOVE_BATCH_SIZE,
+    settle_seconds: Optional[float] = None,
+) -> dict:
+    """Move every pinned slot to the shard the ring places it on."""
+    started = time.perf_counter()
+    report = {"slots_moved": 0, "sessions_moved": 0, "messages_moved": 0}
+    for slot, (shard, _) in sorted((await router.read_directory()).items()):
+        target = router.ring_shard(slot)
+        if shard == target:
+            await _set_slot(router, slot, None)
+            continue
+        moved = await move_slot(slot, shard, target, router, batch_size, settle_seconds)
+        report["slots_moved"] += 1
+        report["sessions_moved"] += moved["sessions_copied"]
+        report["messages_moved"] += moved["messages_copied"]
+
+    report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Rebalance finished: {report}")
+    return report
+
+
+async def prune_strays(
+    router: ShardRouter = shard_router, batch_size: int = settings.SHARD_MOVE_BATCH_SIZE
+) -> dict:
+    """Delete slots found on a shard they are not placed on (and not moving to)."""
+    overrides = await router.read_directory()
+    report: Dict[str, int] = {}
+    for name, shard in router.shards.items():
+        async with shard.session_factory() as db:
+            result = await db.execute(select(user_slot_sql(ChatSession.user_id)).distinct())
+            slots = [int(slot) for slot in result.scalars().all()]
+
+        deleted = 0
+        for slot in slots:
+            placed, moving = overrides.get(slot, (router.ring_shard(slot), False))
+            if placed != name and not moving:
+                deleted += await _delete_slot(shard, slot, batch_size)
+        report[name] = deleted
+    logger.info(f"Pruned stray sessions per shard: {report}")
+    return report
+
+
+async def shard_status(router: ShardRouter = shard_router) -> dict:
+    overrides = await router.read_directory()
+    slots: Dict[str, int] = {name: 0 for name in router.shards}
+    for slot in range(SLOTS):
+        placed = overrides.get(slot, (router.ring_shard(slot), False))[0]
+        slots[placed] = slots.get(placed, 0) + 1
+    return {
+        "slots": slots,
+        "pinned": sorted(slot for slot, (_, moving) in overrides.items() if not moving),
+        "moving": sorted(slot for slot, (_, moving) in overrides.items() if moving),
+    }
@@ -0,0 +1,104 @@
+import asyncio
+from typing import List, Optional, Set, Tuple
+from fastapi import HTTPException
+
+from app.db.models.chat_message import ChatMessage
+from app.db.session import AsyncSessionLocal, shard_router
+from app.schemas.message import ChatMessageCreate
+from app.services.message_service import (
+    add_messages_bulk,
+    add_messages_across_shards,
+    MAX_BATCH_SIZE,
+)
+from app.core.config import settings
+from app.core.logging import logger
+
+
+class MessageWriteBuffer:
+    """Coalesce concurrent single-message inserts into group commits.
+
+    Messages submitted within ``window_ms`` of each other (or until
+    ``max_batch`` are pending) are written by one multi-row INSERT in one
+    transaction. Each caller awaits its own future, which resolves to the
+    persisted ``ChatMessage`` or raises that item's own error. With a
+    ``router``, each flush commits once per shard instead.
+    """
+
+    def __init__(self, session_factory, window_ms: float, max_batch: int, router=None):
+        self._session_factory = session_factory
+        self._router = router
+        self.window = window_ms / 1000
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_SIZE))
+        self._pending: List[Tuple[ChatMessageCreate, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def submit(self, message_data: ChatMessageCreate) -> ChatMessage:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message_data, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+        return await future
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[ChatMessageCreate, asyncio.Future]]):
+        items = [message_data.model_dump() for message_data, _ in batch]
+        try:
+            if self._router is not None:
+                result = await add_messages_across_shards(items, self._router)
+            else:
+                async with self._session_factory() as db:
+                    result = await add_messages_bulk(db, items)
+        except Exception as e:
+            logger.exception(f"Group commit of {len(batch)} message(s) failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Created rows come back in submission order, skipping rejected items
+        errors = {error["index"]: error["detail"] for error in result["errors"]}
+        created = iter(result["created"])
+        for index, (_, future) in enumerate(batch):
+            if index in errors:
+                outcome = HTTPException(status_code=422, detail=errors[index])
+            else:
+                outcome = next(created)
+
+            if future.done():  # caller went away; the row is still persisted
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def drain(self):
+        """Flush anything pending and wait for in-flight group commits."""
+        self._schedule_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+message_write_buffer = MessageWriteBuffer(
+    AsyncSessionLocal,
+    window_ms=settings.MESSAGE_WRITE_BUFFER_WINDOW_MS,
+    max_batch=settings.MESSAGE_WRITE_BUFFER_MAX_BATCH,
+    router=shard_router if shard_router.sharded else None,
+)
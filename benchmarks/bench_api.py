@@ -0,0 +1,447 @@
+"""Load test every API route of app.main:app against a throwaway database.
+
+Creates a scratch database next to the one in DATABASE_URL (or
+--database-url), seeds it through the COPY import path with many users,
+one session of --large-session-messages messages and large RAG contexts,
+then drives each route through httpx's ASGI transport with --concurrency
+clients. Reports throughput and p50/p95/p99 latency per scenario, writes
+them to --output as JSON and, given --baseline, exits non-zero when a
+scenario got slower or less reliable than the baseline allows::
+
+    python benchmarks/bench_api.py --output bench.json
+    python benchmarks/bench_api.py --baseline benchmarks/baseline.json --tolerance 0.25
+
+The scratch database is dropped afterwards unless --keep is given. The
+per-route rate limit is disabled so that it does not dominate the numbers.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+from uuid import uuid4
+
+sys.path.append(".")
+
+import asyncpg
+import httpx
+from sqlalchemy.engine import make_url
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+
+@dataclass
+class Seed:
+    users: List[str]
+    sessions: List[str]
+    large_session: str
+    context_messages: List[str]
+    disposable_sessions: List[str]
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    request: Callable[[int], dict]  # request index -> httpx request kwargs
+    requests: Optional[int] = None  # caps --requests for heavy routes
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _sentence(rng: random.Random, words: int = 30) -> str:
+    # Zipf-like: low-numbered terms are common, high-numbered ones rare
+    return " ".join(
+        VOCABULARY[min(int(rng.paretovariate(1.0)) - 1, len(VOCABULARY) - 1)]
+        for _ in range(words)
+    )
+
+
+def _context(rng: random.Random, kilobytes: int) -> dict:
+    chunks = max(1, kilobytes * 1024 // 600)
+    return {
+        "retriever": "bench",
+        "chunks": [
+            {"doc_id": str(uuid4()), "score": round(rng.random(), 4), "text": _sentence(rng, 80)}
+            for _ in range(chunks)
+        ],
+    }
+
+
+# --- scratch database -------------------------------------------------------
+
+
+async def _admin_connection(url):
+    return await asyncpg.connect(
+        user=url.username,
+        password=url.password,
+        host=url.host or "localhost",
+        port=url.port or 5432,
+        database="postgres",
+    )
+
+
+async def create_scratch_database(server_url: str) -> str:
+    url = make_url(server_url)
+    name = f"rag_chat_bench_{uuid4().hex[:8]}"
+    conn = await _admin_connection(url)
+    try:
+        await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+    return url.set(database=name).render_as_string(hide_password=False)
+
+
+async def drop_scratch_database(scratch_url: str):
+    url = make_url(scratch_url)
+    conn = await _admin_connection(url)
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{url.database}" WITH (FORCE)')
+    finally:
+        await conn.close()
+
+
+# --- seeding ----------------------------------------------------------------
+
+
+async def seed(args) -> Seed:
+    from app.db.init_db import init_db
+    from app.services.import_service import import_records
+
+    await init_db()
+    rng = random.Random(42)
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    sessions, context_messages = [], []
+    large_session = str(uuid4())
+    disposable = [str(uuid4()) for _ in range(args.requests + args.warmup)]
+
+    def messages(session_id: str, count: int):
+        for i in range(count):
+            message_id = str(uuid4())
+            fields = {
+                "id": message_id,
+                "session_id": session_id,
+                "sender": "user" if i % 2 == 0 else "assistant",
+                "content": _sentence(rng),
+            }
+            if i % args.context_every == 1:
+                fields["context"] = _context(rng, args.context_kb)
+                if len(context_messages) < 1000:
+                    context_messages.append(message_id)
+            yield "message", fields
+
+    async def records():
+        yield "session", {"id": large_session, "user_id": users[0], "title": "large session"}
+        for kind_fields in messages(large_session, args.large_session_messages):
+            yield kind_fields
+        for user in users:
+            for index in range(args.sessions_per_user):
+                session_id = str(uuid4())
+                sessions.append(session_id)
+                yield "session", {"id": session_id, "user_id": user, "title": f"session {index}"}
+                for kind_fields in messages(session_id, args.messages_per_session):
+                    yield kind_fields
+        for session_id in disposable:
+            yield "session", {"id": session_id, "user_id": "bench-disposable", "title": "delete me"}
+
+    report = await import_records(records(), job_id=f"bench-api-{uuid4()}")
+    print(
+        f"seeded {report['sessions_imported']} sessions, {report['messages_imported']} "
+        f"messages at {report['rows_per_second']} rows/s"
+    )
+    return Seed(users, sessions, large_session, context_messages, disposable)
+
+
+# --- scenarios --------------------------------------------------------------
+
+
+def scenarios(data: Seed, rng: random.Random) -> List[Scenario]:
+    users, sessions, large = data.users, data.sessions, data.large_session
+
+    def user(i):
+        return users[i % len(users)]
+
+    def session(i):
+        return sessions[i % len(sessions)]
+
+    def message(i):
+        return {
+            "session_id": session(i),
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "content": _sentence(rng),
+        }
+
+    def import_body(i):
+        session_id = str(uuid4())
+        lines = [{"type": "session", "id": session_id, "user_id": "bench-import"}]
+        for k in range(100):
+            lines.append({"type": "message", "id": str(uuid4()), **message(k), "session_id": session_id})
+        return "\n".join(json.dumps(line) for line in lines)
+
+    def get(url, **params):
+        return {"url": url, "params": params}
+
+    def send(url, body):
+        return {"url": url, "json": body}
+
+    contexts = data.context_messages
+    return [
+        Scenario("health", "GET", lambda i: get("/health")),
+        Scenario("metrics", "GET", lambda i: get("/metrics"), requests=100),
+        Scenario(
+            "create_session",
+            "POST",
+            lambda i: send("/session/", {"user_id": user(i), "title": f"new {i}"}),
+        ),
+        Scenario("list_sessions", "GET", lambda i: get("/session/", user_id=user(i))),
+        Scenario(
+            "list_sessions_page",
+            "GET",
+            lambda i: get("/session/", user_id=user(i), limit=20, include="stats,preview"),
+        ),
+        Scenario(
+            "rename_session",
+            "PUT",
+            lambda i: send(f"/session/{session(i)}/rename", {"title": f"renamed {i}"}),
+        ),
+        Scenario(
+            "favorite_session",
+            "PUT",
+            lambda i: send(f"/session/{session(i)}/favorite", {"is_favorite": i % 2 == 0}),
+        ),
+        Scenario(
+            "update_session",
+            "PATCH",
+            lambda i: send(f"/session/{session(i)}", {"title": f"patched {i}", "is_favorite": False}),
+        ),
+        Scenario(
+            "delete_session", "DELETE", lambda i: {"url": f"/session/{data.disposable_sessions[i]}"}
+        ),
+        Scenario("create_message", "POST", lambda i: send("/messages/", message(i))),
+        Scenario(
+            "create_message_batch",
+            "POST",
+            lambda i: send("/messages/batch", {"messages": [message(i + k) for k in range(100)]}),
+            requests=50,
+        ),
+        Scenario(
+            "list_messages_newest",
+            "GET",
+            lambda i: get(f"/messages/session/{large}", limit=100, reverse=True),
+        ),
+        Scenario(
+            "list_messages_with_context",
+            "GET",
+            lambda i: get(f"/messages/session/{large}", limit=100, include_context=True),
+        ),
+        Scenario(
+            "list_messages_deep_offset",
+            "GET",
+            lambda i: get(f"/messages/session/{large}", limit=100, offset=10_000),
+        ),
+        Scenario(
+            "message_window",
+            "GET",
+            lambda i: get(f"/messages/session/{large}/window", max_tokens=4000),
+        ),
+        Scenario(
+            "message_context",
+            "GET",
+            lambda i: get(f"/messages/{contexts[i % len(contexts)]}/context"),
+        ),
+        Scenario("search", "GET", lambda i: get("/search", user_id=user(i), q=VOCABULARY[i % 50])),
+        Scenario("export_large_session", "GET", lambda i: get(f"/export/session/{large}"), requests=5),
+        Scenario("export_user", "GET", lambda i: get(f"/export/user/{user(i)}"), requests=50),
+        Scenario(
+            "admin_import",
+            "POST",
+            lambda i: {
+                "url": "/admin/import",
+                "params": {"job_id": f"bench-{uuid4()}"},
+                "content": import_body(i),
+            },
+            requests=20,
+        ),
+    ]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, total: int, concurrency: int, warmup: int
+):
+    for i in range(total, total + min(warmup, total)):
+        await client.request(scenario.method, **scenario.request(i))
+
+    latencies, errors = [], 0
+    indices = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in indices:
+            kwargs = scenario.request(i)
+            start = time.perf_counter()
+            response = await client.request(scenario.method, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4),
+        "throughput_rps": round(total / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+    }
+
+
+# --- reporting --------------------------------------------------------------
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Scenarios whose p95, throughput or error rate regressed past ``tolerance``."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s"
+            )
+        if current["error_rate"] > before["error_rate"]:
+            regressions.append(f"{name}: error rate {before['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args) -> int:
+    scratch_url = await create_scratch_database(args.database_url)
+    # Settings are read at import time, so point the app at the scratch
+    # database before anything from app/ is imported.
+    os.environ["DATABASE_URL"] = scratch_url
+    os.environ["DATABASE_READ_URL"] = ""
+    os.environ["LOG_LEVEL"] = args.log_level
+    os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+
+    from app.main import app
+    from app.core.config import settings
+    from app.core.rate_limiter import limiter
+    from app.db.session import engine
+
+    limiter.enabled = False
+    results = {}
+    try:
+        data = await seed(args)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://bench",
+            headers={"X-API-Key": settings.API_KEY},
+            timeout=None,
+        )
+        selected = set(args.only or [])
+        for scenario in scenarios(data, random.Random(7)):
+            if selected and scenario.name not in selected:
+                continue
+            total = min(scenario.requests or args.requests, args.requests)
+            results[scenario.name] = stats = await run_scenario(
+                client, scenario, total, args.concurrency, args.warmup
+            )
+            print(
+                f"{scenario.name:<28} {stats['throughput_rps']:8.1f} req/s   "
+                f"p50 {stats['p50_ms']:8.2f}   p95 {stats['p95_ms']:8.2f}   "
+                f"p99 {stats['p99_ms']:8.2f} ms   errors {stats['errors']}"
+            )
+        await client.aclose()
+    finally:
+        await engine.dispose()
+        if args.keep:
+            print(f"kept scratch database {make_url(scratch_url).database}")
+        else:
+            await drop_scratch_database(scratch_url)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "seed": {
+                "users": args.users,
+                "sessions_per_user": args.sessions_per_user,
+                "messages_per_session": args.messages_per_session,
+                "large_session_messages": args.large_session_messages,
+                "context_kb": args.context_kb,
+            },
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("DATABASE_URL"),
+        help="Server to create the scratch database on",
+    )
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario (upper bound)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions-per-user", type=int, default=5)
+    parser.add_argument("--messages-per-session", type=int, default=50)
+    parser.add_argument("--large-session-messages", type=int, default=20_000)
+    parser.add_argument("--context-kb", type=int, default=16, help="Size of each RAG context blob")
+    parser.add_argument("--context-every", type=int, default=5, help="Every Nth message carries a context")
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--output", default="bench_api_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,109 @@
+"""Measure request throughput with logging off, synchronous and queued.
+
+Each request logs three INFO lines, like the session and message routes,
+plus the access line of RequestContextMiddleware.
+"sync" is the previous setup (loguru writing straight to the stream);
+"queued" is app.core.logging's background JSON sink. Writes go to a
+stream that sleeps ``--write-latency-us`` per write to mimic a congested
+stdout pipe. Settings must load (API_KEY, DATABASE_URL) but no database
+is used::
+
+    python benchmarks/bench_logging_overhead.py --requests 5000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.append(".")
+
+import httpx
+from fastapi import FastAPI
+from loguru import logger
+
+from app.core.correlation import RequestContextMiddleware
+from app.core.logging import QueuedJSONSink, _add_correlation_id
+
+
+class SlowStream:
+    def __init__(self, latency: float):
+        self._latency = latency
+        self._target = open(os.devnull, "w")
+
+    def write(self, text: str):
+        if self._latency:
+            time.sleep(self._latency)
+        self._target.write(text)
+
+    def flush(self):
+        self._target.flush()
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sessions/")
+    async def sessions(user_id: str):
+        logger.info(f"Fetching sessions for user: {user_id}")
+        logger.info(f"Cache miss for user {user_id}")
+        logger.info(f"Fetched 20 session(s) for user {user_id}")
+        return []
+
+    app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+def _configure(mode: str, stream: SlowStream):
+    logger.remove()
+    if mode == "sync":
+        logger.add(stream, format="{time} {level} {message}", level="INFO")
+        return None
+    if mode == "queued":
+        sink = QueuedJSONSink(stream)
+        logger.configure(patcher=_add_correlation_id)
+        logger.add(sink, format="{message}", level="INFO")
+        return sink
+    return None
+
+
+async def bench_requests(client: httpx.AsyncClient, total: int) -> float:
+    start = time.perf_counter()
+    for _ in range(total):
+        await client.get("/sessions/", params={"user_id": "u1"})
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, rounds: int, latency: float):
+    stream = SlowStream(latency)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://bench")
+    modes = ("off", "sync", "queued")
+    best = dict.fromkeys(modes, 0.0)
+
+    # Interleaved rounds, best of each, to keep machine noise out of the diff
+    for round_number in range(rounds + 1):
+        for mode in modes:
+            sink = _configure(mode, stream)
+            rate = await bench_requests(client, total // rounds if round_number else 200)
+            logger.remove()
+            if sink is not None:
+                sink.stop()
+            if round_number:  # round 0 is warm-up
+                best[mode] = max(best[mode], rate)
+    await client.aclose()
+
+    for mode in modes:
+        print(f"logging {mode:<7}: {best[mode]:8.0f} req/s")
+    for mode in ("sync", "queued"):
+        cost = (1 / best[mode] - 1 / best["off"]) * 1e6
+        print(f"{mode:<7} cost   : {cost:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--write-latency-us", type=float, default=50.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds, args.write_latency_us / 1e6))
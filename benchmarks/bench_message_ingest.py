@@ -0,0 +1,71 @@
+"""Compare messages/sec of the single-insert path against POST /messages/batch.
+
+Requires a reachable database from DATABASE_URL with tables created
+(``python scripts/init_db.py``). Usage::
+
+    python benchmarks/bench_message_ingest.py --messages 2000 --batch-size 500
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.append(".")
+
+from app.db.session import AsyncSessionLocal
+from app.schemas.message import ChatMessageCreate
+from app.schemas.session import ChatSessionCreate
+from app.services.message_service import add_messages, add_messages_bulk
+from app.services.session_service import create_chat_session, delete_chat_session
+
+
+def _payload(session_id, i):
+    return {
+        "session_id": str(session_id),
+        "sender": "user" if i % 2 == 0 else "assistant",
+        "content": f"benchmark message {i} " + "lorem ipsum " * 20,
+    }
+
+
+async def bench_single(session_id, count: int) -> float:
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            await add_messages(db, ChatMessageCreate(**_payload(session_id, i)))
+    return count / (time.perf_counter() - start)
+
+
+async def bench_bulk(session_id, count: int, batch_size: int) -> float:
+    items = [_payload(session_id, i) for i in range(count)]
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        for offset in range(0, count, batch_size):
+            await add_messages_bulk(db, items[offset : offset + batch_size])
+    return count / (time.perf_counter() - start)
+
+
+async def main(count: int, batch_size: int):
+    async with AsyncSessionLocal() as db:
+        session = await create_chat_session(
+            db, ChatSessionCreate(user_id="bench-ingest", title="ingest benchmark")
+        )
+
+    try:
+        single = await bench_single(session.id, count)
+        bulk = await bench_bulk(session.id, count, batch_size)
+    finally:
+        async with AsyncSessionLocal() as db:
+            await delete_chat_session(db, session_id=session.id)
+
+    print(f"single insert : {single:10.1f} msg/s")
+    print(f"bulk (x{batch_size:<4}) : {bulk:10.1f} msg/s")
+    print(f"speedup       : {bulk / single:10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.batch_size))
@@ -0,0 +1,145 @@
+"""Compare the middleware stack before and after the move to raw ASGI.
+
+"before" wraps the app in the old BaseHTTPMiddleware exception handler,
+"after" in the raw ASGI GlobalExceptionMiddleware; both also carry the
+metrics and request-context middleware, as in app.main. Requests go
+through httpx's ASGI transport against ``/health`` and
+``GET /messages/session/{id}``, whose database session is replaced by a
+canned 20-message page. Settings must load (API_KEY, DATABASE_URL) but no
+database is used::
+
+    python benchmarks/bench_middleware.py --requests 5000
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+sys.path.append(".")
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from loguru import logger
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.api.routes import register_routes
+from app.core.config import settings
+from app.core.correlation import RequestContextMiddleware
+from app.core.exception_handler import GlobalExceptionMiddleware
+from app.core.metrics import MetricsMiddleware
+from app.db.models import ChatMessage
+from app.db.session import get_read_db
+
+
+class LegacyGlobalExceptionMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this change replaced."""
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception as exc:
+            logger.exception(f"Unhandled exception: {exc}")
+            return JSONResponse(status_code=500, content={"detail": "Internal server error"})
+
+
+class CannedResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class CannedSession:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def execute(self, query):
+        return CannedResult(self._rows)
+
+
+def _messages(session_id, count: int = 20):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        ChatMessage(
+            id=uuid4(),
+            session_id=session_id,
+            sender="user" if index % 2 else "assistant",
+            content=f"Message {index} " * 20,
+            created_at=start + timedelta(seconds=index),
+        )
+        for index in range(count)
+    ]
+
+
+def _app(legacy: bool, session_id) -> FastAPI:
+    app = FastAPI()
+    register_routes(app)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    rows = _messages(session_id)
+
+    async def canned_db():
+        yield CannedSession(rows)
+
+    app.dependency_overrides[get_read_db] = canned_db
+    app.add_middleware(LegacyGlobalExceptionMiddleware if legacy else GlobalExceptionMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+async def bench_requests(client: httpx.AsyncClient, path: str, total: int) -> float:
+    start = time.perf_counter()
+    for _ in range(total):
+        response = await client.get(path)
+    response.raise_for_status()
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, rounds: int):
+    logger.remove()  # Measure the middleware, not the log sink
+    session_id = uuid4()
+    clients = {
+        stack: httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=_app(stack == "before", session_id)),
+            base_url="http://bench",
+            headers={"X-API-Key": settings.API_KEY},
+        )
+        for stack in ("before", "after")
+    }
+
+    for path in ("/health", f"/messages/session/{session_id}"):
+        best = dict.fromkeys(clients, 0.0)
+        for client in clients.values():
+            await bench_requests(client, path, 200)  # warm-up
+        # Interleaved rounds, best of each, to keep machine noise out of the diff
+        for _ in range(rounds):
+            for stack, client in clients.items():
+                best[stack] = max(best[stack], await bench_requests(client, path, total // rounds))
+
+        label = path if path == "/health" else "/messages/session/{id}"
+        for stack, rate in best.items():
+            print(f"{label:<24} {stack:<6}: {rate:8.0f} req/s")
+        print(f"{label:<24} saved : {(1 / best['before'] - 1 / best['after']) * 1e6:8.1f} us/request")
+
+    for client in clients.values():
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
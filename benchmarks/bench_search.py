@@ -0,0 +1,109 @@
+"""Seeded full-text search benchmark.
+
+Seeds --users users sharing --messages messages (COPY through the import
+service) drawn from one Zipf-like vocabulary, so common terms occur in
+every user's messages as they do in production. It then reports GET
+/search service latency percentiles for one of those users, for a mix of
+common and rare terms; the common ones are where a search that filters
+by user after matching the term degrades with the number of users.
+Requires a reachable database from DATABASE_URL with
+tables created (``python scripts/init_db.py``)::
+
+    python benchmarks/bench_search.py --messages 1000000 --users 100
+"""
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+from uuid import uuid4
+
+sys.path.append(".")
+
+from sqlalchemy import delete
+
+from app.db.models import ChatSession
+from app.db.session import AsyncSessionLocal
+from app.services.import_service import import_records
+from app.services.search_service import search_messages
+
+USER_PREFIX = "bench-search-"
+VOCABULARY = [f"term{i}" for i in range(5000)]
+# term1 appears in nearly every message of every user, term4999 in very few
+QUERIES = ["term1", "term2 term3", "term10 OR term11", "term500", "term4999", '"term1 term2"']
+
+
+def _sentence(rng: random.Random) -> str:
+    # Zipf-like: low-numbered terms are common, high-numbered ones rare
+    words = [VOCABULARY[min(int(rng.paretovariate(1.0)) - 1, 4999)] for _ in range(30)]
+    return " ".join(words)
+
+
+def _user_id(i: int) -> str:
+    return f"{USER_PREFIX}{i}"
+
+
+async def _records(total: int, sessions: int, users: int, rng: random.Random):
+    session_ids = [str(uuid4()) for _ in range(sessions)]
+    for i, session_id in enumerate(session_ids):
+        yield "session", {
+            "id": session_id,
+            "user_id": _user_id(i % users),
+            "title": f"session {i}",
+        }
+    for i in range(total):
+        yield "message", {
+            "id": str(uuid4()),
+            "session_id": session_ids[i % sessions],
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "content": _sentence(rng),
+        }
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def main(total: int, sessions: int, users: int, repeat: int, keep: bool):
+    rng = random.Random(42)
+    sessions = max(sessions, users)
+    report = await import_records(
+        _records(total, sessions, users, rng), job_id=f"bench-search-{uuid4()}"
+    )
+    print(
+        f"seeded {report['messages_imported']} messages of {users} user(s) "
+        f"at {report['rows_per_second']} rows/s; searching as {_user_id(0)}"
+    )
+
+    try:
+        async with AsyncSessionLocal() as db:
+            for q in QUERIES:
+                latencies = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    page = await search_messages(db, user_id=_user_id(0), q=q, limit=20)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                print(
+                    f"{q!r:<22} hits/page {len(page['hits']):3d}   "
+                    f"p50 {_percentile(latencies, 50):7.2f} ms   "
+                    f"p95 {_percentile(latencies, 95):7.2f} ms   "
+                    f"p99 {_percentile(latencies, 99):7.2f} ms"
+                )
+    finally:
+        if not keep:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(ChatSession).where(ChatSession.user_id.startswith(USER_PREFIX)))
+                await db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.sessions, args.users, args.repeat, args.keep))
@@ -0,0 +1,126 @@
+"""Compare list serialization before and after the fast path.
+
+"before" returns 100 ORM ChatMessage objects through
+``response_model=List[ChatMessageOut]`` (Pydantic validation plus the
+stdlib JSON encoder); "after" is the real ``GET /messages/session/{id}``
+route, which turns column rows into dicts and encodes them with orjson.
+The database is replaced by canned rows, so the numbers cover only the
+serialization side (ORM entity construction in the driver layer is saved
+on top of this). Settings must load (API_KEY, DATABASE_URL)::
+
+    python benchmarks/bench_serialization.py --requests 3000
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import List
+from uuid import uuid4
+
+sys.path.append(".")
+
+import httpx
+from fastapi import FastAPI
+from loguru import logger
+
+from app.api.routes import register_routes
+from app.core.config import settings
+from app.db.models import ChatMessage
+from app.db.session import get_read_db
+from app.schemas.message import ChatMessageOut
+
+PAGE_SIZE = 100
+
+Row = namedtuple("Row", "id session_id sender content created_at")
+
+
+class CannedResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class CannedSession:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def execute(self, query):
+        return CannedResult(self._rows)
+
+
+def _app(session_id) -> FastAPI:
+    app = FastAPI()
+    register_routes(app)
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    values = [
+        dict(
+            id=uuid4(),
+            session_id=session_id,
+            sender="user" if index % 2 else "assistant",
+            content=f"Message {index} " * 20,
+            created_at=start + timedelta(seconds=index),
+        )
+        for index in range(PAGE_SIZE + 1)
+    ]
+    orm_messages = [ChatMessage(**value) for value in values[:PAGE_SIZE]]
+    rows = [Row(**value) for value in values]
+
+    @app.get("/before/{session_id}", response_model=List[ChatMessageOut])
+    async def before(session_id: str):
+        return orm_messages
+
+    async def canned_db():
+        yield CannedSession(rows)
+
+    app.dependency_overrides[get_read_db] = canned_db
+    return app
+
+
+async def bench_requests(client: httpx.AsyncClient, path: str, total: int) -> float:
+    start = time.perf_counter()
+    for _ in range(total):
+        response = await client.get(path)
+    response.raise_for_status()
+    assert len(response.json()) == PAGE_SIZE
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, rounds: int):
+    logger.remove()  # Measure serialization, not the log sink
+    session_id = uuid4()
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=_app(session_id)),
+        base_url="http://bench",
+        headers={"X-API-Key": settings.API_KEY},
+    )
+    paths = {
+        "before": f"/before/{session_id}",
+        "after": f"/messages/session/{session_id}?limit={PAGE_SIZE}",
+    }
+
+    best = dict.fromkeys(paths, 0.0)
+    for path in paths.values():
+        await bench_requests(client, path, 50)  # warm-up
+    # Interleaved rounds, best of each, to keep machine noise out of the diff
+    for _ in range(rounds):
+        for name, path in paths.items():
+            best[name] = max(best[name], await bench_requests(client, path, total // rounds))
+    await client.aclose()
+
+    for name, rate in best.items():
+        print(f"{PAGE_SIZE}-message page {name:<6}: {rate:8.0f} req/s")
+    print(f"speed-up                 : {best['after'] / best['before']:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -0,0 +1,115 @@
+"""In-memory embedding similarity benchmark.
+
+Builds the index of one user with --embeddings random vectors straight from
+float32 blobs (as they are read from chat_messages), then reports top-k
+latency percentiles for batches of query embeddings, scored the way
+``POST /search/similar`` does. No database is needed; settings must load
+(API_KEY, DATABASE_URL)::
+
+    python benchmarks/bench_similarity.py --embeddings 100000 --dimensions 384
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from uuid import uuid4
+
+sys.path.append(".")
+
+import numpy as np
+
+from app.core.embeddings import normalize
+from app.services.embedding_index import EmbeddingIndex, EmbeddingRow
+
+USER_ID = "bench-similarity"
+BATCH_SIZES = (1, 8, 32)
+
+
+def _rows(total: int, dimensions: int, sessions: int, rng: np.random.Generator):
+    session_ids = [uuid4() for _ in range(sessions)]
+    created = datetime.now(timezone.utc)
+    vectors = rng.standard_normal((total, dimensions), dtype=np.float32)
+    return [
+        EmbeddingRow(uuid4(), session_ids[i % sessions], created, vectors[i].tobytes())
+        for i in range(total)
+    ]
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class _Rows:
+    """Stands in for the session factory: hands the seeded rows to the load."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+async def main(total: int, dimensions: int, sessions: int, k: int, repeat: int):
+    rng = np.random.default_rng(42)
+    index = EmbeddingIndex(
+        _Rows(_rows(total, dimensions, sessions, rng)),
+        dimensions=dimensions,
+        max_bytes=1 << 40,
+        refresh_seconds=float("inf"),
+    )
+
+    start = time.perf_counter()
+    vectors = await index.get(USER_ID)
+    print(
+        f"indexed {vectors.size} embeddings x {dimensions} dims "
+        f"({vectors.nbytes / 1e6:.0f} MB) in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+    for batch in BATCH_SIZES:
+        queries = rng.standard_normal((batch, dimensions), dtype=np.float32)
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await index.search(USER_ID, queries, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(
+            f"batch {batch:3d}   "
+            f"p50 {_percentile(latencies, 50):7.2f} ms   "
+            f"p95 {_percentile(latencies, 95):7.2f} ms   "
+            f"p99 {_percentile(latencies, 99):7.2f} ms   "
+            f"{batch * 1000 / _percentile(latencies, 50):8.0f} queries/s"
+        )
+
+    # One query at a time in plain Python-side loops, for reference
+    query = normalize(rng.standard_normal((1, dimensions), dtype=np.float32))[0]
+    start = time.perf_counter()
+    matrix = vectors.matrix[: vectors.size]
+    scores = [float(np.dot(row, query)) for row in matrix[: min(10_000, vectors.size)]]
+    elapsed = (time.perf_counter() - start) * vectors.size / len(scores)
+    print(f"per-row loop (extrapolated) {elapsed * 1000:8.2f} ms per query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--embeddings", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.embeddings, args.dimensions, args.sessions, args.k, args.repeat))
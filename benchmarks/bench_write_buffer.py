@@ -0,0 +1,76 @@
+"""Concurrency benchmark: per-request commits vs the group-commit write buffer.
+
+Requires a reachable database from DATABASE_URL with tables created
+(``python scripts/init_db.py``). Usage::
+
+    python benchmarks/bench_write_buffer.py --concurrency 200 --messages 5000
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.append(".")
+
+from app.db.session import AsyncSessionLocal
+from app.schemas.message import ChatMessageCreate
+from app.schemas.session import ChatSessionCreate
+from app.services.message_service import add_messages
+from app.services.session_service import create_chat_session, delete_chat_session
+from app.services.write_buffer import MessageWriteBuffer
+
+
+async def _direct(message: ChatMessageCreate):
+    async with AsyncSessionLocal() as db:
+        await add_messages(db, message)
+
+
+async def run(label: str, insert, session_id, total: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        message = ChatMessageCreate(
+            session_id=session_id, sender="user", content=f"{label} message {i}"
+        )
+        async with semaphore:
+            start = time.perf_counter()
+            await insert(message)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<14} {total / elapsed:10.1f} msg/s   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+async def main(total: int, concurrency: int, window_ms: float, max_batch: int):
+    async with AsyncSessionLocal() as db:
+        session = await create_chat_session(
+            db, ChatSessionCreate(user_id="bench-buffer", title="write buffer benchmark")
+        )
+
+    buffer = MessageWriteBuffer(AsyncSessionLocal, window_ms=window_ms, max_batch=max_batch)
+    try:
+        await run("direct", _direct, session.id, total, concurrency)
+        await run("group-commit", buffer.submit, session.id, total, concurrency)
+    finally:
+        await buffer.drain()
+        async with AsyncSessionLocal() as db:
+            await delete_chat_session(db, session_id=session.id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.concurrency, args.window_ms, args.max_batch))
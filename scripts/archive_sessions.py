@@ -0,0 +1,39 @@
+"""Archive sessions that have had no messages for a while.
+
+Examples::
+
+    python scripts/archive_sessions.py
+    python scripts/archive_sessions.py --after-days 30 --batch-size 500
+
+Meant to run periodically (e.g. nightly from cron); archived sessions stay
+readable and are restored on their next write. Every shard is archived in
+turn and reported by name.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+
+sys.path.append(".")
+
+from app.core.config import settings
+from app.db.session import shard_router
+from app.services.archive_service import archive_cold_sessions
+
+
+async def archive_all_shards(after_days: int, batch_size: int) -> dict:
+    return {
+        name: await archive_cold_sessions(shard.session_factory, after_days, batch_size)
+        for name, shard in shard_router.shards.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--after-days", type=int, default=settings.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    report = asyncio.run(archive_all_shards(args.after_days, args.batch_size))
+    print(json.dumps(report, indent=2))
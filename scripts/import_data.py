@@ -0,0 +1,60 @@
+"""Bulk import sessions and messages with COPY.
+
+Examples::
+
+    python scripts/import_data.py --job-id restore-1 export.ndjson
+    python scripts/import_data.py --job-id legacy --sessions sessions.csv --messages messages.csv
+
+Re-running with the same --job-id resumes after the last committed chunk.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+
+sys.path.append(".")
+
+from fastapi import HTTPException
+
+from app.services.import_service import (
+    import_records,
+    ndjson_records,
+    csv_records,
+    iterate_lines,
+    IMPORT_CHUNK_SIZE,
+)
+
+
+async def _records(args):
+    if args.ndjson:
+        with open(args.ndjson, encoding="utf-8") as f:
+            async for record in ndjson_records(iterate_lines(f)):
+                yield record
+    if args.sessions:
+        with open(args.sessions, encoding="utf-8", newline="") as f:
+            async for record in csv_records("session", iterate_lines(f)):
+                yield record
+    if args.messages:
+        with open(args.messages, encoding="utf-8", newline="") as f:
+            async for record in csv_records("message", iterate_lines(f)):
+                yield record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("ndjson", nargs="?", help="NDJSON file as written by /export")
+    parser.add_argument("--sessions", help="CSV of sessions (imported first)")
+    parser.add_argument("--messages", help="CSV of messages")
+    parser.add_argument("--job-id", required=True, help="Checkpoint key used to resume")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not (args.ndjson or args.sessions or args.messages):
+        parser.error("Nothing to import")
+
+    try:
+        report = asyncio.run(import_records(_records(args), args.job_id, args.chunk_size))
+    except HTTPException as e:
+        sys.exit(e.detail)
+    print(json.dumps(report, indent=2))
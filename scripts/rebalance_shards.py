@@ -0,0 +1,63 @@
+"""Move users between shards after changing SHARD_RING, without downtime.
+
+Examples::
+
+    python scripts/rebalance_shards.py status
+    python scripts/rebalance_shards.py pin --ring main,shard1,shard2
+    python scripts/rebalance_shards.py move
+    python scripts/rebalance_shards.py prune
+
+To change the ring: run ``pin`` with the new ring while the API still runs
+the old one, deploy the new SHARD_RING (with every shard, old and new, in
+DATABASE_SHARD_URLS), then run ``move``. Writes of the users of a slot are
+refused with 503 for as long as that slot is being copied. ``move`` can be
+re-run after an interruption; ``prune`` then deletes leftovers on sources.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+
+sys.path.append(".")
+
+from app.core.config import settings
+from app.services.shard_rebalance import (
+    pin_moving_slots,
+    prune_strays,
+    rebalance,
+    shard_status,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Slots per shard and slots pinned or moving")
+    pin = commands.add_parser("pin", help="Pin the slots a new ring would move")
+    pin.add_argument("--ring", required=True, help="Comma-separated shard names")
+    move = commands.add_parser("move", help="Move pinned slots to their ring shard")
+    move.add_argument("--batch-size", type=int, default=settings.SHARD_MOVE_BATCH_SIZE)
+    move.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=None,
+        help="Wait for workers to see a slot change (default: 2x the directory TTL)",
+    )
+    prune = commands.add_parser("prune", help="Delete slots left on the wrong shard")
+    prune.add_argument("--batch-size", type=int, default=settings.SHARD_MOVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        report = asyncio.run(shard_status())
+    elif args.command == "pin":
+        ring = [name.strip() for name in args.ring.split(",") if name.strip()]
+        report = asyncio.run(pin_moving_slots(ring))
+    elif args.command == "move":
+        report = asyncio.run(
+            rebalance(batch_size=args.batch_size, settle_seconds=args.settle_seconds)
+        )
+    else:
+        report = asyncio.run(prune_strays(batch_size=args.batch_size))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,39 @@
+"""Recompute the message_count / last_message_at counters of every session.
+
+Examples::
+
+    python scripts/repair_session_activity.py
+    python scripts/repair_session_activity.py --batch-size 200
+
+Run once after upgrading to fill the counters of existing sessions, and
+afterwards whenever they may have drifted (e.g. after manual SQL). Safe to
+run while the API is serving traffic. Every shard is repaired in turn and
+reported by name.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+
+sys.path.append(".")
+
+from app.core.config import settings
+from app.db.session import shard_router
+from app.services.session_service import repair_session_activity
+
+
+async def repair_all_shards(batch_size: int) -> dict:
+    return {
+        name: await repair_session_activity(shard.session_factory, batch_size)
+        for name, shard in shard_router.shards.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=settings.ACTIVITY_REPAIR_BATCH_SIZE)
+    args = parser.parse_args()
+
+    report = asyncio.run(repair_all_shards(args.batch_size))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,38 @@
+from app.core.cache import LRUTTLCache, MISS
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUTTLCache(max_entries=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        cache.set(key, key.upper(), cache.begin(key))
+
+    cache.get("a")
+    cache.set("c", "C", cache.begin("c"))
+
+    assert cache.get("b") is MISS
+    assert cache.get("a") == "A"
+    assert cache.stats.evictions == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now[0])
+    cache = LRUTTLCache(max_entries=10, ttl_seconds=5)
+    cache.set("a", 1, cache.begin("a"))
+
+    now[0] += 6
+
+    assert cache.get("a") is MISS
+    assert cache.stats.expirations == 1
+
+
+def test_set_is_rejected_after_invalidation_even_when_forgotten():
+    cache = LRUTTLCache(max_entries=1, ttl_seconds=60)
+    token = cache.begin("a")
+    cache.invalidate("a")
+    cache.invalidate("b")  # pushes the record for "a" out of the bounded log
+
+    cache.set("a", "stale", token)
+
+    assert cache.get("a") is MISS
+    assert cache.stats.hits == 0
@@ -0,0 +1,28 @@
+from app.core import context_codec
+from app.core.context_codec import pack_context, unpack_context
+
+
+def test_small_context_stays_json(monkeypatch):
+    monkeypatch.setattr(context_codec.settings, "CONTEXT_COMPRESSION_THRESHOLD", 1024)
+
+    packed = pack_context({"chunks": ["short"]})
+
+    assert packed == {"context": {"chunks": ["short"]}, "context_zlib": None}
+
+
+def test_large_context_round_trips_compressed(monkeypatch):
+    monkeypatch.setattr(context_codec.settings, "CONTEXT_COMPRESSION_THRESHOLD", 1024)
+    context = {"chunks": [{"text": "retrieved passage " * 50, "score": 0.9}] * 10}
+
+    packed = pack_context(context)
+
+    assert packed["context"] is None
+    assert len(packed["context_zlib"]) < 1024
+    assert unpack_context(packed["context"], packed["context_zlib"]) == context
+
+
+def test_compression_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(context_codec.settings, "CONTEXT_COMPRESSION_THRESHOLD", 0)
+    context = {"chunks": ["x" * 100_000]}
+
+    assert pack_context(context) == {"context": context, "context_zlib": None}
@@ -0,0 +1,60 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.exception_handler import GlobalExceptionMiddleware
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for index in range(3):
+                yield f"chunk-{index}\n"
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    @app.get("/broken-stream")
+    async def broken_stream():
+        async def body():
+            yield "first\n"
+            raise RuntimeError("mid-stream")
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    app.add_middleware(GlobalExceptionMiddleware)
+    return app
+
+
+def test_unhandled_error_becomes_json_500():
+    client = TestClient(_app(), raise_server_exceptions=False)
+
+    response = client.get("/boom")
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Internal server error"}
+
+
+def test_streaming_response_passes_through():
+    client = TestClient(_app())
+
+    with client.stream("GET", "/stream") as response:
+        lines = list(response.iter_lines())
+
+    assert response.status_code == 200
+    assert lines == ["chunk-0", "chunk-1", "chunk-2"]
+
+
+def test_error_after_response_start_is_reraised():
+    client = TestClient(_app())
+
+    # Starlette may wrap it in an ExceptionGroup from the streaming task group
+    with pytest.raises(Exception):
+        client.get("/broken-stream")
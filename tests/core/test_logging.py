@@ -0,0 +1,83 @@
+import io
+import json
+
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app.core.correlation import correlation_id
+from app.core.logging import QueuedJSONSink, _add_correlation_id, sample_filter
+
+
+def _capture(sample_rate=1.0, level="INFO"):
+    stream = io.StringIO()
+    sink = QueuedJSONSink(stream, flush_interval=0.01)
+    logger.remove()
+    logger.configure(patcher=_add_correlation_id)
+    logger.add(sink, format="{message}", level=level, filter=sample_filter(sample_rate))
+    return sink, stream
+
+
+def _lines(sink, stream):
+    logger.remove()
+    sink.stop()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_with_correlation_id():
+    sink, stream = _capture()
+    token = correlation_id.set("req-1")
+    try:
+        logger.info("Fetching sessions for user: u1")
+    finally:
+        correlation_id.reset(token)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+
+    info, error = _lines(sink, stream)
+
+    assert info["message"] == "Fetching sessions for user: u1"
+    assert info["level"] == "INFO"
+    assert info["request_id"] == "req-1"
+    assert error["request_id"] is None
+    assert "ValueError: boom" in error["exception"]
+
+
+def test_sampling_keeps_warnings_and_whole_requests():
+    sink, stream = _capture(sample_rate=0.5)
+    for index in range(200):
+        token = correlation_id.set(f"req-{index}")
+        try:
+            logger.info("first")
+            logger.info("second")
+            logger.warning("always")
+        finally:
+            correlation_id.reset(token)
+
+    records = _lines(sink, stream)
+
+    info_ids = [r["request_id"] for r in records if r["level"] == "INFO"]
+    assert sum(r["level"] == "WARNING" for r in records) == 200
+    assert 50 < len(set(info_ids)) < 150
+    assert all(info_ids.count(request_id) == 2 for request_id in set(info_ids))
+
+
+def test_level_is_honoured():
+    sink, stream = _capture(level="WARNING")
+    logger.info("dropped")
+    logger.error("kept")
+
+    assert [r["message"] for r in _lines(sink, stream)] == ["kept"]
+
+
+def test_request_id_is_echoed_or_generated():
+    from app.main import app
+
+    client = TestClient(app)
+    response = client.get("/health", headers={"X-Request-ID": "lb-42"})
+
+    assert response.headers["x-request-id"] == "lb-42"
+    assert response.headers["server-timing"].startswith("app;dur=")
+    generated = client.get("/health", headers={"X-Request-ID": "bad id!"}).headers["x-request-id"]
+    assert len(generated) == 32
@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+
+from app.core.metrics import Counter, Histogram, Registry, http_responses
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(
+        Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    )
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5.0, "/a")
+
+    text = registry.render()
+
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert "# TYPE latency_seconds histogram" in text
+
+
+def test_counter_escapes_label_values():
+    registry = Registry()
+    counter = registry.register(Counter("events_total", "Events.", ("name",)))
+    counter.inc('say "hi"\n')
+
+    assert 'events_total{name="say \\"hi\\"\\n"} 1.0' in registry.render()
+
+
+def test_metrics_endpoint_reports_route_templates():
+    from app.main import app
+
+    client = TestClient(app)
+    before = http_responses.value("GET", "/health", "200")
+    client.get("/health")
+    client.get("/no/such/path")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert http_responses.value("GET", "/health", "200") == before + 1
+    assert 'http_responses_total{method="GET",route="unmatched",status="404"}' in response.text
+    assert "db_pool_checked_out" in response.text
+    assert "session_list_cache_events_total" in response.text
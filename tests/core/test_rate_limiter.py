@@ -0,0 +1,100 @@
+import multiprocessing
+from unittest.mock import patch
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+from starlette.requests import Request
+
+from app.core import rate_limit_storage
+from app.core.rate_limit_storage import SharedMemoryStorage
+from app.core.rate_limiter import rate_limit_key
+
+WORKERS = 4
+ATTEMPTS_PER_WORKER = 60
+LIMIT = "100/hour"
+
+
+def _hammer(uri: str) -> int:
+    """Run in a separate process: try to consume the shared limit."""
+    limiter = SlidingWindowCounterRateLimiter(SharedMemoryStorage(uri, slots=1024))
+    item = parse(LIMIT)
+    return sum(limiter.hit(item, "key:abc", "user:u1") for _ in range(ATTEMPTS_PER_WORKER))
+
+
+def _request(headers=None, query=b"", path_params=None) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/sessions/",
+            "headers": headers or [],
+            "query_string": query,
+            "path_params": path_params or {},
+            "client": ("10.0.0.1", 1234),
+        }
+    )
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"shm://{tmp_path / 'rate-limits'}"
+
+
+def test_limit_holds_across_processes(uri):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(WORKERS) as pool:
+        allowed = pool.map(_hammer, [uri] * WORKERS)
+
+    # Per-process counters would have let every attempt through
+    assert sum(allowed) == 100
+
+
+def test_storage_is_registered_for_shm_scheme(uri):
+    assert isinstance(storage_from_string(uri), SharedMemoryStorage)
+
+
+def test_sliding_window_weights_previous_window(uri):
+    storage = SharedMemoryStorage(uri, slots=64)
+    with patch.object(rate_limit_storage.time, "time", return_value=1000.0):
+        assert all(storage.acquire_sliding_window_entry("k", 10, 60) for _ in range(10))
+        assert not storage.acquire_sliding_window_entry("k", 10, 60)
+
+    # Half-way through the next window, half of the old hits still count
+    with patch.object(rate_limit_storage.time, "time", return_value=1050.0):
+        acquired = sum(storage.acquire_sliding_window_entry("k", 10, 60) for _ in range(10))
+        previous, _, current, _ = storage.get_sliding_window("k", 60)
+
+    assert acquired == 5
+    assert (previous, current) == (10, 5)
+
+
+def test_fixed_window_counters_expire(uri):
+    storage = SharedMemoryStorage(uri, slots=64)
+    with patch.object(rate_limit_storage.time, "time", return_value=1200.0):
+        assert storage.incr("k", 60) == 1
+        assert storage.incr("k", 60, amount=2) == 3
+        assert storage.get("k") == 3
+        assert storage.get_expiry("k") == 1260.0
+    with patch.object(rate_limit_storage.time, "time", return_value=1260.0):
+        assert storage.get("k") == 0
+
+    storage.clear("k")
+    assert storage.reset() == 0
+
+
+def test_full_probe_range_evicts_instead_of_failing(uri):
+    storage = SharedMemoryStorage(uri, slots=1)
+    for index in range(rate_limit_storage.PROBE_SLOTS * 2):
+        assert storage.incr(f"key-{index}", 60) == 1
+
+
+def test_rate_limit_key_uses_api_key_and_user():
+    request = _request(headers=[(b"x-api-key", b"secret")], query=b"user_id=u1")
+
+    key = rate_limit_key(request)
+
+    assert key.startswith("key:") and key.endswith(":user:u1")
+    assert "secret" not in key
+    assert rate_limit_key(_request(path_params={"user_id": "u2"})) == "ip:10.0.0.1"
@@ -0,0 +1,23 @@
+import json
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from app.core.responses import FastJSONResponse
+from app.schemas.message import ChatMessageOut
+
+
+def test_fast_response_matches_pydantic_json():
+    message = {
+        "id": uuid4(),
+        "session_id": uuid4(),
+        "sender": "assistant",
+        "content": "Answer",
+        "context": {"chunks": [{"text": "passage", "score": 0.5}]},
+        "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        "streaming": False,
+    }
+
+    body = FastJSONResponse([message]).body
+
+    expected = ChatMessageOut.model_validate(message).model_dump_json()
+    assert json.loads(body) == [json.loads(expected)]
@@ -0,0 +1,134 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from app.db import init_db
+from app.db.base import Base
+
+# What create_all made of these tables as first released
+RELEASED_COLUMNS = {
+    "chat_sessions": {"id", "user_id", "title", "is_favorite", "created_at", "updatedAt"},
+    "chat_messages": {"id", "session_id", "sender", "content", "context", "created_at"},
+    "chat_session_archives": {
+        "session_id", "messages_zlib", "message_count", "last_message_at", "archived_at"
+    },
+}
+RELEASED_INDEXES = {"ix_chat_sessions_id", "ix_chat_sessions_user_id"}
+
+
+def _conn(key=None, orphans=False, missing=()):
+    """A connection whose chat_messages has primary key ``(name, columns)``.
+
+    ``missing`` are the (table, column) pairs the database lacks.
+    """
+
+    def execute(statement, params=None):
+        if str(statement) == init_db.COLUMN_MISSING:
+            missed = (params["table"], params["column"]) in missing
+            return MagicMock(scalar=MagicMock(return_value=missed))
+        return results.get(str(statement), MagicMock())
+
+    results = {
+        init_db.MESSAGE_PRIMARY_KEY: MagicMock(
+            first=MagicMock(
+                return_value=key and SimpleNamespace(conname=key[0], columns=key[1])
+            )
+        ),
+        init_db.MESSAGES_WITHOUT_SESSION: MagicMock(scalar=MagicMock(return_value=orphans)),
+    }
+    conn = AsyncMock()
+    conn.execute.side_effect = execute
+    return conn
+
+
+def _executed(conn):
+    return [str(call.args[0]) for call in conn.execute.await_args_list]
+
+
+def _upgrades():
+    return [" ".join(statement.split()) for statement in init_db.SCHEMA_UPGRADES]
+
+
+def test_upgrades_add_every_column_added_since_release():
+    upgrades = _upgrades()
+
+    for table, released in RELEASED_COLUMNS.items():
+        for column in Base.metadata.tables[table].columns:
+            if column.name not in released:
+                assert any(
+                    sql.startswith(f"ALTER TABLE {table} ")
+                    and f"ADD COLUMN IF NOT EXISTS {column.name} " in sql
+                    for sql in upgrades
+                ), column.name
+
+
+def test_upgrades_create_every_index_added_since_release():
+    upgrades = _upgrades()
+
+    for table in RELEASED_COLUMNS:
+        for index in Base.metadata.tables[table].indexes:
+            if index.name not in RELEASED_INDEXES:
+                assert any(
+                    f"INDEX IF NOT EXISTS {index.name} ON {table} " in sql for sql in upgrades
+                ), index.name
+
+
+@pytest.mark.asyncio
+async def test_upgrade_runs_every_statement_in_order():
+    conn = _conn(key=("chat_messages_pkey", 2))
+
+    await init_db._upgrade_schema(conn)
+
+    executed = _executed(conn)
+    assert executed[:3] == [init_db.COLUMN_MISSING] * 2 + [init_db.MESSAGE_PRIMARY_KEY]
+    assert executed[3:] == list(init_db.SCHEMA_UPGRADES)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "missing", [(), (init_db.ACTIVITY_COUNTERS,), (init_db.ARCHIVED_MESSAGE_IDS,)]
+)
+async def test_added_columns_are_backfilled_only_when_added(monkeypatch, missing):
+    conn = _conn(key=("chat_messages_pkey", 2), missing=missing)
+    begin = MagicMock()
+    begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    shard = SimpleNamespace(
+        name="main", engine=SimpleNamespace(begin=begin), session_factory=MagicMock()
+    )
+    repair = AsyncMock(return_value={})
+    index = AsyncMock(return_value={})
+    monkeypatch.setattr(init_db, "repair_session_activity", repair)
+    monkeypatch.setattr(init_db, "index_archived_messages", index)
+    monkeypatch.setattr(init_db.settings, "MESSAGE_PARTITIONS", 0)
+
+    await init_db._init_shard(shard)
+
+    conn.run_sync.assert_awaited_once_with(init_db.Base.metadata.create_all)
+    backfills = ((repair, init_db.ACTIVITY_COUNTERS), (index, init_db.ARCHIVED_MESSAGE_IDS))
+    for backfill, column in backfills:
+        if column in missing:
+            backfill.assert_awaited_once_with(shard.session_factory)
+        else:
+            backfill.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_primary_key_on_id_alone_is_widened():
+    conn = _conn(key=("chat_messages_pkey", 1))
+
+    await init_db._widen_message_key(conn)
+
+    assert _executed(conn)[-1] == (
+        'ALTER TABLE chat_messages DROP CONSTRAINT "chat_messages_pkey", '
+        "ADD PRIMARY KEY (id, session_id)"
+    )
+
+
+@pytest.mark.asyncio
+async def test_primary_key_stays_while_messages_lack_a_session():
+    conn = _conn(key=("chat_messages_pkey", 1), orphans=True)
+
+    await init_db._widen_message_key(conn)
+
+    assert _executed(conn) == [init_db.MESSAGE_PRIMARY_KEY, init_db.MESSAGES_WITHOUT_SESSION]
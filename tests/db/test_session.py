@@ -0,0 +1,60 @@
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import MagicMock
+
+from app.db import session as db_session
+from app.db.session import ReplicaHealth
+
+
+class FakeEngine:
+    def __init__(self, lag=0.0, error=None):
+        self.lag = lag
+        self.error = error
+        self.probes = 0
+
+    @asynccontextmanager
+    async def connect(self):
+        self.probes += 1
+        if self.error:
+            raise self.error
+        conn = MagicMock()
+
+        async def execute(query):
+            result = MagicMock()
+            result.scalar.return_value = self.lag
+            return result
+
+        conn.execute = execute
+        yield conn
+
+
+@pytest.mark.asyncio
+async def test_replica_probe_is_cached_between_intervals():
+    engine = FakeEngine(lag=0.5)
+    health = ReplicaHealth(engine, max_lag=5, interval=60)
+
+    assert await health.is_usable() is True
+    assert await health.is_usable() is True
+    assert engine.probes == 1
+
+
+@pytest.mark.asyncio
+async def test_lagging_or_unreachable_replica_falls_back():
+    lagging = ReplicaHealth(FakeEngine(lag=30), max_lag=5, interval=0)
+    down = ReplicaHealth(FakeEngine(error=OSError("refused")), max_lag=5, interval=0)
+    missing = ReplicaHealth(None, max_lag=5, interval=0)
+
+    assert await lagging.is_usable() is False
+    assert await down.is_usable() is False
+    assert await missing.is_usable() is False
+
+
+def test_pgbouncer_mode_disables_statement_caches(monkeypatch):
+    monkeypatch.setattr(db_session.settings, "DB_PGBOUNCER_MODE", True)
+
+    connect_args = db_session.engine_options()["connect_args"]
+
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    name_func = connect_args["prepared_statement_name_func"]
+    assert name_func() != name_func()
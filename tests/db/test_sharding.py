@@ -0,0 +1,142 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from app.db.sharding import (
+    SLOTS,
+    HashRing,
+    Shard,
+    ShardRouter,
+    id_slot,
+    new_shard_id,
+    user_slot,
+)
+
+
+def _shard(name):
+    """A shard whose legacy ID lookups find nothing until told otherwise."""
+    db = AsyncMock()
+    db.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return Shard(name, f"postgresql+asyncpg://db-{name}/rag_chat", None, factory, factory)
+
+
+def _user_on(router, name):
+    return next(
+        f"user-{n}" for n in range(1000) if router.ring_shard(user_slot(f"user-{n}")) == name
+    )
+
+
+def _router(*shards, overrides=None):
+    router = ShardRouter(list(shards), directory_ttl=60)
+    router.read_directory = AsyncMock(return_value=overrides or {})
+    return router
+
+
+def test_adding_a_shard_only_moves_slots_onto_it():
+    before = HashRing(["main", "shard1"]).placement()
+    after = HashRing(["main", "shard1", "shard2"]).placement()
+
+    moved = [slot for slot in range(SLOTS) if before[slot] != after[slot]]
+
+    assert all(after[slot] == "shard2" for slot in moved)
+    # Roughly a third of the slots, give or take the vnode spread
+    assert SLOTS * 0.2 < len(moved) < SLOTS * 0.45
+
+
+def test_shard_ids_carry_their_slot():
+    slot = user_slot("user-1")
+    entity_id = new_shard_id(slot)
+
+    assert entity_id.version == 8
+    assert id_slot(entity_id) == slot
+    assert new_shard_id(slot) != entity_id
+    assert id_slot(uuid4()) is None
+
+
+@pytest.mark.asyncio
+async def test_single_shard_never_reads_the_directory():
+    router = _router(_shard("main"))
+
+    assert await router.shard_for_user("user-1", write=True) is router.main
+    assert await router.shard_for_id(uuid4()) is router.main
+    router.read_directory.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_users_follow_the_ring_unless_their_slot_is_pinned():
+    router = _router(_shard("main"), _shard("shard1"))
+    slot = user_slot("user-1")
+    placed = router.ring_shard(slot)
+    other = "main" if placed == "shard1" else "shard1"
+
+    assert (await router.shard_for_user("user-1")).name == placed
+    assert (await router.shard_for_id(new_shard_id(slot))).name == placed
+
+    router._directory_read_at = float("-inf")
+    router.read_directory.return_value = {slot: (other, False)}
+    assert (await router.shard_for_user("user-1", write=True)).name == other
+
+
+@pytest.mark.asyncio
+async def test_writes_to_a_moving_slot_are_refused():
+    slot = user_slot("user-1")
+    router = _router(_shard("main"), _shard("shard1"), overrides={slot: ("main", True)})
+
+    assert (await router.shard_for_user("user-1")).name == "main"
+    with pytest.raises(HTTPException) as exc:
+        await router.shard_for_user("user-1", write=True)
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
+
+
+@pytest.mark.asyncio
+async def test_legacy_ids_are_looked_up_once_across_shards():
+    main, shard1 = _shard("main"), _shard("shard1")
+    router = _router(main, shard1)
+    shard1_owner = shard1.read_session_factory.return_value.__aenter__.return_value
+    shard1_owner = shard1_owner.execute.return_value.scalar_one_or_none
+    shard1_owner.return_value = _user_on(router, "shard1")
+    legacy_id = uuid4()
+
+    assert (await router.shard_for_id(legacy_id)).name == "shard1"
+    assert (await router.shard_for_id(legacy_id)).name == "shard1"
+
+    assert shard1.read_session_factory.call_count == 1
+    assert main.read_session_factory.call_count == 1
+    # Unknown IDs fall back to the main shard (and its 404s)
+    shard1_owner.return_value = None
+    assert await router.shard_for_id(uuid4()) is router.main
+
+
+@pytest.mark.asyncio
+async def test_requests_route_by_path_then_query_then_body():
+    router = _router(_shard("main"), _shard("shard1"))
+    session_id = new_shard_id(user_slot("user-2"))
+
+    def request(path=None, query=None, body=None):
+        return SimpleNamespace(
+            path_params=path or {},
+            query_params=query or {},
+            headers={"content-type": "application/json"} if body else {},
+            json=AsyncMock(return_value=body),
+        )
+
+    by_path = await router.shard_for_request(request(path={"session_id": str(session_id)}))
+    by_query = await router.shard_for_request(request(query={"user_id": "user-2"}))
+    by_body = await router.shard_for_request(request(body={"session_id": str(session_id)}))
+    malformed = await router.shard_for_request(request(path={"session_id": "nope"}))
+
+    expected = router.ring_shard(user_slot("user-2"))
+    assert by_path.name == by_query.name == by_body.name == expected
+    assert malformed is router.main
+
+
+def test_ring_must_name_configured_shards():
+    with pytest.raises(ValueError):
+        ShardRouter([_shard("main")], ring=["main", "shard9"])
@@ -0,0 +1,152 @@
+import pytest
+import zlib
+import orjson
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from app.core.embeddings import pack_embedding
+from app.db.models import ChatSessionArchive
+from app.db.models.chat_message import senderEnum
+from app.services import archive_service, message_service
+from app.services.archive_service import pack_archive, unpack_archive
+
+CUTOFF = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def _message(created_at, context=None, embedding=None):
+    return SimpleNamespace(
+        id=uuid4(),
+        sender=senderEnum.user,
+        content="hello",
+        context=context,
+        context_zlib=None,
+        created_at=created_at,
+        token_count=2,
+        embedding=embedding,
+    )
+
+
+def _result(scalar=None, rows=()):
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = scalar
+    result.all.return_value = list(rows)
+    return result
+
+
+def test_archive_round_trips_messages():
+    session_id = uuid4()
+    rows = [
+        _message(CUTOFF - timedelta(days=2), context={"chunks": [1]}),
+        _message(CUTOFF - timedelta(days=1)),
+    ]
+
+    unpacked = unpack_archive(session_id, pack_archive(rows))
+
+    assert [m.id for m in unpacked] == [row.id for row in rows]
+    assert [m.created_at for m in unpacked] == [row.created_at for row in rows]
+    assert unpacked[0].session_id == session_id
+    assert unpacked[0].sender == "user"
+    assert unpacked[0].context == {"chunks": [1]}
+    assert unpacked[1].context is None
+
+
+def test_archive_keeps_embeddings_and_reads_older_archives():
+    session_id = uuid4()
+    row = _message(CUTOFF, embedding=pack_embedding([0.5, -1.0]))
+
+    (unpacked,) = unpack_archive(session_id, pack_archive([row]))
+    assert unpacked.embedding == row.embedding
+
+    legacy = zlib.compress(orjson.dumps([[row.id, "user", "hi", None, CUTOFF, 1]]))
+    (unpacked,) = unpack_archive(session_id, legacy)
+    assert unpacked.embedding is None
+
+
+@pytest.mark.asyncio
+async def test_archive_session_packs_and_deletes_messages():
+    db = AsyncMock()
+    db.add = MagicMock()
+    session_id = uuid4()
+    rows = [_message(CUTOFF - timedelta(days=3)), _message(CUTOFF - timedelta(days=2))]
+    db.execute.side_effect = [_result(scalar=session_id), _result(rows=rows), None, None]
+
+    archived = await archive_service.archive_session(db, session_id, CUTOFF)
+
+    assert archived == 2
+    archive = db.add.call_args.args[0]
+    assert isinstance(archive, ChatSessionArchive)
+    assert archive.message_count == 2
+    assert archive.last_message_at == rows[-1].created_at
+    assert archive.message_ids == [row.id for row in rows]
+    assert len(unpack_archive(session_id, archive.messages_zlib)) == 2
+    assert db.execute.call_count == 4  # lock, read, delete messages, mark archived
+    db.commit.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_archive_session_skips_session_written_since_selection():
+    db = AsyncMock()
+    db.add = MagicMock()
+    session_id = uuid4()
+    rows = [_message(CUTOFF - timedelta(days=3)), _message(CUTOFF + timedelta(hours=1))]
+    db.execute.side_effect = [_result(scalar=session_id), _result(rows=rows)]
+
+    assert await archive_service.archive_session(db, session_id, CUTOFF) == 0
+
+    db.add.assert_not_called()
+    db.commit.assert_not_called()
+    db.rollback.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_archive_cold_sessions_walks_candidates_in_batches(monkeypatch):
+    ids = sorted(uuid4() for _ in range(3))
+    db = AsyncMock()
+    candidates = MagicMock()
+    candidates.scalars.return_value.all.side_effect = [ids[:2], ids[2:]]
+    db.execute.return_value = candidates
+
+    class Factory:
+        async def __aenter__(self):
+            return db
+
+        async def __aexit__(self, *exc):
+            return False
+
+    archived = []
+
+    async def archive_session(db, session_id, cutoff):
+        archived.append(session_id)
+        return 0 if session_id == ids[1] else 5
+
+    monkeypatch.setattr(archive_service, "archive_session", archive_session)
+
+    report = await archive_service.archive_cold_sessions(
+        session_factory=Factory, after_days=30, batch_size=2
+    )
+
+    assert archived == ids
+    assert report["sessions_archived"] == 2
+    assert report["messages_archived"] == 10
+    assert db.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_message_context_is_read_from_an_archive():
+    session_id = uuid4()
+    rows = [_message(CUTOFF, context={"chunks": [1]}), _message(CUTOFF, context={"chunks": [2]})]
+    archive = MagicMock()
+    archive.one_or_none.return_value = SimpleNamespace(
+        session_id=session_id, messages_zlib=pack_archive(rows)
+    )
+    live = MagicMock()
+    live.one_or_none.return_value = None
+    db = AsyncMock()
+    db.execute.side_effect = [live, archive]
+
+    result = await message_service.get_message_context(db, rows[1].id)
+
+    assert result == {"message_id": rows[1].id, "context": {"chunks": [2]}}
+    assert "message_ids @>" in str(db.execute.call_args.args[0])
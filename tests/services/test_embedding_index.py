@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import numpy as np
+
+from app.core.embeddings import pack_embedding
+from app.services.embedding_index import EmbeddingIndex, EmbeddingRow, UserVectors
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _row(vector, seconds=0):
+    return EmbeddingRow(uuid4(), uuid4(), START + timedelta(seconds=seconds), pack_embedding(vector))
+
+
+def _session_factory(*reads):
+    db = AsyncMock()
+    results = []
+    for rows in reads:
+        result = MagicMock()
+        result.all.return_value = rows
+        results.append(result)
+    db.execute.side_effect = results
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory, db
+
+
+def test_top_k_ranks_by_cosine_similarity():
+    vectors = UserVectors(dimensions=2)
+    rows = [_row([1, 0]), _row([0, 5]), _row([1, 1]), _row([-1, 0])]
+    vectors.extend(rows)
+
+    positions, scores = vectors.top_k(np.array([[0, 1], [1, 0]], dtype=np.float32), k=2)
+
+    assert positions.tolist() == [[1, 2], [0, 2]]
+    assert scores[0][0] == pytest.approx(1.0)
+    assert scores[1][1] == pytest.approx(np.sqrt(0.5))
+
+
+def test_extend_skips_known_and_mismatched_rows():
+    vectors = UserVectors(dimensions=2)
+    row = _row([1, 0])
+
+    assert vectors.extend([row, row, _row([1, 0, 0])]) == 1
+    assert vectors.extend([row]) == 0
+    assert vectors.size == 1
+
+
+def test_top_k_returns_everything_when_k_exceeds_rows():
+    vectors = UserVectors(dimensions=2)
+    vectors.extend([_row([1, 0]), _row([0, 1])])
+
+    positions, _ = vectors.top_k(np.array([[0, 1]], dtype=np.float32), k=10)
+
+    assert positions.tolist() == [[1, 0]]
+
+
+@pytest.mark.asyncio
+async def test_forget_swaps_in_an_index_without_the_messages():
+    rows = [_row([1, 0]), _row([0, 1]), _row([1, 1])]
+    factory, _ = _session_factory(rows)
+    index = EmbeddingIndex(factory, dimensions=2, max_bytes=1 << 20, refresh_seconds=3600)
+    before = await index.get("u1")
+
+    index.forget("u1", {rows[1].id})
+
+    after = await index.get("u1")
+    assert after is not before and before.size == 3
+    assert after.message_ids == [rows[0].id, rows[2].id]
+    assert index.nbytes == after.nbytes
+    (hits,) = await index.search("u1", np.array([[0, 1]], dtype=np.float32), k=3)
+    assert [message_id for _, message_id, _ in hits] == [rows[2].id, rows[0].id]
+    # A forgotten message that comes back is indexed again
+    assert after.extend([rows[1]]) == 1
+
+
+@pytest.mark.asyncio
+async def test_index_loads_once_and_folds_in_added_rows():
+    first = _row([1, 0])
+    factory, db = _session_factory([first])
+    index = EmbeddingIndex(factory, dimensions=2, max_bytes=1 << 20, refresh_seconds=60)
+
+    await asyncio.gather(index.get("u1"), index.get("u1"))
+    added = _row([0, 1], seconds=1)
+    index.add("u1", [added])
+    index.add("u2", [_row([0, 1])])  # not loaded: read on its first search
+
+    (hits,) = await index.search("u1", np.array([[0, 1]], dtype=np.float32), k=1)
+    assert db.execute.call_count == 1
+    assert hits[0][1] == added.id
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_index_is_evicted_over_budget():
+    factory, _ = _session_factory([_row([1, 0])], [_row([0, 1])], [_row([1, 0])])
+    index = EmbeddingIndex(factory, dimensions=2, max_bytes=1, refresh_seconds=60)
+
+    await index.get("u1")
+    await index.get("u2")
+
+    assert list(index._users) == ["u2"]
+    assert index.nbytes == index._users["u2"].nbytes
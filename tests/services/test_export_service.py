@@ -0,0 +1,134 @@
+import json
+import tracemalloc
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+from app.services import export_service
+from app.services.archive_service import pack_archive
+from app.db.models.chat_message import senderEnum
+
+
+class FakeStreamResult:
+    def __init__(self, rows, chunk_size):
+        self._rows = rows
+        self._chunk_size = chunk_size
+
+    async def partitions(self):
+        chunk = []
+        for row in self._rows:
+            chunk.append(row)
+            if len(chunk) == self._chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream(self, query):
+        return FakeStreamResult(self._rows, export_service.EXPORT_CHUNK_SIZE)
+
+
+def _synthetic_rows(session_ids, messages_per_session):
+    # Generated lazily, like rows arriving from a server-side cursor
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for session_id in session_ids:
+        session = (session_id, "user1", "title", False, created)
+        if not messages_per_session:
+            yield session + (None,) * (len(export_service.MESSAGE_FIELDS) + 2)
+        for i in range(messages_per_session):
+            yield session + (
+                uuid4(),
+                session_id,
+                senderEnum.user if i % 2 == 0 else senderEnum.assistant,
+                f"message {i} " + "x" * 200,
+                {"chunks": ["doc"]},
+                created,
+                None,  # context_zlib
+                None,  # archive blob
+            )
+
+
+@pytest.mark.asyncio
+async def test_user_export_groups_messages_under_sessions():
+    first, empty = uuid4(), uuid4()
+    rows = list(_synthetic_rows([first], 2)) + list(_synthetic_rows([empty], 0))
+
+    chunks = [
+        chunk
+        async for chunk in export_service.stream_user_export(
+            "user1", session_factory=lambda: FakeSession(rows)
+        )
+    ]
+    records = [json.loads(line) for line in "".join(chunks).splitlines()]
+
+    assert [r["type"] for r in records] == ["session", "message", "message", "session"]
+    assert records[0]["id"] == str(first)
+    assert records[1]["sender"] == "user"
+    assert records[2]["sender"] == "assistant"
+    assert records[3]["id"] == str(empty)
+
+
+@pytest.mark.asyncio
+async def test_archived_session_is_exported_from_its_blob():
+    session_id = uuid4()
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    archived = SimpleNamespace(
+        id=uuid4(), sender="user", content="old", context={"chunks": ["doc"]},
+        context_zlib=None, created_at=created, token_count=1, embedding=None,
+    )
+    row = (session_id, "user1", "title", False, created)
+    row += (None,) * (len(export_service.MESSAGE_FIELDS) + 1) + (pack_archive([archived]),)
+
+    chunks = [
+        chunk
+        async for chunk in export_service.stream_session_export(
+            session_id, session_factory=lambda: FakeSession([row])
+        )
+    ]
+    records = [json.loads(line) for line in "".join(chunks).splitlines()]
+
+    assert [r["type"] for r in records] == ["session", "message"]
+    assert records[1]["id"] == str(archived.id)
+    assert records[1]["session_id"] == str(session_id)
+    assert records[1]["context"] == {"chunks": ["doc"]}
+    assert records[1]["created_at"] == created.isoformat()
+
+
+async def _export_peak_memory(total):
+    session_id = uuid4()
+    rows = _synthetic_rows([session_id], total)
+
+    tracemalloc.start()
+    try:
+        exported = 0
+        async for chunk in export_service.stream_session_export(
+            session_id, session_factory=lambda: FakeSession(rows)
+        ):
+            exported += chunk.count('"type":"message"')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert exported == total
+    return peak
+
+
+@pytest.mark.asyncio
+async def test_large_session_export_has_bounded_memory():
+    small = await _export_peak_memory(2_000)
+    large = await _export_peak_memory(20_000)
+
+    # Ten times the messages (~5 MB of NDJSON) must not grow the peak
+    assert large < small * 1.5
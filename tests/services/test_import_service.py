@@ -0,0 +1,242 @@
+import json
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from app.services import import_service
+from app.services.archive_service import pack_archive
+
+
+class FakeConnection:
+    """Stands in for the asyncpg connection behind the SQLAlchemy engine."""
+
+    def __init__(self, checkpoint=None, fail_on_chunk=None, archives=None):
+        self.checkpoint = checkpoint
+        self.archives = archives or {}
+        self.copied = []
+        self.saved = []
+        self.executed = []
+        self.fail_on_chunk = fail_on_chunk
+        self._staged = {}
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetchrow(self, query, *args):
+        return self.checkpoint
+
+    async def fetch(self, query, *args):
+        if query is import_service.LOCK_STAGED_SESSIONS:
+            return [{"id": session_id, "archived": True} for session_id in self.archives]
+        if query is import_service.TAKE_ARCHIVES:
+            return [
+                {"session_id": session_id, "messages_zlib": self.archives.pop(session_id)}
+                for session_id in args[0]
+            ]
+        return []
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.fail_on_chunk is not None and len(self.saved) == self.fail_on_chunk:
+            raise RuntimeError("connection lost")
+        self.copied.append((table, list(records)))
+        self._staged[table] = self._staged.get(table, 0) + len(records)
+
+    async def execute(self, query, *args):
+        self.executed.append(query)
+        if query is import_service.SAVE_CHECKPOINT:
+            self.saved.append(args)
+            return "INSERT 0 1"
+        if query is import_service.MERGE_SESSIONS:
+            return f"INSERT 0 {self._staged.pop('import_sessions_staging')}"
+        if query is import_service.MERGE_MESSAGES:
+            return f"INSERT 0 {self._staged.pop('import_messages_staging')}"
+        return "CREATE TABLE"
+
+
+class FakeEngine:
+    def __init__(self, pg):
+        self.pg = pg
+
+    @asynccontextmanager
+    async def connect(self):
+        pg = self.pg
+
+        class Conn:
+            async def get_raw_connection(self):
+                return type("Raw", (), {"driver_connection": pg})()
+
+        yield Conn()
+
+
+def _export_lines(sessions=2, messages_per_session=2):
+    for _ in range(sessions):
+        session_id = str(uuid4())
+        yield json.dumps({"type": "session", "id": session_id, "user_id": "u1", "title": "t"})
+        for i in range(messages_per_session):
+            yield json.dumps(
+                {
+                    "type": "message",
+                    "id": str(uuid4()),
+                    "session_id": session_id,
+                    "sender": "user",
+                    "content": f"m{i}",
+                    "context": {"chunks": [i]},
+                }
+            )
+
+
+@pytest.mark.asyncio
+async def test_import_copies_in_checkpointed_chunks(monkeypatch):
+    pg = FakeConnection()
+    monkeypatch.setattr(import_service, "engine", FakeEngine(pg))
+    lines = list(_export_lines()) + ['{"type": "message", "id": "bad"}']
+
+    report = await import_service.import_records(
+        import_service.ndjson_records(import_service.iterate_lines(lines)),
+        job_id="job",
+        chunk_size=4,
+    )
+
+    assert report["sessions_imported"] == 2
+    assert report["messages_imported"] == 4
+    assert report["invalid"] == 1
+    assert [saved[1] for saved in pg.saved] == [4, 7]
+    message_rows = [row for table, rows in pg.copied if "messages" in table for row in rows]
+    assert json.loads(message_rows[0][4]) == {"chunks": [0]}
+    # Every message merge checks IDs under the import-wide lock
+    merges = [
+        i for i, query in enumerate(pg.executed) if query is import_service.MERGE_MESSAGES
+    ]
+    assert merges
+    assert all(pg.executed[i - 1] is import_service.LOCK_MESSAGE_MERGE for i in merges)
+
+
+@pytest.mark.asyncio
+async def test_import_resumes_after_committed_records(monkeypatch):
+    lines = list(_export_lines())
+    pg = FakeConnection(checkpoint=(4, 2, 2))
+    monkeypatch.setattr(import_service, "engine", FakeEngine(pg))
+
+    report = await import_service.import_records(
+        import_service.ndjson_records(import_service.iterate_lines(lines)),
+        job_id="job",
+        chunk_size=100,
+    )
+
+    assert report["resumed_from"] == 4
+    assert report["records_read"] == 2
+    assert report["sessions_imported"] == 2
+    assert report["messages_imported"] == 4
+    copied = [row for _, rows in pg.copied for row in rows]
+    assert len(copied) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_keeps_previous_checkpoint(monkeypatch):
+    pg = FakeConnection(fail_on_chunk=1)
+    monkeypatch.setattr(import_service, "engine", FakeEngine(pg))
+
+    with pytest.raises(RuntimeError):
+        await import_service.import_records(
+            import_service.ndjson_records(import_service.iterate_lines(_export_lines())),
+            job_id="job",
+            chunk_size=3,
+        )
+
+    assert [saved[1] for saved in pg.saved] == [3]
+
+
+@pytest.mark.asyncio
+async def test_import_rehydrates_archived_sessions(monkeypatch):
+    session_id = uuid4()
+    archived = SimpleNamespace(
+        id=uuid4(),
+        sender="user",
+        content="old",
+        context={"chunks": [9]},
+        context_zlib=None,
+        created_at=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        token_count=1,
+        embedding=None,
+    )
+    pg = FakeConnection(archives={session_id: pack_archive([archived])})
+    monkeypatch.setattr(import_service, "engine", FakeEngine(pg))
+    line = json.dumps(
+        {"type": "message", "id": str(uuid4()), "session_id": str(session_id),
+         "sender": "user", "content": "new"}
+    )
+
+    report = await import_service.import_records(
+        import_service.ndjson_records(import_service.iterate_lines([line])),
+        job_id="job",
+    )
+
+    assert report["messages_imported"] == 1
+    assert pg.archives == {}
+    restored = pg.copied[-1][1]
+    assert [(row[0], row[1], row[3]) for row in restored] == [(archived.id, session_id, "old")]
+    assert json.loads(restored[0][4]) == {"chunks": [9]}
+
+
+@pytest.mark.asyncio
+async def test_csv_records_handle_multiline_quoted_content():
+    lines = [
+        "id,session_id,sender,content\n",
+        'a,s,user,"first line\n',
+        'second ""quoted"" line"\n',
+    ]
+
+    records = [
+        record
+        async for record in import_service.csv_records(
+            "message", import_service.iterate_lines(lines)
+        )
+    ]
+
+    assert records == [
+        (
+            "message",
+            {
+                "id": "a",
+                "session_id": "s",
+                "sender": "user",
+                "content": 'first line\nsecond "quoted" line',
+            },
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_is_refused_while_data_is_sharded(monkeypatch):
+    pg = FakeConnection()
+    monkeypatch.setattr(import_service, "engine", FakeEngine(pg))
+
+    with pytest.raises(HTTPException) as e:
+        await import_service.import_records(
+            import_service.ndjson_records(import_service.iterate_lines(_export_lines())),
+            job_id="job",
+            router=SimpleNamespace(sharded=True),
+        )
+
+    assert e.value.status_code == 501
+    assert pg.copied == [] and pg.saved == []
+
+
+@pytest.mark.asyncio
+async def test_malformed_ndjson_lines_are_counted_as_invalid(monkeypatch):
+    pg = FakeConnection()
+    monkeypatch.setattr(import_service, "engine", FakeEngine(pg))
+    lines = list(_export_lines(sessions=1)) + ["{not json", "[1, 2]", '"text"']
+
+    report = await import_service.import_records(
+        import_service.ndjson_records(import_service.iterate_lines(lines)), job_id="job"
+    )
+
+    assert report["sessions_imported"] == 1
+    assert report["messages_imported"] == 2
+    assert report["invalid"] == 3
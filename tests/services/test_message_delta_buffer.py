@@ -0,0 +1,289 @@
+import asyncio
+import pytest
+from importlib import import_module
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.exc import DataError
+from uuid import uuid4
+
+from app.core.config import settings
+from app.schemas.message import ChatMessageDelta
+from app.services import message_service
+from app.services.message_delta_buffer import MessageDeltaBuffer, delta_runs
+
+
+def _session_factory(db):
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory
+
+
+def test_delta_runs_merge_contiguous_deltas():
+    message_id, session_id = uuid4(), uuid4()
+
+    runs = delta_runs(message_id, session_id, [(5, " world"), (0, "Hello"), (20, "!")])
+
+    assert [(run["start"], run["stop"], run["text"]) for run in runs] == [
+        (0, 11, "Hello world"),
+        (20, 21, "!"),
+    ]
+    assert all(run["message_session_id"] == session_id for run in runs)
+
+
+@pytest.mark.asyncio
+async def test_deltas_are_coalesced_into_one_flush():
+    flush_db = AsyncMock()
+    buffer = MessageDeltaBuffer(_session_factory(flush_db), window_ms=20, max_chars=1000)
+    message_id, session_id = uuid4(), uuid4()
+    buffer.track(message_id, session_id)
+
+    for offset, text in [(0, "Hel"), (3, "lo"), (5, "!")]:
+        pending = await buffer.append(AsyncMock(), message_id, offset, text)
+    assert pending == 6
+    flush_db.execute.assert_not_called()
+
+    await asyncio.sleep(0.05)
+
+    flush_db.execute.assert_called_once()
+    statement, params = flush_db.execute.call_args.args
+    assert statement is message_service.APPEND_DELTAS
+    assert [(run["start"], run["text"]) for run in params] == [(0, "Hello!")]
+    flush_db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_char_limit_flushes_before_window():
+    flush_db = AsyncMock()
+    buffer = MessageDeltaBuffer(_session_factory(flush_db), window_ms=10_000, max_chars=4)
+    message_id = uuid4()
+    buffer.track(message_id, uuid4())
+
+    await buffer.append(AsyncMock(), message_id, 0, "abcd")
+    await buffer.drain()
+
+    flush_db.execute.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_untracked_message_is_looked_up_once():
+    buffer = MessageDeltaBuffer(_session_factory(AsyncMock()), window_ms=10_000, max_chars=1000)
+    message_id, session_id = uuid4(), uuid4()
+    db = AsyncMock()
+    result = MagicMock()
+    result.one_or_none.return_value = SimpleNamespace(session_id=session_id, streaming=True, length=0)
+    db.execute.return_value = result
+
+    await buffer.append(db, message_id, 0, "a")
+    await buffer.append(db, message_id, 1, "b")
+
+    assert db.execute.call_count == 1
+    runs = await buffer.take(message_id)
+    assert [(run["message_session_id"], run["text"]) for run in runs] == [(session_id, "ab")]
+    assert await buffer.take(message_id) == []
+
+
+@pytest.mark.asyncio
+async def test_take_waits_for_a_flush_in_flight():
+    flush_db = AsyncMock()
+    written = []
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_execute(statement, params):
+        started.set()
+        await release.wait()
+        written.extend(params)
+
+    flush_db.execute.side_effect = slow_execute
+    buffer = MessageDeltaBuffer(_session_factory(flush_db), window_ms=10_000, max_chars=3)
+    message_id = uuid4()
+    buffer.track(message_id, uuid4())
+
+    await buffer.append(AsyncMock(), message_id, 0, "abc")  # starts a flush
+    await started.wait()
+    take = asyncio.ensure_future(buffer.take(message_id))
+    await asyncio.sleep(0.01)
+    assert not take.done()
+
+    release.set()
+    assert await take == []
+    assert [run["text"] for run in written] == ["abc"]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_its_runs():
+    flush_db = AsyncMock()
+    flush_db.execute.side_effect = OSError("connection reset")
+    buffer = MessageDeltaBuffer(_session_factory(flush_db), window_ms=10_000, max_chars=3)
+    message_id, session_id = uuid4(), uuid4()
+    buffer.track(message_id, session_id)
+
+    await buffer.append(AsyncMock(), message_id, 0, "abc")
+    await buffer.append(AsyncMock(), message_id, 3, "d")  # buffered meanwhile
+    runs = await buffer.take(message_id)
+
+    assert [(run["start"], run["text"]) for run in runs] == [(0, "abcd")]
+    assert all(run["message_session_id"] == session_id for run in runs)
+
+
+@pytest.mark.asyncio
+async def test_append_to_finished_message_conflicts():
+    buffer = MessageDeltaBuffer(_session_factory(AsyncMock()), window_ms=10_000, max_chars=1000)
+    db = AsyncMock()
+    result = MagicMock()
+    result.one_or_none.return_value = SimpleNamespace(session_id=uuid4(), streaming=False, length=0)
+    db.execute.return_value = result
+
+    with pytest.raises(HTTPException) as e:
+        await buffer.append(db, uuid4(), 0, "late")
+
+    assert e.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_finalize_writes_pending_runs_first():
+    db = AsyncMock()
+    message = SimpleNamespace(
+        id=uuid4(),
+        session_id=uuid4(),
+        sender="assistant",
+        content="Hello",
+        created_at=None,
+        streaming=False,
+    )
+    finalized = MagicMock()
+    finalized.scalar_one_or_none.return_value = message
+    db.execute.side_effect = [MagicMock(), finalized, MagicMock()]
+    pending = delta_runs(message.id, message.session_id, [(0, "Hello")])
+
+    result = await message_service.finalize_streaming_message(db, message.id, pending=pending)
+
+    assert result is message
+    assert db.execute.call_args_list[0].args == (message_service.APPEND_DELTAS, pending)
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_finalize_unknown_message_raises_404():
+    db = AsyncMock()
+    missing = MagicMock()
+    missing.one_or_none.return_value = None
+    db.execute.return_value = missing
+
+    with pytest.raises(HTTPException) as e:
+        await message_service.finalize_streaming_message(db, uuid4(), content="Done")
+
+    assert e.value.status_code == 404
+    db.rollback.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_finalize_updates_the_message_in_its_own_session():
+    db = AsyncMock()
+    message_id, session_id = uuid4(), uuid4()
+    lookup = MagicMock()
+    lookup.one_or_none.return_value = SimpleNamespace(session_id=session_id, streaming=True, length=0)
+    finalized = MagicMock()
+    finalized.scalar_one_or_none.return_value = SimpleNamespace(
+        id=message_id,
+        session_id=session_id,
+        sender="assistant",
+        content="Done",
+        created_at=None,
+        streaming=False,
+    )
+    db.execute.side_effect = [lookup, finalized, MagicMock()]
+
+    await message_service.finalize_streaming_message(db, message_id, content="Done")
+
+    update = db.execute.call_args_list[1].args[0]
+    assert update.compile().params["session_id_1"] == session_id
+
+
+def test_deltas_are_bounded_by_the_message_length_limit():
+    limit = settings.MESSAGE_STREAM_MAX_CHARS
+
+    assert ChatMessageDelta(offset=limit - 2, delta="ab").offset == limit - 2
+    with pytest.raises(ValidationError):
+        ChatMessageDelta(offset=2**31, delta="a")
+    with pytest.raises(ValidationError):
+        ChatMessageDelta(offset=limit - 1, delta="ab")
+
+
+@pytest.mark.asyncio
+async def test_delta_far_past_the_known_end_is_checked_against_the_stored_text():
+    buffer = MessageDeltaBuffer(
+        _session_factory(AsyncMock()), window_ms=10_000, max_chars=1000, max_gap=10
+    )
+    message_id, session_id = uuid4(), uuid4()
+    buffer.track(message_id, session_id)
+    db = AsyncMock()
+    stored = MagicMock()
+    stored.one_or_none.return_value = SimpleNamespace(
+        session_id=session_id, streaming=True, length=100
+    )
+    db.execute.return_value = stored
+
+    # Written through another worker already: accepted after one lookup
+    await buffer.append(db, message_id, 95, "a")
+    assert db.execute.call_count == 1
+
+    with pytest.raises(HTTPException) as e:
+        await buffer.append(db, message_id, 500, "b")
+    assert e.value.status_code == 422
+    runs = await buffer.take(message_id)
+    assert [(run["start"], run["text"]) for run in runs] == [(95, "a")]
+
+
+@pytest.mark.asyncio
+async def test_a_message_whose_runs_cannot_be_written_does_not_hold_up_others():
+    good, bad = uuid4(), uuid4()
+    written = []
+
+    async def execute(statement, params):
+        if any(run["message_id"] == bad for run in params):
+            raise DataError("UPDATE", params, Exception("value out of range"))
+        written.extend(run["text"] for run in params)
+
+    flush_db = AsyncMock()
+    flush_db.execute.side_effect = execute
+    buffer = MessageDeltaBuffer(
+        _session_factory(flush_db), window_ms=10_000, max_chars=1000, max_attempts=2
+    )
+    buffer.track(good, uuid4())
+    buffer.track(bad, uuid4())
+
+    await buffer.append(AsyncMock(), good, 0, "fine")
+    await buffer.append(AsyncMock(), bad, 0, "broken")
+    await buffer.drain()
+    assert written == ["fine"]
+    assert buffer._pending == {bad: [(0, "broken")]}  # retried once more
+
+    await buffer.drain()
+    assert buffer._pending == {}  # then dropped
+    assert written == ["fine"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status, kept", [(500, True), (404, False)])
+async def test_failed_finalize_puts_the_taken_runs_back(monkeypatch, status, kept):
+    routes = import_module("app.api.routes.chat_message")
+    buffer = MessageDeltaBuffer(_session_factory(AsyncMock()), window_ms=10_000, max_chars=1000)
+    message_id, session_id = uuid4(), uuid4()
+    buffer.track(message_id, session_id)
+    await buffer.append(AsyncMock(), message_id, 0, "Hello")
+    monkeypatch.setattr(routes, "message_delta_buffer", buffer)
+    monkeypatch.setattr(
+        routes,
+        "finalize_streaming_message",
+        AsyncMock(side_effect=HTTPException(status_code=status, detail="failed")),
+    )
+
+    with pytest.raises(HTTPException):
+        await routes.finalize_message(message_id, payload=None, db=AsyncMock())
+
+    runs = await buffer.take(message_id)
+    assert [(run["start"], run["text"]) for run in runs] == ([(0, "Hello")] if kept else [])
@@ -1,11 +1,27 @@
+import json
+import zlib
 import pytest
 from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
 from uuid import uuid4
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
 from app.services import message_service
 from app.db.models import ChatMessage
-from app.schemas.message import ChatMessageCreate
+from app.schemas.message import ChatMessageCreate, ChatMessageOut
+from app.core import context_codec
+from app.core.context_codec import unpack_context
+from app.core.pagination import encode_cursor, decode_cursor
+from app.services.archive_service import pack_archive
+from app.db.sharding import Shard, ShardRouter, id_slot, new_shard_id, user_slot
+
+
+@pytest.fixture(autouse=True)
+def clear_tail_cache():
+    message_service.message_tail_cache.clear()
+    yield
+    message_service.message_tail_cache.clear()
 
 
 @pytest.mark.asyncio
@@ -18,6 +34,7 @@ async def test_add_messages():
     db.add = AsyncMock()
     db.commit = AsyncMock()
     db.refresh = AsyncMock(side_effect=lambda x: setattr(x, "id", uuid4()))
+    db.execute.return_value = _rows_result([_locked(message_data.session_id)])
 
     result = await message_service.add_messages(db, message_data)
 
@@ -49,12 +66,9 @@ async def test_get_message_by_session():
         created_at=datetime.now(timezone.utc),
     )
 
-    # Mocking the chain: db.execute().scalars().all()
-    scalars_mock = MagicMock()
-    scalars_mock.all.return_value = [msg1, msg2]
-
+    # Mocking the chain: db.execute().all(); the rows only need the columns
     execute_mock = MagicMock()
-    execute_mock.scalars.return_value = scalars_mock
+    execute_mock.all.return_value = [msg1, msg2]
 
     db.execute.return_value = execute_mock
 
@@ -64,5 +78,522 @@ async def test_get_message_by_session():
 
     db.execute.assert_called_once()
     assert len(result) == 2
-    assert result[0].content == "Hi"
-    assert result[1].sender == "assistant"
+    assert result[0]["content"] == "Hi"
+    assert result[1]["sender"] == "assistant"
+    assert result[0]["context"] is None
+
+
+@pytest.mark.asyncio
+async def test_add_messages_bulk_reports_item_errors():
+    db = AsyncMock()
+    session_id = uuid4()
+    missing_session_id = uuid4()
+
+    db.execute.return_value = _rows_result([_locked(session_id)])
+
+    inserted = ChatMessage(id=uuid4(), session_id=session_id, sender="user", content="Hi")
+    inserted_mock = MagicMock()
+    inserted_mock.all.return_value = [inserted]
+    db.scalars.return_value = inserted_mock
+
+    result = await message_service.add_messages_bulk(
+        db,
+        [
+            {"session_id": str(session_id), "sender": "user", "content": "Hi"},
+            {"session_id": str(session_id), "sender": "robot", "content": "Hi"},
+            {"session_id": "not-a-uuid", "sender": "user", "content": "Hi"},
+            {"session_id": str(missing_session_id), "sender": "user", "content": "Hi"},
+        ],
+    )
+
+    db.scalars.assert_called_once()
+    rows = db.scalars.call_args.args[1]
+    assert len(rows) == 1
+    assert rows[0]["content"] == "Hi"
+    # New IDs route to the owner's shard slot
+    assert id_slot(rows[0]["id"]) == user_slot("user-1")
+    db.commit.assert_called_once()
+    assert result["created"] == [inserted]
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_add_messages_across_shards_commits_per_shard_in_item_order(monkeypatch):
+    factories = {name: MagicMock() for name in ("main", "shard1")}
+    for factory in factories.values():
+        factory.return_value.__aenter__ = AsyncMock(return_value=factory)
+        factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    router = ShardRouter([Shard(name, name, None, f, f) for name, f in factories.items()])
+    router.read_directory = AsyncMock(return_value={})
+
+    def session_on(name):
+        user = next(f"u{n}" for n in range(1000) if router.ring_shard(user_slot(f"u{n}")) == name)
+        return str(new_shard_id(user_slot(user)))
+
+    items = [
+        {"session_id": session_on("shard1"), "sender": "user", "content": "a"},
+        {"session_id": session_on("main"), "sender": "user", "content": "b"},
+        {"session_id": session_on("shard1"), "sender": "robot", "content": "c"},
+        {"session_id": "not-a-uuid", "sender": "user", "content": "d"},
+    ]
+
+    async def fake_bulk(db, group):
+        rejected = [
+            i for i, item in enumerate(group) if item["sender"] == "robot" or item["content"] == "d"
+        ]
+        return {
+            "created": [item["content"] for i, item in enumerate(group) if i not in rejected],
+            "errors": [{"index": i, "detail": "bad"} for i in rejected],
+        }
+
+    monkeypatch.setattr(message_service, "add_messages_bulk", AsyncMock(side_effect=fake_bulk))
+
+    result = await message_service.add_messages_across_shards(items, router)
+
+    assert result["created"] == ["a", "b"]
+    assert [error["index"] for error in result["errors"]] == [2, 3]
+    assert factories["shard1"].call_count == 1
+    assert factories["main"].call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_add_messages_bulk_rejects_oversized_batch():
+    db = AsyncMock()
+    items = [{}] * (message_service.MAX_BATCH_SIZE + 1)
+
+    with pytest.raises(HTTPException) as e:
+        await message_service.add_messages_bulk(db, items)
+
+    assert e.value.status_code == 400
+    db.execute.assert_not_called()
+
+
+def _page_result(messages):
+    execute_mock = MagicMock()
+    execute_mock.all.return_value = messages
+    return execute_mock
+
+
+@pytest.mark.asyncio
+async def test_get_message_page_forward_returns_next_cursor():
+    db = AsyncMock()
+    session_id = uuid4()
+    messages = [
+        ChatMessage(
+            id=uuid4(),
+            session_id=session_id,
+            sender="user",
+            content=f"m{i}",
+            created_at=datetime(2024, 1, 1, 0, 0, i, tzinfo=timezone.utc),
+        )
+        for i in range(3)
+    ]
+    db.execute.return_value = _page_result(messages)
+
+    page = await message_service.get_message_page(db, session_id, limit=2)
+
+    assert [m["content"] for m in page["messages"]] == ["m0", "m1"]
+    assert page["prev_cursor"] is None
+    assert decode_cursor(page["next_cursor"]) == (
+        messages[1].created_at,
+        messages[1].id,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_message_page_backward_is_chronological():
+    db = AsyncMock()
+    session_id = uuid4()
+    newest_first = [
+        ChatMessage(
+            id=uuid4(),
+            session_id=session_id,
+            sender="user",
+            content=f"m{i}",
+            created_at=datetime(2024, 1, 1, 0, 0, i, tzinfo=timezone.utc),
+        )
+        for i in (5, 4)
+    ]
+    db.execute.return_value = _page_result(newest_first)
+    before = encode_cursor(datetime(2024, 1, 1, 0, 0, 6, tzinfo=timezone.utc), uuid4())
+
+    page = await message_service.get_message_page(db, session_id, limit=2, before=before)
+
+    assert [m["content"] for m in page["messages"]] == ["m4", "m5"]
+    assert page["prev_cursor"] is None
+    assert page["next_cursor"] is not None
+
+
+@pytest.mark.asyncio
+async def test_get_message_page_rejects_bad_cursor():
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as e:
+        await message_service.get_message_page(db, uuid4(), after="garbage")
+
+    assert e.value.status_code == 400
+    db.execute.assert_not_called()
+
+
+def test_message_schemas_keep_context_structured():
+    message_data = ChatMessageCreate(
+        session_id=uuid4(), sender="user", content="Hi", context='{"chunks": [1, 2]}'
+    )
+    listed = ChatMessage(
+        id=uuid4(),
+        session_id=message_data.session_id,
+        sender="user",
+        content="Hi",
+        created_at=datetime.now(timezone.utc),
+    )
+
+    out = ChatMessageOut.model_validate(listed, from_attributes=True)
+
+    assert message_data.context == {"chunks": [1, 2]}
+    assert out.context is None  # deferred column was never loaded
+
+
+@pytest.mark.asyncio
+async def test_add_messages_stores_large_context_compressed(monkeypatch):
+    monkeypatch.setattr(context_codec.settings, "CONTEXT_COMPRESSION_THRESHOLD", 64)
+    db = AsyncMock()
+    db.add = MagicMock()
+    context = {"chunks": ["retrieved passage " * 20]}
+    message_data = ChatMessageCreate(
+        session_id=uuid4(), sender="user", content="Hi", context=context
+    )
+    db.execute.return_value = _rows_result([_locked(message_data.session_id)])
+
+    result = await message_service.add_messages(db, message_data)
+
+    stored = db.add.call_args.args[0]
+    assert stored.context_zlib is not None
+    assert unpack_context(None, stored.context_zlib) == context
+    assert result.context == context
+
+
+@pytest.mark.asyncio
+async def test_add_messages_bulk_echoes_compressed_context(monkeypatch):
+    monkeypatch.setattr(context_codec.settings, "CONTEXT_COMPRESSION_THRESHOLD", 64)
+    db = AsyncMock()
+    session_id = uuid4()
+    db.execute.return_value = _rows_result([_locked(session_id)])
+    inserted = MagicMock()
+    inserted.all.return_value = _inserted(session_id, [1, 1])
+    db.scalars.return_value = inserted
+    large = {"chunks": ["retrieved passage " * 20]}
+    items = [
+        {"session_id": str(session_id), "sender": "user", "content": "Hi", "context": context}
+        for context in (large, {"chunks": []})
+    ]
+
+    result = await message_service.add_messages_bulk(db, items)
+
+    rows = db.scalars.call_args.args[1]
+    assert rows[0]["context"] is None and rows[0]["context_zlib"] is not None
+    assert [message.context for message in result["created"]] == [large, {"chunks": []}]
+
+
+@pytest.mark.asyncio
+async def test_get_message_page_include_context_decompresses():
+    db = AsyncMock()
+    context = {"chunks": ["passage"]}
+    message = ChatMessage(
+        id=uuid4(),
+        session_id=uuid4(),
+        sender="assistant",
+        content="Answer",
+        context=None,
+        context_zlib=zlib.compress(json.dumps(context).encode()),
+        created_at=datetime.now(timezone.utc),
+    )
+    db.execute.return_value = _page_result([message])
+
+    page = await message_service.get_message_page(
+        db, message.session_id, include_context=True
+    )
+
+    assert page["messages"][0]["context"] == context
+
+
+@pytest.mark.asyncio
+async def test_get_message_context_not_found():
+    db = AsyncMock()
+    result = MagicMock()
+    result.one_or_none.return_value = None
+    db.execute.return_value = result
+
+    with pytest.raises(HTTPException) as e:
+        await message_service.get_message_context(db, uuid4())
+
+    assert e.value.status_code == 404
+
+
+def _rows(session_id, tokens):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            id=uuid4(),
+            session_id=session_id,
+            sender="user",
+            content=f"m{i}",
+            created_at=start + timedelta(seconds=i),
+            token_count=count,
+            streaming=False,
+            embedding=None,
+        )
+        for i, count in enumerate(tokens)
+    ]
+
+
+def _inserted(session_id, tokens):
+    """Messages as INSERT ... RETURNING hands them back."""
+    return [ChatMessage(**vars(row)) for row in _rows(session_id, tokens)]
+
+
+def _rows_result(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    return result
+
+
+def _stamp_result(rows):
+    """The session row read before trusting a cached tail of ``rows``."""
+    result = MagicMock()
+    result.one_or_none.return_value = (len(rows), max((r.created_at for r in rows), default=None))
+    return result
+
+
+def _locked(session_id, archived_at=None):
+    """A row of the session lock taken before inserting messages."""
+    return SimpleNamespace(id=session_id, user_id="user-1", archived_at=archived_at)
+
+
+def _archive_result(session_id, rows):
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = pack_archive(rows)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_get_message_window_fits_budget_from_tail_cache():
+    db = AsyncMock()
+    session_id = uuid4()
+    oldest_first = _rows(session_id, [40, 30, 20, 10])
+    db.execute.side_effect = [
+        _stamp_result(oldest_first),
+        _rows_result(oldest_first[::-1]),
+        _stamp_result(oldest_first),
+    ]
+
+    first = await message_service.get_message_window(db, session_id, max_tokens=65)
+    second = await message_service.get_message_window(db, session_id, max_tokens=65)
+
+    assert db.execute.call_count == 3  # the tail is read once, its stamp each time
+    assert [m["content"] for m in first["messages"]] == ["m1", "m2", "m3"]
+    assert first["total_tokens"] == 60
+    assert second == first
+
+
+@pytest.mark.asyncio
+async def test_add_messages_updates_cached_tail():
+    db = AsyncMock()
+    db.add = MagicMock()
+    session_id = uuid4()
+    rows = _rows(session_id, [10])
+    added_at = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    db.execute.side_effect = [
+        _stamp_result(rows),
+        _rows_result(rows[::-1]),
+        _rows_result([_locked(session_id)]),
+        MagicMock(),  # session activity counters
+        _stamp_result([*rows, SimpleNamespace(created_at=added_at)]),
+    ]
+    await message_service.get_message_window(db, session_id, max_tokens=100)
+
+    def refresh(message):
+        message.id = uuid4()
+        message.created_at = added_at
+
+    db.refresh.side_effect = refresh
+    await message_service.add_messages(
+        db, ChatMessageCreate(session_id=session_id, sender="assistant", content="x" * 40)
+    )
+    window = await message_service.get_message_window(db, session_id, max_tokens=100)
+
+    # tail load, the write's lock and counters, then only the stamp
+    assert db.execute.call_count == 5
+    assert [m["content"] for m in window["messages"]] == ["m0", "x" * 40]
+    assert window["total_tokens"] == 20
+
+
+@pytest.mark.asyncio
+async def test_get_message_window_beyond_tail_queries_db(monkeypatch):
+    monkeypatch.setattr(message_service.settings, "MESSAGE_TAIL_SIZE", 2)
+    db = AsyncMock()
+    session_id = uuid4()
+    rows = _rows(session_id, [5, 5, 5, 5])
+    db.execute.side_effect = [_stamp_result(rows), _rows_result(rows[:0:-1]), _rows_result(rows)]
+
+    window = await message_service.get_message_window(db, session_id, max_tokens=100)
+
+    assert db.execute.call_count == 3
+    assert [m["content"] for m in window["messages"]] == ["m0", "m1", "m2", "m3"]
+    assert window["total_tokens"] == 20
+
+
+@pytest.mark.asyncio
+async def test_get_message_window_reloads_tail_changed_by_another_worker():
+    db = AsyncMock()
+    session_id = uuid4()
+    rows = _rows(session_id, [10, 10])
+    db.execute.side_effect = [
+        _stamp_result(rows[:1]),
+        _rows_result(rows[:1]),
+        # The second message was written through another worker
+        _stamp_result(rows),
+        _rows_result(rows[::-1]),
+    ]
+
+    first = await message_service.get_message_window(db, session_id, max_tokens=100)
+    second = await message_service.get_message_window(db, session_id, max_tokens=100)
+
+    assert [m["content"] for m in first["messages"]] == ["m0"]
+    assert [m["content"] for m in second["messages"]] == ["m0", "m1"]
+
+
+@pytest.mark.asyncio
+async def test_get_message_window_rejects_bad_limits():
+    with pytest.raises(HTTPException) as e:
+        await message_service.get_message_window(AsyncMock(), uuid4(), max_tokens=0)
+
+    assert e.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_message_by_session_reads_archived_session():
+    db = AsyncMock()
+    session_id = uuid4()
+    archived = _rows(session_id, [1, 1, 1])
+    for row in archived:
+        row.context, row.context_zlib = {"chunks": [row.content]}, None
+    db.execute.side_effect = [_rows_result([]), _archive_result(session_id, archived)]
+
+    result = await message_service.get_message_by_session(
+        db, session_id, limit=2, offset=1, include_context=True
+    )
+
+    assert [m["content"] for m in result] == ["m1", "m2"]
+    assert result[0]["context"] == {"chunks": ["m1"]}
+    assert result[0]["id"] == archived[1].id
+
+
+@pytest.mark.asyncio
+async def test_get_message_page_reads_archived_session_past_cursor():
+    db = AsyncMock()
+    session_id = uuid4()
+    archived = _rows(session_id, [1, 1, 1, 1])
+    for row in archived:
+        row.context = row.context_zlib = None
+    db.execute.side_effect = [_rows_result([]), _archive_result(session_id, archived)]
+
+    page = await message_service.get_message_page(
+        db,
+        session_id,
+        limit=2,
+        before=encode_cursor(archived[3].created_at, archived[3].id),
+    )
+
+    assert [m["content"] for m in page["messages"]] == ["m1", "m2"]
+    assert decode_cursor(page["prev_cursor"]) == (archived[1].created_at, archived[1].id)
+    assert page["next_cursor"] is not None
+
+
+@pytest.mark.asyncio
+async def test_add_messages_rehydrates_archived_session():
+    db = AsyncMock()
+    db.add = MagicMock()
+    session_id = uuid4()
+    archived = _rows(session_id, [1, 1])
+    for row in archived:
+        row.context = row.context_zlib = None
+    db.execute.side_effect = [
+        _rows_result([_locked(session_id, archived_at=datetime.now(timezone.utc))]),
+        _archive_result(session_id, archived),  # DELETE ... RETURNING the blob
+        MagicMock(),  # INSERT of the restored rows
+        MagicMock(),  # UPDATE clearing archived_at
+        MagicMock(),  # session activity counters
+    ]
+
+    await message_service.add_messages(
+        db, ChatMessageCreate(session_id=session_id, sender="user", content="back")
+    )
+
+    restored = db.execute.call_args_list[2].args[1]
+    assert [(row["id"], row["content"]) for row in restored] == [
+        (archived[0].id, "m0"), (archived[1].id, "m1")
+    ]
+    db.add.assert_called_once()
+    db.commit.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_add_messages_bulk_notifies_live_streams(monkeypatch):
+    monkeypatch.setattr(message_service.settings, "MESSAGE_NOTIFY_ENABLED", True)
+    db = AsyncMock()
+    session_id = uuid4()
+    db.execute.return_value = _rows_result([_locked(session_id)])
+    short, long = _inserted(session_id, [1, 1])
+    long.content = "x" * (message_service.MAX_NOTIFY_PAYLOAD + 1)
+    inserted = MagicMock()
+    inserted.all.return_value = [short, long]
+    db.scalars.return_value = inserted
+
+    await message_service.add_messages_bulk(
+        db, [{"session_id": str(session_id), "sender": "user", "content": "Hi"}] * 2
+    )
+
+    statement, params = db.execute.call_args_list[-1].args
+    assert statement is message_service.PUBLISH_MESSAGES
+    assert params["channel"] == message_service.MESSAGE_CHANNEL
+    first, second = (json.loads(payload) for payload in params["payloads"])
+    assert first["content"] == "m0" and first["id"] == str(short.id)
+    # Too large for NOTIFY: announced without content for the listener to fetch
+    assert second["truncated"] is True and "content" not in second
+
+
+@pytest.mark.asyncio
+async def test_add_messages_skips_notify_when_disabled(monkeypatch):
+    monkeypatch.setattr(message_service.settings, "MESSAGE_NOTIFY_ENABLED", False)
+    db = AsyncMock()
+    db.add = MagicMock()
+    session_id = uuid4()
+    db.execute.return_value = _rows_result([_locked(session_id)])
+
+    await message_service.add_messages(
+        db, ChatMessageCreate(session_id=session_id, sender="user", content="Hi")
+    )
+
+    assert db.execute.call_count == 2  # only the session lock and counters
+
+
+@pytest.mark.asyncio
+async def test_add_messages_bulk_bumps_session_activity_once_per_session():
+    db = AsyncMock()
+    first, second = uuid4(), uuid4()
+    db.execute.return_value = _rows_result([_locked(first), _locked(second)])
+    rows = _inserted(first, [1, 1]) + _inserted(second, [1])
+    inserted = MagicMock()
+    inserted.all.return_value = rows
+    db.scalars.return_value = inserted
+
+    await message_service.add_messages_bulk(
+        db,
+        [{"session_id": str(row.session_id), "sender": "user", "content": "Hi"} for row in rows],
+    )
+
+    statement, params = db.execute.call_args_list[1].args
+    assert statement is message_service.BUMP_SESSION_ACTIVITY
+    assert sorted((p["activity_session_id"], p["added"], p["last_at"]) for p in params) == sorted(
+        [(first, 2, rows[1].created_at), (second, 1, rows[2].created_at)]
+    )
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from importlib import import_module
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+import orjson
+from fastapi import HTTPException
+
+from app.core.pagination import encode_cursor
+from app.db.models import ChatMessage
+from app.services import message_stream
+from app.services.message_service import _notification
+from app.services.message_stream import LAGGED, MessageStreamHub, stream_session_messages
+
+chat_message_routes = import_module("app.api.routes.chat_message")
+
+
+class FakeListenConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    def remove_termination_listener(self, callback):
+        self.on_terminate = None
+
+    async def close(self):
+        self.closed = True
+
+    def notify(self, payload):
+        self.listeners[message_stream.MESSAGE_CHANNEL](self, 1, message_stream.MESSAGE_CHANNEL, payload)
+
+
+def _hub(connections, **kwargs):
+    async def connect():
+        conn = FakeListenConnection()
+        connections.append(conn)
+        return conn
+
+    return MessageStreamHub(connect=connect, **kwargs)
+
+
+def _message(session_id, seconds=0, **extra):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=seconds)
+    return {
+        "id": str(uuid4()),
+        "session_id": str(session_id),
+        "sender": "user",
+        "content": f"m{seconds}",
+        "context": None,
+        "created_at": created.isoformat(),
+        **extra,
+    }
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_one_connection_fans_out_to_session_subscribers():
+    connections = []
+    hub = _hub(connections)
+    session_id, other_id = uuid4(), uuid4()
+    first = await hub.subscribe(session_id)
+    second = await hub.subscribe(session_id)
+    other = await hub.subscribe(other_id)
+
+    message = _message(session_id)
+    connections[0].notify(orjson.dumps(message).decode())
+    await _settle()
+
+    assert len(connections) == 1
+    assert first.queue.get_nowait() == message
+    assert second.queue.get_nowait() == message
+    assert other.queue.empty()
+    assert hub.subscribers == 3
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(first)
+    assert hub.subscribers == 2
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_truncated_notification_is_fetched_once():
+    connections = []
+    session_id = uuid4()
+    full = _message(session_id, content="x" * 10000)
+    fetched = []
+
+    async def fetch_message(session_id, message_id):
+        fetched.append(message_id)
+        return full
+
+    hub = _hub(connections, fetch_message=fetch_message)
+    subscriptions = [await hub.subscribe(session_id) for _ in range(3)]
+
+    announced = {key: full[key] for key in ("id", "session_id", "sender", "created_at")}
+    connections[0].notify(orjson.dumps({**announced, "truncated": True}).decode())
+    await _settle()
+
+    assert len(fetched) == 1
+    assert all(s.queue.get_nowait() == full for s in subscriptions)
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_overflows_to_catch_up_marker():
+    connections = []
+    hub = _hub(connections, queue_size=2)
+    session_id = uuid4()
+    slow = await hub.subscribe(session_id)
+
+    for seconds in range(3):
+        connections[0].notify(orjson.dumps(_message(session_id, seconds)).decode())
+    await _settle()
+
+    assert slow.queue.qsize() == 1
+    assert slow.queue.get_nowait() is LAGGED
+    assert hub.overflows == 1
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_lost_connection_reconnects_and_lags_subscribers():
+    connections = []
+    hub = _hub(connections)
+    subscription = await hub.subscribe(uuid4())
+
+    connections[0].on_terminate(connections[0])
+    await _settle()
+
+    assert len(connections) == 2
+    assert subscription.queue.get_nowait() is LAGGED
+    await hub.close()
+
+
+class FakeSessionFactory:
+    def __init__(self):
+        self.opened = 0
+
+    def __call__(self):
+        factory = self
+
+        class Session:
+            async def __aenter__(self):
+                factory.opened += 1
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Session()
+
+
+def _events(chunks):
+    return [
+        json.loads(line[len("data: "):])
+        for chunk in chunks
+        for line in chunk.splitlines()
+        if line.startswith("data: ")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_catches_up_after_lag_without_duplicates(monkeypatch):
+    connections = []
+    hub = _hub(connections)
+    session_id = uuid4()
+    subscription = await hub.subscribe(session_id)
+    first, second, third = (_message(session_id, s) for s in range(3))
+    pages = []
+
+    async def get_message_page(db, session_id, limit, after):
+        pages.append(after)
+        return {"messages": [second, third], "next_cursor": None}
+
+    monkeypatch.setattr(message_stream, "get_message_page", get_message_page)
+    factory = FakeSessionFactory()
+    stream = stream_session_messages(
+        subscription, hub=hub, session_factory=factory, heartbeat_seconds=0.01
+    )
+
+    subscription.push(first)
+    subscription.push(LAGGED)
+    subscription.push(third)  # arrived live after the catch-up already sent it
+    chunks = [await stream.__anext__() for _ in range(3)]
+    chunks.append(await stream.__anext__())  # nothing left: heartbeat
+    await stream.aclose()
+
+    assert [e["content"] for e in _events(chunks)] == ["m0", "m1", "m2"]
+    assert chunks[-1] == ": keepalive\n\n"
+    created = datetime.fromisoformat(first["created_at"])
+    assert pages == [encode_cursor(created, first["id"])]
+    assert factory.opened == 1
+    assert hub.subscribers == 0
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_resumes_from_last_event_id(monkeypatch):
+    connections = []
+    hub = _hub(connections)
+    session_id = uuid4()
+    subscription = await hub.subscribe(session_id)
+    missed = _message(session_id, 5)
+    last_event_id = encode_cursor(datetime(2024, 1, 1, tzinfo=timezone.utc), uuid4())
+
+    async def get_message_page(db, session_id, limit, after):
+        assert after == last_event_id
+        return {"messages": [missed], "next_cursor": None}
+
+    monkeypatch.setattr(message_stream, "get_message_page", get_message_page)
+    stream = stream_session_messages(
+        subscription, last_event_id, hub=hub, session_factory=FakeSessionFactory()
+    )
+
+    event = await stream.__anext__()
+    await stream.aclose()
+
+    created = datetime.fromisoformat(missed["created_at"])
+    assert event.startswith(f"id: {encode_cursor(created, missed['id'])}\nevent: message\n")
+    assert _events([event]) == [missed]
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_delivers_the_finalized_text_of_a_streamed_message():
+    connections = []
+    hub = _hub(connections)
+    session_id, message_id = uuid4(), uuid4()
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    subscription = await hub.subscribe(session_id)
+    stream = stream_session_messages(
+        subscription, hub=hub, session_factory=FakeSessionFactory(), heartbeat_seconds=0.01
+    )
+
+    def published(content, streaming):
+        return _notification(
+            ChatMessage(
+                id=message_id,
+                session_id=session_id,
+                sender="assistant",
+                content=content,
+                created_at=created,
+                streaming=streaming,
+            )
+        )
+
+    connections[0].notify(published("", streaming=True))  # opened
+    connections[0].notify(published("Hello there", streaming=False))  # finalized
+    await _settle()
+    chunks = [await stream.__anext__() for _ in range(2)]
+    await stream.aclose()
+
+    events = _events(chunks)
+    assert [(e["content"], e["streaming"]) for e in events] == [("", True), ("Hello there", False)]
+    assert {e["id"] for e in events} == {str(message_id)}
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_streams_are_refused_while_notify_is_disabled(monkeypatch):
+    monkeypatch.setattr(chat_message_routes.settings, "MESSAGE_NOTIFY_ENABLED", False)
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as e:
+        await chat_message_routes.stream_messages(uuid4(), last_event_id=None, db=db)
+
+    assert e.value.status_code == 503
+    db.execute.assert_not_called()
@@ -0,0 +1,137 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from app.core.cache import MISS
+from app.services import purge_service
+from app.services.session_service import session_list_cache
+
+
+def _factory(db):
+    class Factory:
+        async def __aenter__(self):
+            return db
+
+        async def __aexit__(self, *exc):
+            return False
+
+    return Factory
+
+
+def _ids(*ids):
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = list(ids)
+    return result
+
+
+def _deleted(rowcount):
+    return SimpleNamespace(rowcount=rowcount)
+
+
+def _removed(*rows):
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_purge_user_deletes_in_chunks_and_reports_progress():
+    first, second = uuid4(), uuid4()
+    db = AsyncMock()
+    db.execute.side_effect = [
+        _ids(first, second),
+        _deleted(2),
+        _deleted(1),
+        _removed(
+            SimpleNamespace(id=first, user_id="u1", is_favorite=False),
+            SimpleNamespace(id=second, user_id="u1", is_favorite=True),
+        ),
+        _ids(),
+    ]
+    session_list_cache.set(("u1", True), [], session_list_cache.begin(("u1", True)))
+
+    progress = [
+        p async for p in purge_service.purge_user("u1", chunk_size=2, session_factory=_factory(db))
+    ]
+
+    assert [(p["messages_deleted"], p["sessions_deleted"], p["done"]) for p in progress] == [
+        (2, 0, False),
+        (3, 0, False),
+        (3, 2, False),
+        (3, 2, True),
+    ]
+    # Every chunk is its own transaction
+    assert db.commit.call_count == 3
+    assert session_list_cache.get(("u1", True)) is MISS
+
+
+@pytest.mark.asyncio
+async def test_purge_user_without_data_only_reports_done():
+    db = AsyncMock()
+    db.execute.return_value = _ids()
+
+    progress = [
+        p async for p in purge_service.purge_user("nobody", session_factory=_factory(db))
+    ]
+
+    assert len(progress) == 1
+    assert progress[0]["done"] is True
+    db.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_sweep_retention_walks_old_sessions():
+    old = uuid4()
+    db = AsyncMock()
+    db.execute.side_effect = [
+        _ids(old),
+        _ids(old),  # DELETE ... RETURNING session_id
+        MagicMock(),  # session activity counters
+        _removed(SimpleNamespace(id=old, user_id="u1", is_favorite=False)),
+        _ids(),
+    ]
+
+    report = await purge_service.sweep_retention(
+        max_age_days=30, chunk_size=10, session_factory=_factory(db)
+    )
+
+    assert report["messages_deleted"] == 1
+    assert report["sessions_deleted"] == 1
+    statement, params = db.execute.call_args_list[2].args
+    assert statement is purge_service.DROP_SESSION_MESSAGES
+    assert params == [{"activity_session_id": old, "removed": 1}]
+    next_batch = db.execute.call_args_list[4].args[0]
+    assert "chat_sessions.id >" in str(next_batch)
+
+
+@pytest.mark.asyncio
+async def test_sweep_retention_requires_a_max_age():
+    with pytest.raises(ValueError):
+        await purge_service.sweep_retention(max_age_days=0, session_factory=_factory(AsyncMock()))
+
+
+def _shard_locked_by_others(locked: bool):
+    conn = AsyncMock()
+    conn.execute.return_value.scalar = MagicMock(return_value=not locked)
+    conn.begin = MagicMock(return_value=_factory(None)())
+    engine = SimpleNamespace(connect=MagicMock(return_value=_factory(conn)()))
+    return SimpleNamespace(name="main", engine=engine, session_factory=MagicMock()), conn
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("locked", [False, True])
+async def test_a_shard_is_swept_by_one_worker_at_a_time(monkeypatch, locked):
+    shard, conn = _shard_locked_by_others(locked)
+    sweep = AsyncMock(return_value={"messages_deleted": 0})
+    monkeypatch.setattr(purge_service, "sweep_retention", sweep)
+
+    report = await purge_service._sweep_shard(shard)
+
+    assert conn.execute.await_args.args[0] is purge_service.TRY_LOCK_SWEEP
+    if locked:
+        assert report is None
+        sweep.assert_not_called()
+    else:
+        assert report == {"messages_deleted": 0}
+        sweep.assert_awaited_once_with(session_factory=shard.session_factory)
@@ -0,0 +1,118 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
+from uuid import uuid4
+from datetime import datetime, timezone
+
+from app.services import search_service
+from app.db.models.chat_message import senderEnum
+from app.core.pagination import decode_rank_cursor
+
+
+def _hit(rank):
+    return SimpleNamespace(
+        id=uuid4(),
+        session_id=uuid4(),
+        session_title="Trip planning",
+        sender=senderEnum.assistant,
+        rank=rank,
+        created_at=datetime.now(timezone.utc),
+        snippet="book the <mark>train</mark> to Rome",
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_messages_returns_hits_and_rank_cursor():
+    db = AsyncMock()
+    rows = [_hit(0.9), _hit(0.5), _hit(0.1)]
+    result = MagicMock()
+    result.all.return_value = rows
+    db.execute.return_value = result
+
+    page = await search_service.search_messages(db, user_id="u1", q="train", limit=2)
+
+    db.execute.assert_called_once()
+    assert [hit["rank"] for hit in page["hits"]] == [0.9, 0.5]
+    assert page["hits"][0]["sender"] == "assistant"
+    assert page["hits"][0]["session_title"] == "Trip planning"
+    assert decode_rank_cursor(page["next_cursor"]) == (0.5, rows[1].id)
+
+
+@pytest.mark.asyncio
+async def test_search_messages_last_page_has_no_cursor():
+    db = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = [_hit(0.3)]
+    db.execute.return_value = result
+
+    page = await search_service.search_messages(db, user_id="u1", q="train", limit=2)
+
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_search_messages_rejects_blank_query():
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as e:
+        await search_service.search_messages(db, user_id="u1", q="   ")
+
+    assert e.value.status_code == 400
+    db.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_similar_messages_reads_only_winning_rows():
+    db = AsyncMock()
+    hit, gone = _hit(None), _hit(None)
+    index = MagicMock()
+    index.search = AsyncMock(
+        return_value=[[(hit.session_id, hit.id, 0.9), (gone.session_id, gone.id, 0.5)]]
+    )
+    hit.content = "book the train to Rome"
+    result = MagicMock()
+    result.all.return_value = [hit]  # the other message was deleted meanwhile
+    db.execute.return_value = result
+    query = [0.1] * search_service.settings.EMBEDDING_DIMENSIONS
+
+    (hits,) = await search_service.similar_messages(db, "u1", [query], k=2, index=index)
+
+    db.execute.assert_called_once()
+    index.forget.assert_called_once_with("u1", {gone.id})
+    assert [h["message_id"] for h in hits] == [hit.id]
+    assert hits[0]["score"] == 0.9 and hits[0]["sender"] == "assistant"
+
+
+@pytest.mark.asyncio
+async def test_similar_messages_refills_past_deleted_hits():
+    db = AsyncMock()
+    hit, gone, next_best = _hit(None), _hit(None), _hit(None)
+    hit.content = next_best.content = "book the train to Rome"
+    index = MagicMock()
+    index.search = AsyncMock(
+        side_effect=[
+            [[(hit.session_id, hit.id, 0.9), (gone.session_id, gone.id, 0.5)]],
+            [[(hit.session_id, hit.id, 0.9), (next_best.session_id, next_best.id, 0.4)]],
+        ]
+    )
+    first, second = MagicMock(), MagicMock()
+    first.all.return_value = [hit]
+    second.all.return_value = [next_best]
+    db.execute.side_effect = [first, second]
+    query = [0.1] * search_service.settings.EMBEDDING_DIMENSIONS
+
+    (hits,) = await search_service.similar_messages(db, "u1", [query], k=2, index=index)
+
+    index.forget.assert_called_once_with("u1", {gone.id})
+    # The refill only reads the rows not read already
+    assert db.execute.await_count == 2
+    assert [h["message_id"] for h in hits] == [hit.id, next_best.id]
+
+
+@pytest.mark.asyncio
+async def test_similar_messages_rejects_wrong_dimensions():
+    with pytest.raises(HTTPException) as e:
+        await search_service.similar_messages(AsyncMock(), "u1", [[0.1, 0.2]], index=MagicMock())
+
+    assert e.value.status_code == 400
@@ -2,10 +2,23 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock
 from fastapi import HTTPException
 from uuid import uuid4
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from importlib import import_module
 
 from app.services import session_service
 from app.db.models import ChatSession
-from app.schemas.session import ChatSessionCreate
+from app.schemas.session import ChatSessionCreate, ChatSessionUpdate
+from app.core.pagination import decode_cursor, decode_activity_cursor, encode_activity_cursor
+
+chat_session_routes = import_module("app.api.routes.chat_session")
+
+
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    session_service.session_list_cache.clear()
+    yield
+    session_service.session_list_cache.clear()
 
 
 @pytest.mark.asyncio
@@ -34,25 +47,23 @@ async def test_get_chat_session_by_user_all():
     session1 = ChatSession(id="1", user_id="user123", title="s1")
     session2 = ChatSession(id="2", user_id="user123", title="s2")
 
-    scalars_mock = MagicMock()
-    scalars_mock.all.return_value = [session1, session2]
-
     execute_result = MagicMock()
-    execute_result.scalars.return_value = scalars_mock
+    execute_result.all.return_value = [session1, session2]
     db.execute.return_value = execute_result
 
     result = await session_service.get_chat_session_by_user(db, user_id="user123")
 
     db.execute.assert_called_once()
     assert len(result) == 2
-    assert result[0].title == "s1"
-    assert result[1].title == "s2"
+    assert result[0]["title"] == "s1"
+    assert result[1]["title"] == "s2"
+    assert result[0]["message_count"] is None
 
 
 @pytest.mark.asyncio
 async def test_rename_chat_session_success():
     db = AsyncMock()
-    session = ChatSession(id="123", title="Old Title")
+    session = ChatSession(id="123", title="New Title")
     result_mock = MagicMock()
     result_mock.scalar_one_or_none.return_value = session
     db.execute.return_value = result_mock
@@ -65,8 +76,9 @@ async def test_rename_chat_session_success():
     )
 
     assert result.title == "New Title"
+    db.execute.assert_called_once()
     db.commit.assert_called_once()
-    db.refresh.assert_called_once()
+    db.refresh.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -88,7 +100,7 @@ async def test_rename_chat_session_not_found():
 @pytest.mark.asyncio
 async def test_set_favorite_status_success():
     db = AsyncMock()
-    session = ChatSession(id="123", title="Session", is_favorite=False)
+    session = ChatSession(id="123", title="Session", is_favorite=True)
     result_mock = MagicMock()
     result_mock.scalar_one_or_none.return_value = session
     db.execute.return_value = result_mock
@@ -101,8 +113,9 @@ async def test_set_favorite_status_success():
     )
 
     assert result.is_favorite is True
+    db.execute.assert_called_once()
     db.commit.assert_called_once()
-    db.refresh.assert_called_once()
+    db.refresh.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -124,9 +137,8 @@ async def test_set_favorite_status_not_found():
 @pytest.mark.asyncio
 async def test_delete_chat_session_success():
     db = AsyncMock()
-    session = ChatSession(id="123", title="Session")
     result_mock = MagicMock()
-    result_mock.scalar_one_or_none.return_value = session
+    result_mock.one_or_none.return_value = MagicMock(user_id="user123", is_favorite=False)
     db.execute.return_value = result_mock
 
     db.delete = AsyncMock()
@@ -134,7 +146,8 @@ async def test_delete_chat_session_success():
 
     await session_service.delete_chat_session(db, session_id="123")
 
-    db.delete.assert_called_once_with(session)
+    db.execute.assert_called_once()
+    db.delete.assert_not_called()
     db.commit.assert_called_once()
 
 
@@ -142,7 +155,7 @@ async def test_delete_chat_session_success():
 async def test_delete_chat_session_not_found():
     db = AsyncMock()
     result_mock = MagicMock()
-    result_mock.scalar_one_or_none.return_value = None
+    result_mock.one_or_none.return_value = None
     db.execute.return_value = result_mock
 
     session_id = uuid4()
@@ -152,3 +165,247 @@ async def test_delete_chat_session_not_found():
 
     assert e.value.status_code == 500
     assert e.value.detail == "Internal Server Error"
+
+
+@pytest.mark.asyncio
+async def test_update_chat_session_sets_title_and_favorite_in_one_statement():
+    db = AsyncMock()
+    session = ChatSession(id="123", user_id="user123", title="New", is_favorite=True)
+    result_mock = MagicMock()
+    result_mock.scalar_one_or_none.return_value = session
+    db.execute.return_value = result_mock
+
+    result = await session_service.update_chat_session(
+        db, session_id="123", update_data=ChatSessionUpdate(title="New", is_favorite=True)
+    )
+
+    assert result is session
+    db.execute.assert_called_once()
+    statement = db.execute.call_args.args[0]
+    assert set(statement.compile().params) >= {"title", "is_favorite"}
+    db.commit.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_update_chat_session_requires_a_field():
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as e:
+        await session_service.update_chat_session(
+            db, session_id="123", update_data=ChatSessionUpdate()
+        )
+
+    assert e.value.status_code == 422
+    assert e.value.detail == "Nothing to update."
+    db.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_chat_session_rejects_an_empty_title():
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as e:
+        await session_service.update_chat_session(
+            db, session_id="123", update_data=ChatSessionUpdate(title="")
+        )
+
+    assert e.value.status_code == 422
+    assert e.value.detail == "Title must not be empty."
+    db.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_session_route_passes_unknown_session_through():
+    db = AsyncMock()
+    result_mock = MagicMock()
+    result_mock.scalar_one_or_none.return_value = None
+    db.execute.return_value = result_mock
+
+    with pytest.raises(HTTPException) as e:
+        await chat_session_routes.update_session(
+            session_id="123", payload=ChatSessionUpdate(title="New"), db=db
+        )
+
+    assert e.value.status_code == 404
+    db.commit.assert_not_called()
+    db.rollback.assert_awaited()
+
+
+def _sessions_result(sessions):
+    execute_result = MagicMock()
+    execute_result.all.return_value = sessions
+    return execute_result
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_by_user_is_cached():
+    db = AsyncMock()
+    db.execute.return_value = _sessions_result([ChatSession(id="1", user_id="u1", title="s1")])
+
+    first = await session_service.get_chat_session_by_user(db, user_id="u1")
+    second = await session_service.get_chat_session_by_user(db, user_id="u1")
+
+    db.execute.assert_called_once()
+    assert second is first
+
+
+@pytest.mark.asyncio
+async def test_cached_session_list_is_not_stale_after_rename():
+    db = AsyncMock()
+    session = ChatSession(id="1", user_id="u1", title="Old", is_favorite=False)
+    db.execute.return_value = _sessions_result([session])
+    await session_service.get_chat_session_by_user(db, user_id="u1")
+
+    renamed = ChatSession(id="1", user_id="u1", title="New", is_favorite=False)
+    rename_result = MagicMock()
+    rename_result.scalar_one_or_none.return_value = renamed
+    db.execute.return_value = rename_result
+    await session_service.rename_chat_session(db, session_id="1", new_title="New")
+
+    db.execute.return_value = _sessions_result([renamed])
+    result = await session_service.get_chat_session_by_user(db, user_id="u1")
+
+    assert result[0]["title"] == "New"
+
+
+@pytest.mark.asyncio
+async def test_write_during_read_does_not_repopulate_cache():
+    db = AsyncMock()
+    stale = [ChatSession(id="1", user_id="u1", title="Old")]
+
+    async def slow_read(query):
+        # A concurrent writer commits while this read is in flight
+        session_service.invalidate_session_lists("u1")
+        return _sessions_result(stale)
+
+    db.execute.side_effect = slow_read
+    await session_service.get_chat_session_by_user(db, user_id="u1")
+
+    fresh = [ChatSession(id="1", user_id="u1", title="New")]
+    db.execute.side_effect = None
+    db.execute.return_value = _sessions_result(fresh)
+    result = await session_service.get_chat_session_by_user(db, user_id="u1")
+
+    assert [s["title"] for s in result] == ["New"]
+    assert db.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_page_includes_stats_and_preview():
+    db = AsyncMock()
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    sessions = [
+        ChatSession(id=uuid4(), user_id="u1", title=f"s{i}", is_favorite=False, created_at=created)
+        for i in range(3)
+    ]
+    rows = [
+        SimpleNamespace(
+            id=session.id,
+            user_id=session.user_id,
+            title=session.title,
+            is_favorite=session.is_favorite,
+            created_at=session.created_at,
+            message_count=5,
+            last_message_at=created,
+            last_message_preview="latest message",
+        )
+        for session in sessions
+    ]
+    execute_result = MagicMock()
+    execute_result.all.return_value = rows
+    db.execute.return_value = execute_result
+
+    page = await session_service.get_chat_session_page(
+        db, user_id="u1", limit=2, include={"stats", "preview"}
+    )
+
+    db.execute.assert_called_once()
+    assert [s["title"] for s in page["sessions"]] == ["s0", "s1"]
+    assert page["sessions"][0]["message_count"] == 5
+    assert page["sessions"][0]["last_message_preview"] == "latest message"
+    assert decode_cursor(page["next_cursor"]) == (created, sessions[1].id)
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_page_rejects_unknown_include():
+    db = AsyncMock()
+
+    with pytest.raises(HTTPException) as e:
+        await session_service.get_chat_session_page(db, user_id="u1", include={"everything"})
+
+    assert e.value.status_code == 400
+    db.execute.assert_not_called()
+
+
+def _activity_row(title, last_message_at):
+    return SimpleNamespace(
+        id=uuid4(),
+        user_id="u1",
+        title=title,
+        is_favorite=False,
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        activity_at=last_message_at,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_page_orders_by_activity():
+    db = AsyncMock()
+    recent = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    rows = [_activity_row("busy", recent), _activity_row("empty", None), _activity_row("older", None)]
+    result = MagicMock()
+    result.all.return_value = rows
+    db.execute.return_value = result
+
+    page = await session_service.get_chat_session_page(db, user_id="u1", limit=1, order="activity")
+
+    assert [s["title"] for s in page["sessions"]] == ["busy"]
+    assert "activity_at" not in page["sessions"][0]
+    assert decode_activity_cursor(page["next_cursor"]) == (recent, rows[0].id)
+    sql = str(db.execute.call_args.args[0])
+    assert "last_message_at DESC NULLS LAST" in sql and "UNION ALL" in sql
+
+    # A cursor past the last active session only reads empty ones
+    await session_service.get_chat_session_page(
+        db, user_id="u1", limit=1, order="activity",
+        cursor=encode_activity_cursor(None, rows[1].id),
+    )
+    sql = str(db.execute.call_args.args[0])
+    assert "UNION ALL" not in sql and "last_message_at IS NULL" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_page_rejects_unknown_order():
+    with pytest.raises(HTTPException) as e:
+        await session_service.get_chat_session_page(AsyncMock(), user_id="u1", order="title")
+
+    assert e.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_repair_session_activity_walks_sessions_in_locked_batches():
+    first, second, third = uuid4(), uuid4(), uuid4()
+    db = AsyncMock()
+
+    def ids(*values):
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = list(values)
+        return result
+
+    db.execute.side_effect = [
+        ids(first, second),
+        SimpleNamespace(rowcount=1),
+        ids(third),
+        SimpleNamespace(rowcount=0),
+    ]
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    report = await session_service.repair_session_activity(factory, batch_size=2)
+
+    assert report["sessions_scanned"] == 3
+    assert report["sessions_repaired"] == 1
+    assert db.commit.call_count == 2
+    lock = str(db.execute.call_args_list[2].args[0])
+    assert "FOR UPDATE" in lock and "chat_sessions.id >" in lock
@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.db.sharding import SLOTS, HashRing, Shard, ShardRouter
+from app.services import shard_rebalance
+from app.services.shard_rebalance import move_slot, rebalance, slots_to_pin
+
+
+def _router(ring, overrides=None):
+    shards = [Shard(name, name, None, MagicMock(), MagicMock()) for name in ("main", "shard1")]
+    router = ShardRouter(shards, ring=ring)
+    router.read_directory = AsyncMock(return_value=overrides or {})
+    return router
+
+
+def _record(monkeypatch, calls):
+    async def set_slot(router, slot, shard, moving=False):
+        calls.append(("set", slot, shard, moving))
+
+    async def delete_slot(shard, slot, batch_size):
+        calls.append(("delete", shard.name))
+        return 0
+
+    async def copy_slot(source, target, slot, batch_size):
+        calls.append(("copy", source.name, target.name))
+        return {"sessions_copied": 2, "archives_copied": 0, "messages_copied": 5}
+
+    async def sleep(seconds):
+        calls.append(("settle", seconds))
+
+    monkeypatch.setattr(shard_rebalance, "_set_slot", set_slot)
+    monkeypatch.setattr(shard_rebalance, "_delete_slot", delete_slot)
+    monkeypatch.setattr(shard_rebalance, "_copy_slot", copy_slot)
+    monkeypatch.setattr(shard_rebalance.asyncio, "sleep", sleep)
+
+
+def test_growing_the_ring_pins_moving_slots_where_they_are():
+    router = _router(["main"])
+    new_placement = HashRing(["main", "shard1"]).placement()
+
+    pins = slots_to_pin(router, ["main", "shard1"], overrides={7: ("main", False)})
+
+    expected = {slot for slot in range(SLOTS) if new_placement[slot] == "shard1"} - {7}
+    assert set(pins) == expected
+    assert set(pins.values()) == {"main"}
+
+
+@pytest.mark.asyncio
+async def test_move_refuses_writes_before_copying_and_switches_before_deleting(monkeypatch):
+    calls = []
+    _record(monkeypatch, calls)
+    router = _router(["main", "shard1"])
+    slot = next(slot for slot in range(SLOTS) if router.ring_shard(slot) == "shard1")
+
+    report = await move_slot(slot, "main", "shard1", router, batch_size=10, settle_seconds=3)
+
+    assert calls == [
+        ("set", slot, "main", True),
+        ("settle", 3),
+        ("delete", "shard1"),  # leftovers of an interrupted move
+        ("copy", "main", "shard1"),
+        ("set", slot, None, False),  # the ring agrees now, so unpin
+        ("settle", 3),
+        ("delete", "main"),
+    ]
+    assert report["messages_copied"] == 5
+
+
+@pytest.mark.asyncio
+async def test_rebalance_moves_pinned_slots_and_drops_needless_pins(monkeypatch):
+    calls = []
+    _record(monkeypatch, calls)
+    router = _router(["main", "shard1"])
+    to_main = next(slot for slot in range(SLOTS) if router.ring_shard(slot) == "main")
+    to_shard1 = next(slot for slot in range(SLOTS) if router.ring_shard(slot) == "shard1")
+    router.read_directory.return_value = {to_main: ("main", False), to_shard1: ("main", False)}
+
+    report = await rebalance(router, batch_size=10, settle_seconds=0)
+
+    assert ("set", to_main, None, False) in calls
+    assert ("copy", "main", "shard1") in calls
+    assert report["slots_moved"] == 1
+    assert report["messages_moved"] == 5
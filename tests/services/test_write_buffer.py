@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import HTTPException
+from uuid import uuid4
+
+from app.services import write_buffer
+from app.services.write_buffer import MessageWriteBuffer
+from app.db.models import ChatMessage
+from app.schemas.message import ChatMessageCreate
+
+
+def _session_factory():
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=AsyncMock())
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_one_commit(monkeypatch):
+    session_id = uuid4()
+
+    async def fake_bulk(db, items):
+        return {
+            "created": [
+                ChatMessage(id=uuid4(), **item)
+                for i, item in enumerate(items)
+                if i != 1
+            ],
+            "errors": [{"index": 1, "detail": "Invalid sender 'robot'."}],
+        }
+
+    bulk = AsyncMock(side_effect=fake_bulk)
+    monkeypatch.setattr(write_buffer, "add_messages_bulk", bulk)
+    buffer = MessageWriteBuffer(_session_factory(), window_ms=50, max_batch=10)
+
+    results = await asyncio.gather(
+        buffer.submit(ChatMessageCreate(session_id=session_id, sender="user", content="a")),
+        buffer.submit(ChatMessageCreate(session_id=session_id, sender="robot", content="b")),
+        buffer.submit(ChatMessageCreate(session_id=session_id, sender="assistant", content="c")),
+        return_exceptions=True,
+    )
+
+    bulk.assert_called_once()
+    assert results[0].content == "a"
+    assert isinstance(results[1], HTTPException)
+    assert results[1].status_code == 422
+    assert results[2].content == "c"
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_before_window(monkeypatch):
+    bulk = AsyncMock(
+        side_effect=lambda db, items: {
+            "created": [ChatMessage(id=uuid4(), **item) for item in items],
+            "errors": [],
+        }
+    )
+    monkeypatch.setattr(write_buffer, "add_messages_bulk", bulk)
+    buffer = MessageWriteBuffer(_session_factory(), window_ms=60_000, max_batch=2)
+    session_id = uuid4()
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            buffer.submit(ChatMessageCreate(session_id=session_id, sender="user", content="a")),
+            buffer.submit(ChatMessageCreate(session_id=session_id, sender="user", content="b")),
+        ),
+        timeout=1,
+    )
+
+    assert [message.content for message in results] == ["a", "b"]
+    bulk.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_fails_every_caller(monkeypatch):
+    monkeypatch.setattr(
+        write_buffer, "add_messages_bulk", AsyncMock(side_effect=RuntimeError("db down"))
+    )
+    buffer = MessageWriteBuffer(_session_factory(), window_ms=1, max_batch=10)
+    session_id = uuid4()
+
+    results = await asyncio.gather(
+        buffer.submit(ChatMessageCreate(session_id=session_id, sender="user", content="a")),
+        buffer.submit(ChatMessageCreate(session_id=session_id, sender="user", content="b")),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)